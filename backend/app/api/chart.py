@@ -1,20 +1,62 @@
 """Chart data API routes."""
 
+import asyncio
+import time
 from datetime import datetime, timedelta, timezone
+from typing import Any
 
 import akshare as ak
-import requests as _requests
+import numpy as np
+import orjson
+import pandas as pd
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import INDEX_HISTORY_CACHE_TTL, INDEX_INTRADAY_CACHE_TTL
 from app.models.database import get_db
 from app.models.fund import FundEstimateSnapshot
+from app.services.cache import index_cache, nav_history_cache
 from app.services.fund_info import fund_info_service
+from app.services.http_client import get_http_client
+from app.services.market_data import seconds_until_nav_refresh
 
 # China Standard Time (UTC+8)
 _CST = timezone(timedelta(hours=8))
 
+# Lookback window per chart period; "ytd" starts on Jan 1 and is handled separately
+_PERIOD_DELTAS = {
+    "7d": timedelta(days=7),
+    "30d": timedelta(days=30),
+    "1y": timedelta(days=365),
+    "3y": timedelta(days=365 * 3),
+}
+
+
+def _period_cutoff(period: str, today: datetime) -> str:
+    """Return the inclusive 'YYYY-MM-DD' start date for a chart period."""
+    if period == "ytd":
+        return f"{today.year}-01-01"
+    return (today - _PERIOD_DELTAS.get(period, _PERIOD_DELTAS["30d"])).strftime("%Y-%m-%d")
+
+
+def _index_cache_lookup(key: str) -> tuple[Any, bool]:
+    """Return (payload, is_fresh) for an index cache entry, or (None, False) on miss.
+
+    Entries outlive their freshness window so the last good payload can still be
+    served when the upstream source fails.
+    """
+    entry = index_cache.get(key)
+    if entry is None:
+        return None, False
+    payload, fresh_until = entry
+    return payload, time.time() < fresh_until
+
+
+def _index_cache_store(key: str, payload: Any, ttl: int) -> None:
+    index_cache.set(key, (payload, time.time() + ttl))
+
+
 router = APIRouter(prefix="/api/fund", tags=["chart"])
 
 
@@ -27,37 +69,32 @@ async def get_index_history(
     period: str = Query("30d", pattern="^(7d|30d|ytd|1y|3y)$"),
 ):
     """Get 上海指数 (上证指数) historical close prices via akshare (Sina source)."""
-    today = datetime.now(_CST)
-
-    # Determine cutoff date for filtering
-    if period == "7d":
-        real_cutoff = (today - timedelta(days=7)).strftime("%Y-%m-%d")
-    elif period == "30d":
-        real_cutoff = (today - timedelta(days=30)).strftime("%Y-%m-%d")
-    elif period == "ytd":
-        real_cutoff = datetime(today.year, 1, 1).strftime("%Y-%m-%d")
-    elif period == "1y":
-        real_cutoff = (today - timedelta(days=365)).strftime("%Y-%m-%d")
-    elif period == "3y":
-        real_cutoff = (today - timedelta(days=365 * 3)).strftime("%Y-%m-%d")
-    else:
-        real_cutoff = (today - timedelta(days=30)).strftime("%Y-%m-%d")
-
-    try:
-        # Use Sina-based daily data (push2his.eastmoney.com kline endpoint is blocked)
-        df = ak.stock_zh_index_daily(symbol="sh000001")
-        if df.empty:
-            return {"dates": [], "values": [], "name": "上证指数"}
-        # Columns: date, open, high, low, close, volume
-        dates = [str(d)[:10] for d in df["date"].tolist()]
-        values = [float(v) for v in df["close"].tolist()]
-    except Exception:
-        return {"dates": [], "values": [], "name": "上证指数"}
-
-    filtered_dates = [d for d in dates if d >= real_cutoff]
-    filtered_values = [v for d, v in zip(dates, values) if d >= real_cutoff]
+    real_cutoff = _period_cutoff(period, datetime.now(_CST))
 
-    return {"dates": filtered_dates, "values": filtered_values, "name": "上证指数"}
+    # The full daily series is shared by every period, so cache it once and
+    # filter per request (5 min fresh, last good series served on failure).
+    series, fresh = _index_cache_lookup("index_history")
+    if not fresh:
+        try:
+            # Use Sina-based daily data (push2his.eastmoney.com kline endpoint is blocked)
+            df = await asyncio.to_thread(ak.stock_zh_index_daily, symbol="sh000001")
+            if df.empty:
+                # Treated as a failure: fall back to the last good series
+                raise ValueError("empty index history")
+            # Columns: date, open, high, low, close, volume
+            # Fixed-width "YYYY-MM-DD" arrays let the cutoff filter below run as
+            # one vectorized comparison instead of per-row Python loops.
+            dates = df["date"].astype(str).str[:10].to_numpy(dtype="U10")
+            values = df["close"].to_numpy(dtype=np.float64)
+            series = (dates, values)
+            _index_cache_store("index_history", series, INDEX_HISTORY_CACHE_TTL)
+        except Exception:
+            if series is None:
+                return {"dates": [], "values": [], "name": "上证指数"}
+    dates, values = series
+
+    mask = dates >= real_cutoff
+    return {"dates": dates[mask].tolist(), "values": values[mask].tolist(), "name": "上证指数"}
 
 
 @router.get("/index/intraday")
@@ -71,6 +108,12 @@ async def get_index_intraday():
     today = datetime.now(_CST)
     today_str = today.strftime("%Y-%m-%d")
 
+    # Keyed by date so a stale fallback never serves another day's ticks
+    cache_key = f"index_intraday:{today_str}"
+    cached, fresh = _index_cache_lookup(cache_key)
+    if fresh:
+        return cached
+
     _HEADERS = {
         "User-Agent": (
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -81,7 +124,7 @@ async def get_index_intraday():
     }
 
     try:
-        resp = _requests.get(
+        resp = await get_http_client().get(
             "https://push2his.eastmoney.com/api/qt/stock/trends2/get",
             params={
                 "secid": "1.000001",
@@ -93,11 +136,12 @@ async def get_index_intraday():
             headers=_HEADERS,
             timeout=10,
         )
-        data = resp.json()
+        data = orjson.loads(resp.content)
         data_obj = data.get("data") or {}
         raw_trends = data_obj.get("trends", [])
         if not raw_trends:
-            return {"times": [], "values": [], "pre_close": 0, "name": "上证指数"}
+            # Treated as a failure: fall back to today's last good payload
+            raise ValueError("empty index trends")
 
         # Extract yesterday's official close from the API response.
         # The East Money trends2 API returns preClose (昨收价) at the top level of
@@ -129,9 +173,13 @@ async def get_index_intraday():
         if pre_close <= 0:
             pre_close = values[0] if values else 0
     except Exception:
+        if cached is not None:
+            return cached
         return {"times": [], "values": [], "pre_close": 0, "name": "上证指数"}
 
-    return {"times": times, "values": values, "pre_close": pre_close, "name": "上证指数"}
+    payload = {"times": times, "values": values, "pre_close": pre_close, "name": "上证指数"}
+    _index_cache_store(cache_key, payload, INDEX_INTRADAY_CACHE_TTL)
+    return payload
 
 
 @router.get("/{fund_code}/nav-history")
@@ -145,42 +193,40 @@ async def get_nav_history(
     if fund is None:
         raise HTTPException(status_code=404, detail="Fund not found")
 
-    # Use akshare to get historical NAV
-    try:
-        df = ak.fund_open_fund_info_em(symbol=fund_code, indicator="单位净值走势")
-        if df.empty:
+    # The full series only changes when the evening NAV is published, so cache
+    # it until the next refresh and filter per period on every request.  Keyed
+    # on the stored nav_date so a NAV update (refresh or nightly job) misses.
+    cache_key = f"nav_chart:{fund_code}:{fund.nav_date}"
+    series = nav_history_cache.get(cache_key)
+    if series is None:
+        # Don't hold a pooled connection over the (seconds-long) scrape
+        await db.close()
+        # Use akshare to get historical NAV (blocking scrape, run off the event loop)
+        try:
+            df = await asyncio.to_thread(
+                ak.fund_open_fund_info_em, symbol=fund_code, indicator="单位净值走势"
+            )
+            if df.empty:
+                return {"dates": [], "navs": []}
+        except Exception:
             return {"dates": [], "navs": []}
-    except Exception:
-        return {"dates": [], "navs": []}
-
-    # Convert to lists
-    dates = [str(d) for d in df["净值日期"].tolist()]
-    navs = [float(n) for n in df["单位净值"].tolist()]
+        series = (
+            pd.DatetimeIndex(pd.to_datetime(df["净值日期"])),
+            df["单位净值"].to_numpy(dtype=np.float64),
+        )
+        nav_history_cache.set(cache_key, series, ttl=seconds_until_nav_refresh())
+    nav_dates, navs = series
 
     # Filter by period
-    today = datetime.now(_CST)
-    if period == "7d":
-        cutoff = today - timedelta(days=7)
-    elif period == "30d":
-        cutoff = today - timedelta(days=30)
-    elif period == "ytd":
-        cutoff = datetime(today.year, 1, 1)
-    elif period == "1y":
-        cutoff = today - timedelta(days=365)
-    elif period == "3y":
-        cutoff = today - timedelta(days=365 * 3)
-    else:
-        cutoff = today - timedelta(days=30)
-
-    cutoff_str = cutoff.strftime("%Y-%m-%d")
-    filtered_dates = []
-    filtered_navs = []
-    for d, n in zip(dates, navs):
-        if d >= cutoff_str:
-            filtered_dates.append(d)
-            filtered_navs.append(n)
+    cutoff = _period_cutoff(period, datetime.now(_CST))
 
-    return {"dates": filtered_dates, "navs": filtered_navs}
+    # akshare returns dates in ascending order, so the cutoff is one binary
+    # search followed by a tail slice rather than a scan over every row.
+    idx = nav_dates.searchsorted(pd.Timestamp(cutoff))
+    return {
+        "dates": nav_dates[idx:].strftime("%Y-%m-%d").tolist(),
+        "navs": navs[idx:].tolist(),
+    }
 
 
 @router.get("/{fund_code}/intraday")
@@ -211,23 +257,30 @@ async def get_intraday(
         )
         query_date = date_result.scalar() or today_str
 
+    # Column-only select: plain rows, no ORM hydration.  The WHERE clause and
+    # ORDER BY walk the (fund_code, snapshot_date, snapshot_time) index.
     result = await db.execute(
-        select(FundEstimateSnapshot)
+        select(
+            FundEstimateSnapshot.snapshot_time,
+            FundEstimateSnapshot.est_nav,
+            FundEstimateSnapshot.est_change_pct,
+        )
         .where(
             FundEstimateSnapshot.fund_code == fund_code,
             FundEstimateSnapshot.snapshot_date == query_date,
         )
         .order_by(FundEstimateSnapshot.snapshot_time, FundEstimateSnapshot.id)
     )
-    snapshots = result.scalars().all()
+    snapshots = result.all()
 
     # Deduplicate by time: keep the last snapshot per HH:MM (highest id wins
-    # since snapshots are ordered by time then id ascending).
+    # since snapshots are ordered by time then id ascending).  Rows arrive in
+    # time order, so the dict's insertion order is already sorted.
     # Track est_change_pct so we can re-anchor navs to a consistent baseline.
     seen: dict[str, tuple[str, float, float]] = {}
     for s in snapshots:
         seen[s.snapshot_time] = (s.snapshot_time, s.est_nav, s.est_change_pct)
-    deduped = sorted(seen.values(), key=lambda x: x[0])
+    deduped = list(seen.values())
 
     times = [t for t, _, _ in deduped]
     change_pcts = [c for _, _, c in deduped]
@@ -9,7 +9,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.api.schemas import FundEstimateResponse, FundResponse, HoldingResponse
 from app.models.database import get_db
 from app.services.cache import stock_cache
-from app.services.estimator import fund_estimator
+from app.services.estimator import HoldingInput, fund_estimator
 from app.services.fund_info import fund_info_service
 from app.services.market_data import market_data_service
 
@@ -82,7 +82,8 @@ async def refresh_nav(fund_code: str, db: AsyncSession = Depends(get_db)):
     if fund is None:
         raise HTTPException(status_code=404, detail="Fund not found")
 
-    nav_data = await market_data_service.get_fund_nav_async(fund_code)
+    # A manual refresh must not be answered from the short NAV lookup cache
+    nav_data = await market_data_service.get_fund_nav_async(fund_code, fresh=True)
     if nav_data is None:
         raise HTTPException(status_code=503, detail="NAV data source unavailable")
 
@@ -127,12 +128,14 @@ async def get_estimate(fund_code: str, db: AsyncSession = Depends(get_db)):
     # today.  Guards against making slow paginated API calls on non-trading days
     # or when the app starts fresh before the first scheduler run on a holiday.
     if not stock_quotes:
-        is_trading = await market_data_service.is_market_trading_today_async()
+        is_trading = await market_data_service.is_market_trading_today()
         logger.info(
             f"[estimate] fund={fund_code} cache empty, is_trading_today={is_trading}"
         )
         if is_trading:
-            stock_quotes = await market_data_service.get_stock_quotes_async(stock_codes)
+            # Done with the database; don't hold a pooled connection over quotes
+            await db.close()
+            stock_quotes = await market_data_service.get_stock_quotes(stock_codes)
             logger.info(
                 f"[estimate] fund={fund_code} live fetch returned"
                 f" {len(stock_quotes)} quotes, keys={list(stock_quotes.keys())}"
@@ -145,11 +148,7 @@ async def get_estimate(fund_code: str, db: AsyncSession = Depends(get_db)):
     )
 
     holdings_data = [
-        {
-            "stock_code": str(h.stock_code).zfill(6),
-            "stock_name": h.stock_name,
-            "holding_ratio": h.holding_ratio,
-        }
+        HoldingInput(str(h.stock_code).zfill(6), h.stock_name, h.holding_ratio)
         for h in holdings
     ]
 
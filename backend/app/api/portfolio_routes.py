@@ -1,12 +1,15 @@
 """Portfolio API routes."""
 
 import asyncio
-import bisect
 from datetime import datetime, timedelta, timezone
 
+import numpy as np
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import Row
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.api.chart import _period_cutoff
 from app.api.schemas import (
     PortfolioCreateRequest,
     PortfolioDetailResponse,
@@ -17,17 +20,71 @@ from app.api.schemas import (
     PortfolioResponse,
 )
 from app.models.database import get_db
-from app.services.cache import stock_cache
-from app.services.estimator import fund_estimator
+from app.services.cache import estimate_cache, stock_cache
+from app.services.estimator import (
+    HoldingInput,
+    estimate_cache_key,
+    fund_estimator,
+    quote_change_pcts,
+)
 from app.services.fund_info import fund_info_service
 from app.services.market_data import market_data_service
 from app.services.portfolio import portfolio_service
 
 _CST = timezone(timedelta(hours=8))
 
+# Periods the history chart offers; anything else falls back to 30d
+_HISTORY_PERIODS = frozenset({"7d", "30d", "ytd", "1y"})
+
 router = APIRouter(prefix="/api/portfolio", tags=["portfolio"])
 
 
+async def _resolve_quotes(holdings_lists: list[list[Row]]) -> dict:
+    """Resolve quotes for every held stock across several funds at once.
+
+    Holdings shared by sibling funds are looked up once, and funds with nothing
+    cached are covered by a single live fetch instead of one call per fund.
+    """
+    quotes: dict = {}
+    for code in {h.stock_code for holdings in holdings_lists for h in holdings}:
+        cached = stock_cache.get(f"stock:{code}")
+        if cached is not None:
+            quotes[code] = cached
+    uncovered = {
+        h.stock_code
+        for holdings in holdings_lists
+        if not any(h.stock_code in quotes for h in holdings)
+        for h in holdings
+    }
+    if uncovered:
+        quotes.update(await market_data_service.get_stock_quotes(sorted(uncovered)))
+    return quotes
+
+
+def _estimate_fund(
+    fund_code: str, last_nav: float, holdings: list[Row], change_pcts: dict[str, float]
+) -> dict:
+    """Estimate one fund and share the result via estimate_cache.
+
+    Zero-coverage results (no matching quotes yet) are not cached so the next
+    request retries instead of serving last_nav for a whole TTL.
+    """
+    holdings_data = [
+        HoldingInput(h.stock_code, h.stock_name, h.holding_ratio)
+        for h in holdings
+    ]
+    estimate = fund_estimator.estimate_summary(holdings_data, change_pcts, last_nav)
+    entry = {
+        "est_nav": estimate["est_nav"],
+        "est_change_pct": estimate["est_change_pct"],
+        "coverage": estimate["coverage"],
+        "holdings_date": holdings[0].report_date,
+    }
+    if estimate["coverage"] > 0:
+        estimate_cache.set(estimate_cache_key(fund_code, last_nav), entry)
+    return entry
+
+
 @router.post("", response_model=PortfolioResponse)
 async def create_portfolio(
     req: PortfolioCreateRequest, db: AsyncSession = Depends(get_db)
@@ -53,13 +110,41 @@ async def get_portfolio_detail(portfolio_id: int, db: AsyncSession = Depends(get
 
     pf_list = await portfolio_service.get_portfolio_funds(db, portfolio_id)
 
-    # Batch-fetch all funds and holdings in two queries instead of N+1
+    # Check trading day once — avoids redundant API calls per fund.  The check
+    # may be a live HTTP call, so start it now to overlap the funds query, and
+    # release the session before waiting on it.  A closed session reconnects
+    # if the holdings query below needs it.
+    trading_today = asyncio.ensure_future(market_data_service.is_market_trading_today())
     fund_codes = [pf.fund_code for pf in pf_list]
     funds_map = await fund_info_service.get_funds_by_codes(db, fund_codes)
-    holdings_map = await fund_info_service.get_holdings_by_fund_codes(db, fund_codes)
-
-    # Check trading day once — avoids redundant API calls per fund
-    is_trading = await market_data_service.is_market_trading_today_async()
+    await db.close()
+    is_trading = await trading_today
+
+    # Real-time estimates only on trading days.  Per-fund results are shared
+    # across requests (and pre-warmed by the scheduler tick), so only funds
+    # without a fresh entry need holdings, quotes and the estimator.
+    estimates: dict[str, dict] = {}
+    if is_trading:
+        missing: list[str] = []
+        for code, fund in funds_map.items():
+            if not fund.last_nav:
+                continue
+            cached = estimate_cache.get(estimate_cache_key(code, fund.last_nav))
+            if cached is not None:
+                estimates[code] = cached
+            else:
+                missing.append(code)
+        if missing:
+            # One bulk holdings query for every miss instead of N+1
+            holdings_map = await fund_info_service.get_holdings_by_fund_codes(db, missing)
+            # Done with the database; don't hold a pooled connection over quotes
+            await db.close()
+            quotes = await _resolve_quotes(list(holdings_map.values()))
+            change_pcts = quote_change_pcts(quotes)
+            for code, holdings in holdings_map.items():
+                estimates[code] = _estimate_fund(
+                    code, funds_map[code].last_nav, holdings, change_pcts
+                )
 
     total_cost = 0.0
     total_estimate = 0.0
@@ -69,39 +154,11 @@ async def get_portfolio_detail(portfolio_id: int, db: AsyncSession = Depends(get
         fund = funds_map.get(pf.fund_code)
         last_nav = fund.last_nav if fund and fund.last_nav else 0.0
         fund_name = fund.fund_name if fund else pf.fund_code
-        est_nav = last_nav
-        est_change_pct = 0.0
-        coverage = 0.0
-        holdings_date: str | None = None
-
-        # Try real-time estimate only on trading days
-        if fund and fund.last_nav and is_trading:
-            holdings = holdings_map.get(pf.fund_code, [])
-            if holdings:
-                holdings_date = holdings[0].report_date
-                stock_codes = [h.stock_code for h in holdings]
-                # Prefer scheduler-populated cache over redundant live HTTP calls
-                quotes: dict = {}
-                for _code in stock_codes:
-                    _cached = stock_cache.get(f"stock:{_code}")
-                    if _cached is not None:
-                        quotes[_code] = _cached
-                if not quotes:
-                    quotes = await market_data_service.get_stock_quotes_async(stock_codes)
-                holdings_data = [
-                    {
-                        "stock_code": h.stock_code,
-                        "stock_name": h.stock_name,
-                        "holding_ratio": h.holding_ratio,
-                    }
-                    for h in holdings
-                ]
-                estimate = fund_estimator.calculate_estimate(
-                    holdings_data, quotes, fund.last_nav
-                )
-                est_nav = estimate["est_nav"]
-                est_change_pct = estimate["est_change_pct"]
-                coverage = estimate["coverage"]
+        estimate = estimates.get(pf.fund_code)
+        est_nav = estimate["est_nav"] if estimate else last_nav
+        est_change_pct = estimate["est_change_pct"] if estimate else 0.0
+        coverage = estimate["coverage"] if estimate else 0.0
+        holdings_date = estimate["holdings_date"] if estimate else None
 
         cost = pf.shares * pf.cost_nav
         current_value = pf.shares * est_nav
@@ -111,7 +168,7 @@ async def get_portfolio_detail(portfolio_id: int, db: AsyncSession = Depends(get
         total_estimate += current_value
 
         funds_response.append(
-            PortfolioFundResponse(
+            PortfolioFundResponse.model_construct(
                 fund_code=pf.fund_code,
                 fund_name=fund_name,
                 shares=pf.shares,
@@ -132,7 +189,11 @@ async def get_portfolio_detail(portfolio_id: int, db: AsyncSession = Depends(get
     total_profit = total_estimate - total_cost
     total_profit_pct = (total_profit / total_cost * 100) if total_cost > 0 else 0.0
 
-    return PortfolioDetailResponse(
+    # Every field is computed above from DB rows, so skip Pydantic validation
+    # and hand the dump straight to orjson; returning a Response also stops
+    # FastAPI re-validating the nested funds against response_model (which is
+    # still declared for the OpenAPI schema).
+    detail = PortfolioDetailResponse.model_construct(
         id=portfolio.id,
         name=portfolio.name,
         created_at=portfolio.created_at,
@@ -142,6 +203,7 @@ async def get_portfolio_detail(portfolio_id: int, db: AsyncSession = Depends(get
         total_profit=round(total_profit, 2),
         total_profit_pct=round(total_profit_pct, 4),
     )
+    return ORJSONResponse(detail.model_dump())
 
 
 @router.delete("/{portfolio_id}")
@@ -301,19 +363,27 @@ async def get_portfolio_history(
     if not pf_list:
         return {"dates": [], "values": [], "costs": [], "profit_pcts": []}
 
-    today = datetime.now(_CST)
-    period_map = {
-        "7d": today - timedelta(days=7),
-        "30d": today - timedelta(days=30),
-        "ytd": datetime(today.year, 1, 1, tzinfo=_CST),
-        "1y": today - timedelta(days=365),
-    }
-    cutoff_str = period_map.get(period, today - timedelta(days=30)).strftime("%Y-%m-%d")
+    cutoff_str = _period_cutoff(
+        period if period in _HISTORY_PERIODS else "30d", datetime.now(_CST)
+    )
     total_cost = sum(pf.shares * pf.cost_nav for pf in pf_list)
 
-    # Fetch NAV history for each fund (1-hour cached), run in parallel
+    # Fetch NAV history for each fund (1-hour cached), run in parallel.  The
+    # stored nav_date lets an expired cache entry that is still current be
+    # revalidated without re-downloading the history.
+    funds_map = await fund_info_service.get_funds_by_codes(
+        db, [pf.fund_code for pf in pf_list]
+    )
+    # Done with the database; don't hold a pooled connection over the fetches
+    await db.close()
     nav_results = await asyncio.gather(
-        *[market_data_service.get_fund_nav_history_async(pf.fund_code) for pf in pf_list]
+        *[
+            market_data_service.get_fund_nav_history_async(
+                pf.fund_code,
+                latest_nav_date=getattr(funds_map.get(pf.fund_code), "nav_date", None),
+            )
+            for pf in pf_list
+        ]
     )
     full_navs: dict[str, dict[str, float]] = {
         pf.fund_code: nav for pf, nav in zip(pf_list, nav_results)
@@ -329,34 +399,35 @@ async def get_portfolio_history(
     if not all_dates:
         return {"dates": [], "values": [], "costs": [], "profit_pcts": []}
 
-    # Pre-sort NAV series per fund for O(log n) carry-forward lookups
-    nav_sorted: dict[str, tuple[list[str], list[float]]] = {
-        code: ([d for d, _ in sorted(nav.items())], [v for _, v in sorted(nav.items())])
+    # Pre-sort NAV series per fund for O(log n) carry-forward lookups.
+    # One sort per fund, split into parallel date/nav tuples in a single pass.
+    nav_sorted: dict[str, tuple[tuple[str, ...], tuple[float, ...]]] = {
+        code: tuple(zip(*sorted(nav.items()))) if nav else ((), ())
         for code, nav in full_navs.items()
     }
 
-    def nav_on_or_before(fund_code: str, date_str: str) -> float | None:
-        if fund_code not in nav_sorted:
-            return None
-        dates, navs = nav_sorted[fund_code]
-        idx = bisect.bisect_right(dates, date_str) - 1
-        return navs[idx] if idx >= 0 else None
-
-    dates_out, values_out, costs_out, profit_pcts_out = [], [], [], []
-    for date_str in all_dates:
-        value = sum(
-            pf.shares * (nav_on_or_before(pf.fund_code, date_str) or pf.cost_nav)
-            for pf in pf_list
-        )
-        profit_pct = (value - total_cost) / total_cost * 100 if total_cost > 0 else 0.0
-        dates_out.append(date_str)
-        values_out.append(round(value, 2))
-        costs_out.append(round(total_cost, 2))
-        profit_pcts_out.append(round(profit_pct, 4))
+    # Carry-forward NAV per fund across all dates in one vectorized search,
+    # then sum and round whole columns instead of per-date Python loops.
+    dates_arr = np.asarray(all_dates)
+    values = np.zeros(len(all_dates), dtype=np.float64)
+    for pf in pf_list:
+        fund_dates, fund_navs = nav_sorted.get(pf.fund_code, ((), ()))
+        navs_on_date = np.full(len(all_dates), pf.cost_nav, dtype=np.float64)
+        if fund_dates:
+            idx = np.searchsorted(np.asarray(fund_dates), dates_arr, side="right") - 1
+            picked = np.asarray(fund_navs, dtype=np.float64)[np.maximum(idx, 0)]
+            # No NAV yet (or a zero NAV) on a date falls back to the cost basis
+            navs_on_date = np.where((idx >= 0) & (picked != 0), picked, pf.cost_nav)
+        values += pf.shares * navs_on_date
+
+    if total_cost > 0:
+        profit_pcts = (values - total_cost) / total_cost * 100
+    else:
+        profit_pcts = np.zeros_like(values)
 
     return {
-        "dates": dates_out,
-        "values": values_out,
-        "costs": costs_out,
-        "profit_pcts": profit_pcts_out,
+        "dates": all_dates,
+        "values": np.round(values, 2).tolist(),
+        "costs": [round(total_cost, 2)] * len(all_dates),
+        "profit_pcts": np.round(profit_pcts, 4).tolist(),
     }
@@ -1,9 +1,15 @@
 """Pydantic schemas for API request/response."""
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
-class FundResponse(BaseModel):
+class _FrozenResponse(BaseModel):
+    """Base for response schemas: built once per row and never mutated afterwards."""
+
+    model_config = ConfigDict(frozen=True)
+
+
+class FundResponse(_FrozenResponse):
     fund_code: str
     fund_name: str
     fund_type: str
@@ -11,7 +17,7 @@ class FundResponse(BaseModel):
     nav_date: str | None = None
 
 
-class FundEstimateResponse(BaseModel):
+class FundEstimateResponse(_FrozenResponse):
     fund_code: str
     fund_name: str
     est_nav: float
@@ -22,7 +28,7 @@ class FundEstimateResponse(BaseModel):
     degraded: bool = False
 
 
-class HoldingResponse(BaseModel):
+class HoldingResponse(_FrozenResponse):
     stock_code: str
     stock_name: str
     holding_ratio: float
@@ -54,13 +60,13 @@ class PortfolioFundUpdateRequest(BaseModel):
     purchase_date: str | None = None  # YYYY-MM-DD; None clears it
 
 
-class PortfolioResponse(BaseModel):
+class PortfolioResponse(_FrozenResponse):
     id: int
     name: str
     created_at: str
 
 
-class PortfolioFundResponse(BaseModel):
+class PortfolioFundResponse(_FrozenResponse):
     fund_code: str
     fund_name: str
     shares: float
@@ -77,7 +83,7 @@ class PortfolioFundResponse(BaseModel):
     purchase_date: str | None = None
 
 
-class PortfolioDetailResponse(BaseModel):
+class PortfolioDetailResponse(_FrozenResponse):
     id: int
     name: str
     created_at: str
@@ -1,38 +1,29 @@
 """Fund search and setup endpoints."""
 
+import asyncio
 import logging
+from datetime import datetime
 
-import akshare as ak
+import numpy as np
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models.database import get_db
-from app.services.cache import fund_name_cache
+from app.models.database import get_write_db
 from app.services.fund_info import fund_info_service
+from app.services.fund_names import get_fund_name_table_async
 from app.services.market_data import market_data_service
 
 logger = logging.getLogger(__name__)
 
-_FUND_NAME_CACHE_KEY = "fund_name_table"
-
-
-def _get_fund_name_table():
-    """Return cached fund name DataFrame, refresh if stale."""
-    cached = fund_name_cache.get(_FUND_NAME_CACHE_KEY)
-    if cached is not None:
-        return cached
-    df = ak.fund_name_em()
-    fund_name_cache.set(_FUND_NAME_CACHE_KEY, df)
-    return df
-
 router = APIRouter(prefix="/api", tags=["search"])
 
 
 @router.post("/fund/setup/{fund_code}")
-async def setup_fund(fund_code: str, db: AsyncSession = Depends(get_db)):
+async def setup_fund(fund_code: str, db: AsyncSession = Depends(get_write_db)):
     """Fetch fund info and holdings from akshare and save to database.
 
-    This is used when adding a new fund to track.
+    This is used when adding a new fund to track.  The akshare calls block,
+    so they run in the thread pool rather than stalling the event loop.
     """
     # Check if fund already exists
     existing = await fund_info_service.get_fund(db, fund_code)
@@ -43,45 +34,50 @@ async def setup_fund(fund_code: str, db: AsyncSession = Depends(get_db)):
             "fund_name": existing.fund_name,
         }
 
-    # Fetch NAV
-    nav_data = market_data_service.get_fund_nav(fund_code)
+    # End the lookup's transaction so the write lock isn't held across the
+    # slow akshare fetches below.
+    await db.rollback()
+
+    # NAV, current-year holdings and name/type are independent lookups, so
+    # fetch them concurrently: wall time is the slowest call, not the sum.
+    year = str(datetime.now().year)
+    nav_data, (holdings, report_date), basic_info = await asyncio.gather(
+        market_data_service.get_fund_nav_async(fund_code),
+        market_data_service.get_fund_holdings_async(fund_code, year),
+        market_data_service.get_fund_basic_info(fund_code),
+    )
     if nav_data is None:
         raise HTTPException(
             status_code=404, detail=f"Fund {fund_code} not found in akshare"
         )
 
-    # Fetch holdings (current year, falling back to last year)
-    from datetime import datetime
-
-    year = str(datetime.now().year)
-    holdings, report_date = market_data_service.get_fund_holdings(fund_code, year)
-
     # If no holdings for current year, try last year
     if not holdings:
-        holdings, report_date = market_data_service.get_fund_holdings(fund_code, str(int(year) - 1))
+        holdings, report_date = await market_data_service.get_fund_holdings_async(
+            fund_code, str(int(year) - 1)
+        )
 
     # Get fund name and type
-    basic_info = market_data_service.get_fund_basic_info(fund_code)
     fund_name = basic_info["fund_name"] if basic_info else f"Fund-{fund_code}"
     fund_type = basic_info["fund_type"] if basic_info else "未知"
 
-    # Save fund
-    await fund_info_service.add_fund(
-        db,
-        fund_code=fund_code,
-        fund_name=fund_name,
-        fund_type=fund_type,
-        last_nav=nav_data["nav"],
-        nav_date=nav_data["nav_date"],
-    )
-
-    # Save holdings
-    if holdings and report_date:
-        # Only take top 10
-        top_holdings = holdings[:10]
-        await fund_info_service.update_holdings(
-            db, fund_code, top_holdings, report_date
+    # Fund row and its holdings go in together: one BEGIN IMMEDIATE
+    # transaction and a single commit (one fsync) instead of one per step.
+    async with db.begin():
+        await fund_info_service.add_fund(
+            db,
+            fund_code=fund_code,
+            fund_name=fund_name,
+            fund_type=fund_type,
+            last_nav=nav_data["nav"],
+            nav_date=nav_data["nav_date"],
+            commit=False,
         )
+        if holdings and report_date:
+            # Only take top 10
+            await fund_info_service.update_holdings(
+                db, fund_code, holdings[:10], report_date, commit=False
+            )
 
     return {
         "status": "created",
@@ -91,30 +87,39 @@ async def setup_fund(fund_code: str, db: AsyncSession = Depends(get_db)):
     }
 
 
+# Shorter queries match most of the ~20k-row table and are only ever
+# intermediate autocomplete keystrokes, so they are answered without a scan.
+_MIN_QUERY_LEN = 2
+
+
 @router.get("/fund/search")
 async def search_funds(q: str = ""):
-    """Search funds by name or code prefix.
+    """Search funds by code prefix (all-digit queries) or name substring.
 
     Returns up to 20 matches: [{fund_code, fund_name, fund_type}].
     """
     q = q.strip()
-    if not q:
+    if len(q) < _MIN_QUERY_LEN:
         return []
 
     try:
-        df = _get_fund_name_table()
-        mask = (
-            df["基金代码"].str.startswith(q)
-            | df["基金简称"].str.contains(q, case=False, na=False)
-        )
-        matched = df[mask].head(20)
+        table = await get_fund_name_table_async()
+        codes = table["codes"]
+        if q.isdigit():
+            # Codes are sorted, so every code starting with q is one contiguous range
+            lo = np.searchsorted(codes, q)
+            hi = np.searchsorted(codes, q + "\uffff")
+            matches = np.arange(lo, min(hi, lo + 20))
+        else:
+            mask = np.char.find(table["names_lower"], q.lower()) >= 0
+            matches = np.flatnonzero(mask)[:20]
         return [
             {
-                "fund_code": str(row["基金代码"]),
-                "fund_name": str(row["基金简称"]),
-                "fund_type": str(row["基金类型"]),
+                "fund_code": str(table["codes"][i]),
+                "fund_name": str(table["names"][i]),
+                "fund_type": str(table["types"][i]),
             }
-            for _, row in matched.iterrows()
+            for i in matches
         ]
     except Exception as e:
         logger.error(f"Fund search failed: {e}")
@@ -7,10 +7,32 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 DB_PATH = BASE_DIR / "data" / "fund_monitor.db"
 DATABASE_URL = os.getenv("DATABASE_URL") or f"sqlite+aiosqlite:///{DB_PATH}"
 
+# Browser origins allowed to call the API cross-origin (comma-separated).
+# Defaults to the Vite dev server; the docker frontend is same-origin via nginx.
+FRONTEND_ORIGINS = [
+    o.strip()
+    for o in os.getenv("FRONTEND_ORIGIN", "http://localhost:5173").split(",")
+    if o.strip()
+]
+CORS_MAX_AGE = 86400  # 1 day — browsers cache preflight responses this long
+
 # Cache settings (in-memory, replaces Redis for MVP)
 STOCK_CACHE_TTL = 604800  # 7 days — keeps last-known quotes across non-trading hours/weekends
 NAV_HISTORY_CACHE_TTL = 3600  # 1 hour — full NAV history per fund
+NAV_HISTORY_SNAPSHOT_DIR = BASE_DIR / "data" / "nav_history"  # one .npz per fund, survives restarts
 FUND_NAME_CACHE_TTL = 3600  # 1 hour — fund name table from akshare
+FUND_NAME_SNAPSHOT_PATH = BASE_DIR / "data" / "fund_name_index.npz"  # survives restarts
+FUND_CACHE_TTL = 60  # 1 minute — per-fund metadata row (name, type, last NAV)
+ESTIMATE_CACHE_TTL = 30  # 30 seconds — per-fund real-time estimate, one scheduler tick
+FUND_NAV_CACHE_TTL = 300  # 5 minutes — latest official NAV lookup (published once a day)
+FUND_HOLDINGS_CACHE_TTL = 3600  # 1 hour — quarterly top-10 holdings report
+INDEX_HISTORY_CACHE_TTL = 300  # 5 minutes — 上证指数 daily close series
+INDEX_INTRADAY_CACHE_TTL = 30  # 30 seconds — 上证指数 minute ticks, matches MARKET_DATA_INTERVAL
+INDEX_STALE_CACHE_TTL = 86400  # 1 day — last good index payload served when upstream fails
+
+# Worker threads behind asyncio.to_thread(); akshare/requests calls block for
+# seconds, and the default (cpu_count + 4, capped at 32) starves on small hosts
+BLOCKING_IO_THREADS = 32
 
 # Market data settings
 MARKET_DATA_INTERVAL = 30  # seconds between stock quote fetches
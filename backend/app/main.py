@@ -1,34 +1,55 @@
 """FastAPI application entry point."""
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from app.api.chart import router as chart_router
 from app.api.fund import router as fund_router
 from app.api.portfolio_routes import router as portfolio_router
 from app.api.search import router as search_router
-from app.models.database import init_db
+from app.config import BLOCKING_IO_THREADS, CORS_MAX_AGE, FRONTEND_ORIGINS
+from app.models.database import close_db, init_db
+from app.services.http_client import close_http_client
 from app.tasks.scheduler import start_scheduler, stop_scheduler
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # All blocking market-data calls go through asyncio.to_thread(), which uses
+    # the loop's default executor; size it explicitly for slow upstream calls.
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=BLOCKING_IO_THREADS, thread_name_prefix="blocking-io")
+    )
     await init_db()
     start_scheduler()
     yield
     stop_scheduler()
+    await close_http_client()
+    await close_db()
 
 
-app = FastAPI(title="Fund Monitor", version="0.1.0", lifespan=lifespan)
+# orjson serializes the long float/date chart lists in C
+app = FastAPI(
+    title="Fund Monitor",
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
+# Explicit origins/methods/headers instead of "*" so preflights are answered
+# from exact-match sets, and cached by the browser for CORS_MAX_AGE.
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=FRONTEND_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "PATCH", "DELETE"],
+    allow_headers=["content-type"],
+    max_age=CORS_MAX_AGE,
 )
 
 app.include_router(search_router)
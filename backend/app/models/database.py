@@ -1,8 +1,23 @@
 """Database engine and session setup."""
 
-from sqlalchemy import text
+from collections.abc import AsyncIterator
+
+from sqlalchemy import (
+    Integer,
+    MetaData,
+    String,
+    Table,
+    TypeDecorator,
+    event,
+    inspect,
+    make_url,
+    text,
+)
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.sql.functions import FunctionElement
 
 from app.config import DATABASE_URL
 
@@ -11,18 +26,243 @@ class Base(DeclarativeBase):
     pass
 
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+class iso_now(FunctionElement):
+    """Current local time as an ISO-8601 string, computed by the database.
+
+    Used as a column default so INSERTs render the timestamp inline instead
+    of building and binding a Python datetime per row; the ORM reads the
+    value back through RETURNING.
+    """
+
+    type = String()
+    inherit_cache = True
+
+
+@compiles(iso_now, "sqlite")
+def _iso_now_sqlite(element, compiler, **kw) -> str:
+    return "strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime')"
+
+
+@compiles(iso_now)
+def _iso_now_default(element, compiler, **kw) -> str:
+    return "CURRENT_TIMESTAMP"
+
+
+class Cents(TypeDecorator):
+    """A money amount exposed as float yuan but stored as integer cents.
+
+    Rounding to the cent happens once, on bind, so stored totals are exact and
+    compare and sort as integers in SQL.  Halves round away from zero, as SQL
+    ROUND() does in the float-column migration, not to even like round().
+    """
+
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        cents = int(abs(value) * 100 + 0.5)
+        return -cents if value < 0 else cents
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else value / 100
+
+
+# Applied to every new SQLite connection.  WAL lets the API keep reading while
+# the scheduler writes snapshots; synchronous=NORMAL is durable under WAL and
+# skips the per-commit fsync.  Negative cache_size is in KiB (~20 MB).
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA foreign_keys=ON",
+)
+
+
+def _set_sqlite_pragmas(dbapi_conn, _connection_record) -> None:
+    cursor = dbapi_conn.cursor()
+    for pragma in _SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+_url = make_url(DATABASE_URL)
+_is_sqlite = _url.get_backend_name() == "sqlite"
+# aiosqlite defaults to NullPool (a fresh connection, and fresh .db/-wal/-shm
+# opens, per session).  Pooling only applies to file-backed SQLite; :memory:
+# uses a StaticPool and a second engine would open a second, empty database.
+_is_sqlite_file = _is_sqlite and _url.database not in (None, "", ":memory:")
+
+
+def _create_engine(pool_size: int, max_overflow: int = 0):
+    kwargs = {}
+    if _is_sqlite:
+        # sqlite3's own busy wait, on top of the busy_timeout PRAGMA
+        kwargs["connect_args"] = {"timeout": 5.0}
+    if _is_sqlite_file:
+        kwargs.update(
+            poolclass=AsyncAdaptedQueuePool, pool_size=pool_size, max_overflow=max_overflow
+        )
+    new_engine = create_async_engine(_url, echo=False, **kwargs)
+    if _is_sqlite:
+        event.listen(new_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return new_engine
+
+
+def _disable_pysqlite_autobegin(dbapi_conn, _connection_record) -> None:
+    # Let SQLAlchemy's "begin" event issue BEGIN instead of sqlite3's implicit,
+    # deferred one (the documented pysqlite/aiosqlite transaction recipe).
+    dbapi_conn.isolation_level = None
+
+
+def _begin_immediate(conn) -> None:
+    # Take the write lock when the transaction starts, not at the first write:
+    # a deferred transaction that reads then writes can fail with SQLITE_BUSY
+    # instead of waiting out busy_timeout.
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+# Readers share a pool of long-lived connections (and their page caches).
+# WAL readers don't block each other, so the pool is sized for concurrent
+# requests and scheduler jobs (with overflow for bursts), not for CPUs.
+# SQLite allows only one writer at a time, so writes go through a one-slot
+# pool and queue in-process instead of fighting over the file lock.
+engine = _create_engine(pool_size=5, max_overflow=10)
+if _is_sqlite_file:
+    write_engine = _create_engine(pool_size=1)
+    event.listen(write_engine.sync_engine, "connect", _disable_pysqlite_autobegin)
+    event.listen(write_engine.sync_engine, "begin", _begin_immediate)
+else:
+    write_engine = engine
 async_session_factory = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
+write_session_factory = async_sessionmaker(
+    write_engine, class_=AsyncSession, expire_on_commit=False
+)
 
 
-async def get_db() -> AsyncSession:
-    """Dependency for FastAPI routes."""
+async def get_db() -> AsyncIterator[AsyncSession]:
+    """Dependency for FastAPI routes.
+
+    Kept ``async`` so FastAPI runs it on the event loop; a plain ``def``
+    dependency would be dispatched to the threadpool on every request.
+    """
     async with async_session_factory() as session:
         yield session
 
 
+async def get_write_db() -> AsyncIterator[AsyncSession]:
+    """Dependency for routes whose main job is writing (e.g. fund setup).
+
+    Every transaction on this session is BEGIN IMMEDIATE and holds the SQLite
+    write lock until it ends, so don't keep one open across slow awaits.
+    """
+    async with write_session_factory() as session:
+        yield session
+
+
+# (table, index declared on its model, indexes it supersedes)
+_INDEX_MIGRATIONS = (
+    (
+        "fund_estimate_snapshot",
+        "ix_fund_estimate_snapshot_code_date_time",
+        ("ix_fund_estimate_snapshot_code_date",),
+    ),
+    ("fund_holding", "ix_fund_holding_code_report_date", ("ix_fund_holding_fund_code",)),
+    (
+        "portfolio_snapshot",
+        "uq_portfolio_snapshot_portfolio_date",
+        (
+            "ix_portfolio_snapshot_portfolio_id",
+            "ix_portfolio_snapshot_snapshot_date",
+            "ix_portfolio_snapshot_portfolio_date",
+        ),
+    ),
+)
+
+# (table, unique index, DELETE keeping only the newest row per unique key).
+# Run before _INDEX_MIGRATIONS, and only while the unique index is missing, so
+# the index can be built on databases that predate it.  The kept ids go through
+# a derived table because MySQL can't select from the table a DELETE targets.
+_DEDUPE_MIGRATIONS = (
+    (
+        "portfolio_snapshot",
+        "uq_portfolio_snapshot_portfolio_date",
+        "DELETE FROM portfolio_snapshot WHERE id NOT IN (SELECT id FROM "
+        "(SELECT MAX(id) AS id FROM portfolio_snapshot GROUP BY portfolio_id, snapshot_date) "
+        "AS keep)",
+    ),
+)
+
+
+# (table, old float column, integer-cents column that replaces it)
+_CENTS_MIGRATIONS = (
+    ("portfolio_snapshot", "total_value", "total_value_cents"),
+    ("portfolio_snapshot", "total_cost", "total_cost_cents"),
+)
+
+
+def _column_names(sync_conn, table: str) -> set[str]:
+    return {col["name"] for col in inspect(sync_conn).get_columns(table)}
+
+
+def _index_names(sync_conn, table: str) -> set[str]:
+    return {index["name"] for index in inspect(sync_conn).get_indexes(table)}
+
+
+def _migrate_indexes(sync_conn) -> None:
+    """Build each model index missing from an existing table, then drop the old ones.
+
+    Goes through Index.create/drop rather than raw DDL so it renders for
+    whichever dialect DATABASE_URL points at.
+    """
+    for table_name, index_name, old_indexes in _INDEX_MIGRATIONS:
+        index = next(
+            ix for ix in Base.metadata.tables[table_name].indexes if ix.name == index_name
+        )
+        index.create(sync_conn, checkfirst=True)
+        reflected = Table(table_name, MetaData(), autoload_with=sync_conn)
+        for old_index in reflected.indexes:
+            if old_index.name in old_indexes:
+                old_index.drop(sync_conn)
+
+
+async def _migrate_cents_columns(conn) -> None:
+    """Move float money columns on existing SQLite tables to their Cents columns.
+
+    Refuses to drop an old column while any of its values failed to copy over.
+    """
+    for table, old, new in _CENTS_MIGRATIONS:
+        columns = await conn.run_sync(_column_names, table)
+        if old not in columns:
+            continue
+        if new not in columns:
+            await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {new} INTEGER"))
+        await conn.execute(
+            text(f"UPDATE {table} SET {new} = CAST(ROUND({old} * 100) AS INTEGER)")
+        )
+        unconverted = (await conn.execute(
+            text(f"SELECT COUNT(*) FROM {table} WHERE {new} IS NULL AND {old} IS NOT NULL")
+        )).scalar()
+        if unconverted:
+            raise RuntimeError(
+                f"{table}.{old}: {unconverted} rows not copied to {new}; not dropping it"
+            )
+        await conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {old}"))
+
+
+async def close_db() -> None:
+    """Close pooled connections (called from the app lifespan on shutdown)."""
+    if write_engine is not engine:
+        await write_engine.dispose()
+    await engine.dispose()
+
+
 async def init_db():
     """Create all tables and apply lightweight migrations."""
     async with engine.begin() as conn:
@@ -32,3 +272,14 @@ async def init_db():
             await conn.execute(text("ALTER TABLE portfolio_fund ADD COLUMN purchase_date TEXT"))
         except Exception:
             pass  # Column already exists
+        if _is_sqlite:
+            await _migrate_cents_columns(conn)
+        # Migration: replace single-column indexes with the composite ones the
+        # queries filter on.  create_all() skips indexes on tables that exist.
+        for table, unique_index, dedupe_sql in _DEDUPE_MIGRATIONS:
+            if unique_index not in await conn.run_sync(_index_names, table):
+                await conn.execute(text(dedupe_sql))
+        await conn.run_sync(_migrate_indexes)
+        # Refresh planner statistics (sqlite_stat1) for the new indexes
+        if _is_sqlite:
+            await conn.execute(text("ANALYZE"))
@@ -1,44 +1,53 @@
 """Fund and FundHolding models."""
 
-from datetime import datetime
-
 from sqlalchemy import Float, Index, String
 from sqlalchemy.orm import Mapped, mapped_column
 
-from app.models.database import Base
+from app.models.database import Base, iso_now
 
 
 class Fund(Base):
     __tablename__ = "fund"
 
+    # No explicit collation: SQLite's default for TEXT is already BINARY
+    # (memcmp), so PK/index lookups on fund_code never go through a collating
+    # function, and leaving it implicit keeps the DDL portable to MySQL.
     fund_code: Mapped[str] = mapped_column(String(10), primary_key=True)
     fund_name: Mapped[str] = mapped_column(String(100))
     fund_type: Mapped[str] = mapped_column(String(20))
     last_nav: Mapped[float | None] = mapped_column(Float, nullable=True)
     nav_date: Mapped[str | None] = mapped_column(String(10), nullable=True)
     updated_at: Mapped[str] = mapped_column(
-        String(30), default=lambda: datetime.now().isoformat()
+        String(30), default=iso_now()
     )
 
 
 class FundHolding(Base):
     __tablename__ = "fund_holding"
+    __table_args__ = (
+        Index("ix_fund_holding_code_report_date", "fund_code", "report_date"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    fund_code: Mapped[str] = mapped_column(String(10), index=True)
+    fund_code: Mapped[str] = mapped_column(String(10))
     stock_code: Mapped[str] = mapped_column(String(10))
     stock_name: Mapped[str] = mapped_column(String(50))
     holding_ratio: Mapped[float] = mapped_column(Float)
     report_date: Mapped[str] = mapped_column(String(10))
     updated_at: Mapped[str] = mapped_column(
-        String(30), default=lambda: datetime.now().isoformat()
+        String(30), default=iso_now()
     )
 
 
 class FundEstimateSnapshot(Base):
     __tablename__ = "fund_estimate_snapshot"
     __table_args__ = (
-        Index("ix_fund_estimate_snapshot_code_date", "fund_code", "snapshot_date"),
+        Index(
+            "ix_fund_estimate_snapshot_code_date_time",
+            "fund_code",
+            "snapshot_date",
+            "snapshot_time",
+        ),
     )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
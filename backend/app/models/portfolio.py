@@ -1,21 +1,29 @@
 """Portfolio and PortfolioFund models."""
 
-from datetime import datetime
-
-from sqlalchemy import Float, Integer, String
+from sqlalchemy import Float, Index, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column
 
-from app.models.database import Base
+from app.models.database import Base, Cents, iso_now
 
 
 class PortfolioSnapshot(Base):
     __tablename__ = "portfolio_snapshot"
+    __table_args__ = (
+        # One snapshot per portfolio per day; the daily job upserts against it
+        Index(
+            "uq_portfolio_snapshot_portfolio_date",
+            "portfolio_id",
+            "snapshot_date",
+            unique=True,
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    portfolio_id: Mapped[int] = mapped_column(Integer, index=True)
-    snapshot_date: Mapped[str] = mapped_column(String(10), index=True)  # "YYYY-MM-DD"
-    total_value: Mapped[float] = mapped_column(Float)
-    total_cost: Mapped[float] = mapped_column(Float)
+    portfolio_id: Mapped[int] = mapped_column(Integer)
+    snapshot_date: Mapped[str] = mapped_column(String(10))  # "YYYY-MM-DD"
+    # Stored as integer cents; the attributes read and write float yuan
+    total_value: Mapped[float] = mapped_column("total_value_cents", Cents)
+    total_cost: Mapped[float] = mapped_column("total_cost_cents", Cents)
 
     @property
     def profit_pct(self) -> float:
@@ -30,7 +38,7 @@ class Portfolio(Base):
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(100))
     created_at: Mapped[str] = mapped_column(
-        String(30), default=lambda: datetime.now().isoformat()
+        String(30), default=iso_now()
     )
 
 
@@ -43,6 +51,6 @@ class PortfolioFund(Base):
     shares: Mapped[float] = mapped_column(Float)
     cost_nav: Mapped[float] = mapped_column(Float)
     added_at: Mapped[str] = mapped_column(
-        String(30), default=lambda: datetime.now().isoformat()
+        String(30), default=iso_now()
     )
     purchase_date: Mapped[str | None] = mapped_column(String(10), nullable=True, default=None)
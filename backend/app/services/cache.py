@@ -2,17 +2,30 @@
 
 import threading
 import time
+from collections.abc import Callable
 from typing import Any
 
-from app.config import FUND_NAME_CACHE_TTL, NAV_HISTORY_CACHE_TTL, STOCK_CACHE_TTL
+from app.config import (
+    ESTIMATE_CACHE_TTL,
+    FUND_CACHE_TTL,
+    FUND_NAME_CACHE_TTL,
+    INDEX_STALE_CACHE_TTL,
+    NAV_HISTORY_CACHE_TTL,
+    STOCK_CACHE_TTL,
+)
 
 
 class CacheService:
-    """Thread-safe in-memory cache with TTL support."""
+    """Thread-safe in-memory cache with TTL support.
 
-    def __init__(self, default_ttl: int = 60):
+    Expiry is measured on time_fn, a monotonic clock by default so wall-clock
+    adjustments can't stretch or cut short a TTL; tests pass a fake clock.
+    """
+
+    def __init__(self, default_ttl: int = 60, time_fn: Callable[[], float] = time.monotonic):
         self._store: dict[str, tuple[Any, float]] = {}
         self._default_ttl = default_ttl
+        self._time = time_fn
         self._lock = threading.Lock()
 
     def get(self, key: str) -> Any | None:
@@ -21,14 +34,14 @@ class CacheService:
             if entry is None:
                 return None
             value, expires_at = entry
-            if time.time() > expires_at:
+            if self._time() > expires_at:
                 del self._store[key]
                 return None
             return value
 
     def set(self, key: str, value: Any, ttl: int | None = None) -> None:
         ttl = ttl if ttl is not None else self._default_ttl
-        expires_at = time.time() + ttl
+        expires_at = self._time() + ttl
         with self._lock:
             self._store[key] = (value, expires_at)
 
@@ -45,3 +58,7 @@ class CacheService:
 stock_cache = CacheService(default_ttl=STOCK_CACHE_TTL)
 nav_history_cache = CacheService(default_ttl=NAV_HISTORY_CACHE_TTL)
 fund_name_cache = CacheService(default_ttl=FUND_NAME_CACHE_TTL)
+estimate_cache = CacheService(default_ttl=ESTIMATE_CACHE_TTL)
+fund_cache = CacheService(default_ttl=FUND_CACHE_TTL)
+# Entries are (payload, fresh_until); kept past freshness as a stale fallback
+index_cache = CacheService(default_ttl=INDEX_STALE_CACHE_TTL)
@@ -7,7 +7,35 @@ Algorithm:
     est_nav = last_nav * (1 + est_change_pct / 100)
 """
 
-from typing import Any
+from typing import Any, NamedTuple
+
+
+class HoldingInput(NamedTuple):
+    """One holding row fed to the estimator (lighter than a per-row dict)."""
+
+    stock_code: str
+    stock_name: str
+    holding_ratio: float
+
+
+def quote_change_pcts(stock_quotes: dict[str, dict[str, Any]]) -> dict[str, float]:
+    """Flatten quotes to {stock_code: change_pct} once, for many estimate_summary calls."""
+    return {code: quote["change_pct"] for code, quote in stock_quotes.items()}
+
+
+def estimate_cache_key(fund_code: str, last_nav: float) -> str:
+    """Key for a fund's cached estimate; a new last_nav invalidates it implicitly."""
+    return f"estimate:{fund_code}:{last_nav}"
+
+
+def _estimate_totals(est_change_pct: float, coverage: float, last_nav: float) -> dict[str, Any]:
+    """The rounded est_nav/est_change_pct/coverage fields both estimate methods return."""
+    return {
+        "est_nav": round(last_nav * (1 + est_change_pct / 100), 4),
+        "est_change_pct": round(est_change_pct, 4),
+        "coverage": round(coverage, 4),
+        "last_nav": last_nav,
+    }
 
 
 class FundEstimator:
@@ -15,14 +43,14 @@ class FundEstimator:
 
     def calculate_estimate(
         self,
-        holdings: list[dict[str, Any]],
+        holdings: list[HoldingInput],
         stock_quotes: dict[str, dict[str, Any]],
         last_nav: float,
     ) -> dict[str, Any]:
         """Calculate estimated NAV change for a fund.
 
         Args:
-            holdings: List of {stock_code, stock_name, holding_ratio}.
+            holdings: List of HoldingInput(stock_code, stock_name, holding_ratio).
             stock_quotes: Dict of stock_code -> {price, change_pct, name}.
             last_nav: The fund's last published NAV.
 
@@ -34,13 +62,11 @@ class FundEstimator:
         coverage = 0.0
         details = []
 
-        for holding in holdings:
-            stock_code = holding["stock_code"]
+        for stock_code, stock_name, ratio in holdings:
             quote = stock_quotes.get(stock_code)
             if quote is None:
                 continue
 
-            ratio = holding["holding_ratio"]
             change_pct = quote["change_pct"]
             contribution = ratio * change_pct
 
@@ -50,7 +76,7 @@ class FundEstimator:
             details.append(
                 {
                     "stock_code": stock_code,
-                    "stock_name": holding["stock_name"],
+                    "stock_name": stock_name,
                     "holding_ratio": ratio,
                     "price": quote["price"],
                     "change_pct": change_pct,
@@ -58,15 +84,30 @@ class FundEstimator:
                 }
             )
 
-        est_nav = last_nav * (1 + est_change_pct / 100)
+        return {**_estimate_totals(est_change_pct, coverage, last_nav), "details": details}
+
+    def estimate_summary(
+        self,
+        holdings: list[HoldingInput],
+        change_pcts: dict[str, float],
+        last_nav: float,
+    ) -> dict[str, Any]:
+        """Same est_nav/est_change_pct/coverage as calculate_estimate, without details.
+
+        For callers that estimate many funds against one quote set: flatten the
+        quotes once with quote_change_pcts() and skip the per-holding detail
+        dicts they would discard anyway.
+        """
+        est_change_pct = 0.0
+        coverage = 0.0
+        for stock_code, _, ratio in holdings:
+            change_pct = change_pcts.get(stock_code)
+            if change_pct is None:
+                continue
+            est_change_pct += ratio * change_pct
+            coverage += ratio
 
-        return {
-            "est_nav": round(est_nav, 4),
-            "est_change_pct": round(est_change_pct, 4),
-            "coverage": round(coverage, 4),
-            "last_nav": last_nav,
-            "details": details,
-        }
+        return _estimate_totals(est_change_pct, coverage, last_nav)
 
 
 # Global instance
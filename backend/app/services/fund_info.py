@@ -1,16 +1,49 @@
 """Fund information CRUD service."""
 
+import asyncio
 from collections import defaultdict
+from typing import NamedTuple
+from weakref import WeakValueDictionary
 
-from sqlalchemy import delete, select
+from sqlalchemy import Row, delete, insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.fund import Fund, FundHolding
+from app.services.cache import fund_cache
+
+# Read paths select plain columns: the rows support the same attribute access
+# as the models but skip ORM instance construction and the identity map.
+_FUND_COLUMNS = (
+    Fund.fund_code, Fund.fund_name, Fund.fund_type, Fund.last_nav, Fund.nav_date
+)
+_HOLDING_COLUMNS = (
+    FundHolding.fund_code,
+    FundHolding.stock_code,
+    FundHolding.stock_name,
+    FundHolding.holding_ratio,
+    FundHolding.report_date,
+)
+
+
+class FundRecord(NamedTuple):
+    """Immutable copy of a Fund row, safe to share across sessions via the cache."""
+
+    fund_code: str
+    fund_name: str
+    fund_type: str
+    last_nav: float | None
+    nav_date: str | None
+    updated_at: str
 
 
 class FundInfoService:
     """Manages fund metadata and holdings in the database."""
 
+    def __init__(self) -> None:
+        # Per-fund locks so concurrent cache misses share one DB lookup.  Held
+        # weakly: an entry lives only while some get_fund() call holds its lock.
+        self._fund_locks: WeakValueDictionary[str, asyncio.Lock] = WeakValueDictionary()
+
     async def add_fund(
         self,
         session: AsyncSession,
@@ -19,7 +52,9 @@ class FundInfoService:
         fund_type: str,
         last_nav: float | None = None,
         nav_date: str | None = None,
+        commit: bool = True,
     ) -> Fund:
+        """Insert a fund; with commit=False it is only staged on the session."""
         fund = Fund(
             fund_code=fund_code,
             fund_name=fund_name,
@@ -28,11 +63,45 @@ class FundInfoService:
             nav_date=nav_date,
         )
         session.add(fund)
-        await session.commit()
+        if commit:
+            await session.commit()
+        self.invalidate_fund(fund_code)
         return fund
 
-    async def get_fund(self, session: AsyncSession, fund_code: str) -> Fund | None:
-        return await session.get(Fund, fund_code)
+    async def get_fund(self, session: AsyncSession, fund_code: str) -> FundRecord | None:
+        """Return a read-only snapshot of the fund, memoized for FUND_CACHE_TTL.
+
+        Chart, estimate and portfolio routes all start with this lookup, so it
+        is served from the cache.  Writes to the row must call invalidate_fund().
+        Missing funds are not cached — they may be set up a moment later.
+        """
+        key = f"fund:{fund_code}"
+        record = fund_cache.get(key)
+        if record is not None:
+            return record
+        lock = self._fund_locks.setdefault(fund_code, asyncio.Lock())
+        async with lock:
+            # Another request may have filled the cache while we waited
+            record = fund_cache.get(key)
+            if record is not None:
+                return record
+            fund = await session.get(Fund, fund_code)
+            if fund is None:
+                return None
+            record = FundRecord(
+                fund_code=fund.fund_code,
+                fund_name=fund.fund_name,
+                fund_type=fund.fund_type,
+                last_nav=fund.last_nav,
+                nav_date=fund.nav_date,
+                updated_at=fund.updated_at,
+            )
+            fund_cache.set(key, record)
+            return record
+
+    def invalidate_fund(self, fund_code: str) -> None:
+        """Drop the memoized get_fund() result after the fund row changes."""
+        fund_cache.delete(f"fund:{fund_code}")
 
     async def get_all_funds(self, session: AsyncSession) -> list[Fund]:
         result = await session.execute(select(Fund))
@@ -46,6 +115,7 @@ class FundInfoService:
             fund.last_nav = nav
             fund.nav_date = nav_date
             await session.commit()
+            self.invalidate_fund(fund_code)
 
     async def update_holdings(
         self,
@@ -53,55 +123,64 @@ class FundInfoService:
         fund_code: str,
         holdings_data: list[dict],
         report_date: str,
+        commit: bool = True,
     ) -> None:
+        """Replace a fund's holdings; with commit=False the caller commits."""
         # Delete old holdings for this fund
         await session.execute(
             delete(FundHolding).where(FundHolding.fund_code == fund_code)
         )
 
-        # Insert new holdings
-        for h in holdings_data:
-            holding = FundHolding(
-                fund_code=fund_code,
-                stock_code=h["stock_code"],
-                stock_name=h["stock_name"],
-                holding_ratio=h["holding_ratio"],
-                report_date=report_date,
+        # Insert new holdings as one executemany instead of a flush per object
+        if holdings_data:
+            await session.execute(
+                insert(FundHolding),
+                [
+                    {
+                        "fund_code": fund_code,
+                        "stock_code": h["stock_code"],
+                        "stock_name": h["stock_name"],
+                        "holding_ratio": h["holding_ratio"],
+                        "report_date": report_date,
+                    }
+                    for h in holdings_data
+                ],
             )
-            session.add(holding)
 
-        await session.commit()
+        if commit:
+            await session.commit()
 
     async def get_holdings(
         self, session: AsyncSession, fund_code: str
-    ) -> list[FundHolding]:
+    ) -> list[Row]:
+        """Return a fund's holdings as read-only rows (attribute access like the model)."""
         result = await session.execute(
-            select(FundHolding).where(FundHolding.fund_code == fund_code)
+            select(*_HOLDING_COLUMNS).where(FundHolding.fund_code == fund_code)
         )
-        return list(result.scalars().all())
+        return list(result.all())
 
     async def get_funds_by_codes(
         self, session: AsyncSession, fund_codes: list[str]
-    ) -> dict[str, Fund]:
-        """Fetch multiple funds in a single query. Returns {fund_code: Fund}."""
+    ) -> dict[str, Row]:
+        """Fetch multiple funds in a single query. Returns {fund_code: row}."""
         if not fund_codes:
             return {}
         result = await session.execute(
-            select(Fund).where(Fund.fund_code.in_(fund_codes))
+            select(*_FUND_COLUMNS).where(Fund.fund_code.in_(fund_codes))
         )
-        return {f.fund_code: f for f in result.scalars().all()}
+        return {f.fund_code: f for f in result.all()}
 
     async def get_holdings_by_fund_codes(
         self, session: AsyncSession, fund_codes: list[str]
-    ) -> dict[str, list[FundHolding]]:
-        """Fetch holdings for multiple funds in a single query. Returns {fund_code: [FundHolding]}."""
+    ) -> dict[str, list[Row]]:
+        """Fetch holdings for multiple funds in a single query. Returns {fund_code: [row]}."""
         if not fund_codes:
             return {}
         result = await session.execute(
-            select(FundHolding).where(FundHolding.fund_code.in_(fund_codes))
+            select(*_HOLDING_COLUMNS).where(FundHolding.fund_code.in_(fund_codes))
         )
-        grouped: dict[str, list[FundHolding]] = defaultdict(list)
-        for h in result.scalars().all():
+        grouped: dict[str, list[Row]] = defaultdict(list)
+        for h in result.all():
             grouped[h.fund_code].append(h)
         return dict(grouped)
 
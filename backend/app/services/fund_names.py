@@ -0,0 +1,115 @@
+"""Fund code/name/type table from akshare, shared by search and fund setup.
+
+ak.fund_name_em() downloads the whole fund list (~20k rows) and takes
+seconds, so it is fetched at most once per FUND_NAME_CACHE_TTL, kept in
+memory as code-sorted NumPy arrays and persisted to disk so a restart
+doesn't pay for it again.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+import akshare as ak
+import numpy as np
+
+from app.config import FUND_NAME_CACHE_TTL, FUND_NAME_SNAPSHOT_PATH
+from app.services.cache import fund_name_cache
+
+logger = logging.getLogger(__name__)
+
+_FUND_NAME_CACHE_KEY = "fund_name_table"
+
+
+def _build_fund_name_index(df) -> dict[str, np.ndarray]:
+    """Precompute the arrays search scans, sorted by fund code.
+
+    Sorting lets code-prefix matches (and exact code lookups) be a
+    searchsorted range, and lowercasing the names once keeps
+    case-insensitive matching out of the per-query path.
+    """
+    codes = df["基金代码"].to_numpy(dtype=str)
+    order = np.argsort(codes, kind="stable")
+    names = df["基金简称"].fillna("").to_numpy(dtype=str)[order]
+    return {
+        "codes": codes[order],
+        "names": names,
+        "names_lower": np.char.lower(names),
+        "types": df["基金类型"].fillna("").to_numpy(dtype=str)[order],
+    }
+
+
+def _save_fund_name_snapshot(table: dict[str, np.ndarray]) -> None:
+    """Write the index to disk atomically (tmp file + rename)."""
+    path = FUND_NAME_SNAPSHOT_PATH
+    tmp = path.with_suffix(".tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp, "wb") as f:
+            np.savez(f, **table)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning(f"Could not persist fund name snapshot: {e}")
+
+
+def _load_fund_name_snapshot() -> tuple[dict[str, np.ndarray], float] | None:
+    """Return (index, mtime) from the on-disk snapshot, or None if unusable."""
+    try:
+        with np.load(FUND_NAME_SNAPSHOT_PATH) as f:
+            table = {k: f[k] for k in f.files}
+        return table, FUND_NAME_SNAPSHOT_PATH.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable fund name snapshot: {e}")
+        return None
+
+
+def _fetch_fund_name_table() -> dict[str, np.ndarray]:
+    """Download the fund list from akshare, index it, cache and persist it."""
+    table = _build_fund_name_index(ak.fund_name_em())
+    fund_name_cache.set(_FUND_NAME_CACHE_KEY, table)
+    _save_fund_name_snapshot(table)
+    return table
+
+
+def _cache_snapshot(table: dict[str, np.ndarray], mtime: float) -> bool:
+    """Put a disk snapshot in memory; return True if it is still fresh."""
+    age = time.time() - mtime
+    if age < FUND_NAME_CACHE_TTL:
+        fund_name_cache.set(_FUND_NAME_CACHE_KEY, table, ttl=int(FUND_NAME_CACHE_TTL - age) + 1)
+        return True
+    fund_name_cache.set(_FUND_NAME_CACHE_KEY, table)
+    return False
+
+
+_refresh_task: asyncio.Task | None = None
+
+
+async def _refresh_fund_name_table() -> None:
+    try:
+        await asyncio.to_thread(_fetch_fund_name_table)
+    except Exception as e:
+        logger.warning(f"Background fund name refresh failed: {e}")
+
+
+async def get_fund_name_table_async() -> dict[str, np.ndarray]:
+    """Return the fund name index without blocking the event loop.
+
+    After a restart the last snapshot is served straight away; a stale one
+    is refreshed in the background (stale-while-revalidate).
+    """
+    global _refresh_task
+    cached = fund_name_cache.get(_FUND_NAME_CACHE_KEY)
+    if cached is not None:
+        return cached
+
+    snapshot = await asyncio.to_thread(_load_fund_name_snapshot)
+    if snapshot is None:
+        return await asyncio.to_thread(_fetch_fund_name_table)
+
+    if not _cache_snapshot(*snapshot):
+        if _refresh_task is None or _refresh_task.done():
+            _refresh_task = asyncio.create_task(_refresh_fund_name_table())
+    return snapshot[0]
@@ -0,0 +1,37 @@
+"""Shared async HTTP client for outbound finance API calls.
+
+One pooled httpx.AsyncClient is reused across requests so keep-alive
+connections to eastmoney & co. survive between calls instead of paying a
+fresh TCP+TLS handshake each time.  HTTP/2 is negotiated where the server
+supports it, and responses are requested gzip-compressed (the JSON payloads
+compress well); httpx decodes them transparently.
+"""
+
+import httpx
+
+_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it lazily on first use.
+
+    Lazy creation keeps tests and scripts that never run the FastAPI lifespan
+    working; the lifespan only has to close it.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            headers={"Accept-Encoding": "gzip"},
+            timeout=10,
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+        )
+    return _client
+
+
+async def close_http_client() -> None:
+    """Close the shared client (called from the app lifespan on shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
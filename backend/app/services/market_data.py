@@ -1,24 +1,41 @@
 """Market data service using akshare for fund info and eastmoney API for stock quotes."""
 
 import asyncio
+import functools
 import logging
+import os
+import re
+import threading
 import time
+from collections.abc import Callable
 from datetime import datetime, timedelta, timezone
+from pathlib import Path
 from typing import Any
+from weakref import WeakValueDictionary
 
 import akshare as ak
-import requests
-
-from app.services.cache import nav_history_cache
+import httpx
+import numpy as np
+import orjson
+
+from app.config import (
+    FUND_HOLDINGS_CACHE_TTL,
+    FUND_NAV_CACHE_TTL,
+    NAV_HISTORY_CACHE_TTL,
+    NAV_HISTORY_SNAPSHOT_DIR,
+)
+from app.services.cache import CacheService, nav_history_cache
+from app.services.fund_names import get_fund_name_table_async
+from app.services.http_client import get_http_client
 
 logger = logging.getLogger(__name__)
 
 # China Standard Time (UTC+8)
 _CST = timezone(timedelta(hours=8))
 
-# Cache for is_market_trading_today(): (timestamp, result)
-_trading_today_cache: tuple[float, bool] | None = None
-_TRADING_TODAY_CACHE_TTL = 300  # 5 minutes
+# Cache for is_market_trading_today(): (date_str, timestamp, result)
+_trading_today_cache: tuple[str, float, bool] | None = None
+_TRADING_TODAY_CACHE_TTL = 300  # 5 minutes — only applies to a negative result
 
 # Browser-like headers to avoid anti-bot blocking on eastmoney APIs
 _EM_HEADERS = {
@@ -30,67 +47,210 @@ _EM_HEADERS = {
     "Referer": "https://finance.eastmoney.com/",
 }
 
+# Max secids per East Money ulist.np request; larger lists are split and fetched in parallel
+_EM_QUOTE_BATCH_SIZE = 50
+
+# Official NAVs are published in the evening; the scheduler picks them up at 20:30 CST
+_NAV_REFRESH_HOUR, _NAV_REFRESH_MINUTE = 20, 30
+
+
+def seconds_until_nav_refresh(now: datetime | None = None) -> int:
+    """Return seconds until the next 20:30 CST NAV refresh (at least 60).
+
+    NAV history only changes once per trading day, so caches keyed on it can
+    stay valid until the next refresh instead of using a fixed short TTL.
+    """
+    now = now or datetime.now(_CST)
+    target = now.replace(
+        hour=_NAV_REFRESH_HOUR, minute=_NAV_REFRESH_MINUTE, second=0, microsecond=0
+    )
+    if now >= target:
+        target += timedelta(days=1)
+    return max(int((target - now).total_seconds()), 60)
+
+
+# 季度 labels on akshare holdings reports, e.g. "2025年4季度股票投资明细"
+_QUARTER_RE = re.compile(r"(\d{4})年(\d)季度")
+_INTERIM_REPORT_RE = re.compile(r"(\d{4})年中报")
+_ANNUAL_REPORT_RE = re.compile(r"(\d{4})年年报")
+
+
+# Exchange by leading digit (9xxxxx are Shanghai B shares); anything not
+# listed is Shenzhen
+_EXCHANGE_BY_LEAD = {"6": "sh", "9": "sh", "4": "bj", "8": "bj"}
+# East Money secid market: 1 = Shanghai, 0 = everything else
+_EM_MARKET_BY_LEAD = {"6": "1", "9": "1"}
+
 
 def _stock_exchange_prefix(code: str) -> str:
     """Return 'sh' for Shanghai stocks, 'sz' for Shenzhen, 'bj' for Beijing."""
-    code = str(code).zfill(6)
-    if code.startswith("6"):
-        return "sh"
-    if code.startswith(("4", "8")):
-        return "bj"
-    return "sz"
+    return _EXCHANGE_BY_LEAD.get(str(code).zfill(6)[0], "sz")
+
+
+def _eastmoney_secid(code: str) -> str:
+    """Return East Money's "<market>.<code>" id for a 6-digit stock code."""
+    return f"{_EM_MARKET_BY_LEAD.get(code[0], '0')}.{code}"
+
+
+def _nav_history_snapshot_path(fund_code: str) -> Path | None:
+    # fund_code comes from the URL; only plain numeric codes map to a file
+    if not fund_code.isdigit():
+        return None
+    return NAV_HISTORY_SNAPSHOT_DIR / f"{fund_code}.npz"
+
+
+def _load_nav_history_snapshot(fund_code: str) -> tuple[dict[str, float], float] | None:
+    """Return (nav_dict, age_seconds) from the on-disk snapshot, or None if unusable."""
+    path = _nav_history_snapshot_path(fund_code)
+    if path is None:
+        return None
+    try:
+        age = time.time() - path.stat().st_mtime
+        with np.load(path) as f:
+            return dict(zip(f["dates"].tolist(), f["navs"].tolist())), age
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable NAV history snapshot for {fund_code}: {e}")
+        return None
+
+
+def _save_nav_history_snapshot(fund_code: str, nav_dict: dict[str, float]) -> None:
+    """Write the NAV history to disk atomically (tmp file + rename)."""
+    path = _nav_history_snapshot_path(fund_code)
+    if path is None:
+        return
+    tmp = path.with_suffix(".tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                dates=np.array(list(nav_dict), dtype=str),
+                navs=np.fromiter(nav_dict.values(), dtype=np.float64, count=len(nav_dict)),
+            )
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning(f"Could not persist NAV history snapshot for {fund_code}: {e}")
+
+
+def _touch_nav_history_snapshot(fund_code: str) -> None:
+    """Restart a revalidated snapshot's TTL (its age is the file's mtime)."""
+    try:
+        os.utime(_nav_history_snapshot_path(fund_code))
+    except OSError as e:
+        logger.warning(f"Could not touch NAV history snapshot for {fund_code}: {e}")
+
+
+def _ttl_cached(ttl: int, should_cache: Callable[[Any], bool]):
+    """Memoize a blocking MarketDataService lookup on its positional args.
+
+    Callers run these in worker threads (asyncio.to_thread), so concurrent
+    misses for the same key are coalesced with a per-key threading.Lock: the
+    first caller fetches, the rest wait and read its result.  Results that
+    look like failures (per ``should_cache``) are not cached.  Pass
+    ``fresh=True`` to skip the cached value and store a newly fetched one.
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, fresh: bool = False):
+            key = f"{fn.__name__}:{':'.join(map(str, args))}"
+            if not fresh:
+                cached = self._lookup_cache.get(key)
+                if cached is not None:
+                    return cached
+            with self._lookup_locks_guard:
+                lock = self._lookup_locks.setdefault(key, threading.Lock())
+            with lock:
+                if not fresh:
+                    cached = self._lookup_cache.get(key)
+                    if cached is not None:
+                        return cached
+                result = fn(self, *args)
+                if should_cache(result):
+                    self._lookup_cache.set(key, result, ttl=ttl)
+                return result
+
+        return wrapper
+
+    return decorator
 
 
 class MarketDataService:
     """Fetches market data from akshare and direct finance APIs."""
 
-    def get_fund_basic_info(self, fund_code: str) -> dict[str, str] | None:
-        """Get fund name and type from akshare.
+    def __init__(self) -> None:
+        # In-flight is_market_trading_today() lookup shared by concurrent callers
+        self._trading_today_task: asyncio.Future[bool] | None = None
+        # Backing store for @_ttl_cached akshare lookups
+        self._lookup_cache = CacheService()
+        # Held weakly: a key's lock lives only while a lookup is using it
+        self._lookup_locks: WeakValueDictionary[str, threading.Lock] = WeakValueDictionary()
+        self._lookup_locks_guard = threading.Lock()
+
+    async def get_fund_basic_info(self, fund_code: str) -> dict[str, str] | None:
+        """Get fund name and type from the cached akshare fund name table.
+
+        The table comes from memory or the on-disk snapshot (refreshed in the
+        background when stale), so adding a fund never waits on the full
+        fund_name_em() download once a snapshot exists.
 
         Returns {fund_name, fund_type} or None.
         """
         try:
-            df = ak.fund_name_em()
-            row = df[df["基金代码"] == fund_code]
-            if row.empty:
+            table = await get_fund_name_table_async()
+            codes = table["codes"]
+            # Codes are sorted: binary search instead of a full-column scan
+            i = int(np.searchsorted(codes, fund_code))
+            if i == len(codes) or codes[i] != fund_code:
                 return None
-            first = row.iloc[0]
             return {
-                "fund_name": str(first["基金简称"]),
-                "fund_type": str(first["基金类型"]),
+                "fund_name": str(table["names"][i]),
+                "fund_type": str(table["types"][i]),
             }
         except Exception as e:
             logger.error(f"Failed to fetch fund basic info for {fund_code}: {e}")
             return None
 
-    def is_market_trading_today(self) -> bool:
+    async def is_market_trading_today(self) -> bool:
         """Return True if the A-share market has trading data for today.
 
         Uses the CSI 300 intraday trends endpoint (push2his.eastmoney.com) as the
         source of truth.  On weekends and public holidays the endpoint returns the
         last trading day's data, whose date will not match today.
 
-        Result is cached for 5 minutes to avoid a live HTTP call on every
-        /estimate request.
+        Result is cached per CST date: a positive answer holds until midnight
+        (a day that has traded stays traded), a negative one for 5 minutes so the
+        09:30 open is picked up promptly.
         """
-        global _trading_today_cache
-
         now_cst = datetime.now(_CST)
         today_str = now_cst.strftime("%Y-%m-%d")
         if now_cst.weekday() >= 5:  # Saturday or Sunday
             return False
 
         # Return cached result if still fresh
-        now_ts = time.time()
         if _trading_today_cache is not None:
-            cached_ts, cached_result = _trading_today_cache
-            if now_ts - cached_ts < _TRADING_TODAY_CACHE_TTL:
+            cached_date, cached_ts, cached_result = _trading_today_cache
+            if cached_date == today_str and (
+                cached_result or time.time() - cached_ts < _TRADING_TODAY_CACHE_TTL
+            ):
                 return cached_result
 
+        # Concurrent requests on a cold cache await one shared lookup instead of
+        # each issuing its own HTTP call (dog-pile protection).
+        task = self._trading_today_task
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(self._fetch_trading_today(today_str))
+            self._trading_today_task = task
+        return await asyncio.shield(task)
+
+    async def _fetch_trading_today(self, today_str: str) -> bool:
+        global _trading_today_cache
         try:
             # Use push2his.eastmoney.com — same host that serves the intraday index
             # endpoint and is accessible from this server.
-            resp = requests.get(
+            resp = await get_http_client().get(
                 "https://push2his.eastmoney.com/api/qt/stock/trends2/get",
                 params={
                     "secid": "1.000300",
@@ -102,7 +262,7 @@ class MarketDataService:
                 timeout=5,
                 headers=_EM_HEADERS,
             )
-            data = resp.json()
+            data = orjson.loads(resp.content)
             trends = (data.get("data") or {}).get("trends", [])
             if not trends:
                 result = False
@@ -110,12 +270,12 @@ class MarketDataService:
                 # Entry format: "2026-02-13 09:30,..."
                 first_date = trends[0].split(",")[0].split(" ")[0]
                 result = first_date == today_str
-            _trading_today_cache = (now_ts, result)
+            _trading_today_cache = (today_str, time.time(), result)
             return result
         except Exception:
             return True  # If check fails, assume market is open
 
-    def _get_stock_quotes_via_sina(
+    async def _get_stock_quotes_via_sina(
         self, stock_codes: list[str]
     ) -> dict[str, dict[str, Any]]:
         """Fetch real-time quotes from Sina Finance API (hq.sinajs.cn).
@@ -127,7 +287,7 @@ class MarketDataService:
         """
         normalized = [str(c).zfill(6) for c in stock_codes]
         symbols = [f"{_stock_exchange_prefix(c)}{c}" for c in normalized]
-        resp = requests.get(
+        resp = await get_http_client().get(
             f"https://hq.sinajs.cn/rn={int(time.time())}&list={','.join(symbols)}",
             headers={
                 "Referer": "https://finance.sina.com.cn/",
@@ -169,7 +329,7 @@ class MarketDataService:
                 continue
         return result
 
-    def _get_stock_quotes_via_tencent(
+    async def _get_stock_quotes_via_tencent(
         self, stock_codes: list[str]
     ) -> dict[str, dict[str, Any]]:
         """Fetch real-time quotes from Tencent Finance API (qt.gtimg.cn).
@@ -181,7 +341,7 @@ class MarketDataService:
         """
         normalized = [str(c).zfill(6) for c in stock_codes]
         query = ",".join(f"{_stock_exchange_prefix(c)}{c}" for c in normalized)
-        resp = requests.get(
+        resp = await get_http_client().get(
             f"https://qt.gtimg.cn/q={query}",
             headers={"User-Agent": "Mozilla/5.0"},
             timeout=10,
@@ -205,25 +365,31 @@ class MarketDataService:
                 continue
         return result
 
-    def _get_stock_quotes_via_eastmoney(
+    async def _get_stock_quotes_via_eastmoney(
         self, stock_codes: list[str]
     ) -> dict[str, dict[str, Any]]:
         """Fetch real-time quotes from East Money API (push2.eastmoney.com).
 
         Uses the same API that powers the index quotes for consistency.
         """
-        normalized = [str(c).zfill(6) for c in stock_codes]
+        secids = [_eastmoney_secid(str(c).zfill(6)) for c in stock_codes]
+        # Bounded batches keep the URL short and let one slow batch not hold
+        # up the rest; they are fetched concurrently over the pooled client.
+        batches = [
+            secids[i:i + _EM_QUOTE_BATCH_SIZE]
+            for i in range(0, len(secids), _EM_QUOTE_BATCH_SIZE)
+        ]
+        responses = await asyncio.gather(
+            *(self._fetch_eastmoney_ulist(batch) for batch in batches)
+        )
 
-        # Build secids: 0.XXXXXX for Shanghai, 1.XXXXXX for Shenzhen
-        # Shanghai stocks start with 6, Shenzhen with 0, 3, or 0 (for 300xxx)
-        secids = []
-        for code in normalized:
-            if code.startswith('6'):
-                secids.append(f"1.{code}")  # Shanghai
-            else:
-                secids.append(f"0.{code}")  # Shenzhen
+        result: dict[str, dict[str, Any]] = {}
+        for resp in responses:
+            result.update(self._parse_eastmoney_ulist(resp))
+        return result
 
-        resp = requests.get(
+    async def _fetch_eastmoney_ulist(self, secids: list[str]) -> httpx.Response:
+        return await get_http_client().get(
             "https://push2.eastmoney.com/api/qt/ulist.np/get",
             params={
                 "fltt": "2",
@@ -238,10 +404,16 @@ class MarketDataService:
             timeout=10,
         )
 
-        data = resp.json()
+    @staticmethod
+    def _parse_eastmoney_ulist(resp: httpx.Response) -> dict[str, dict[str, Any]]:
+        body = resp.content
+        # No stock matched (e.g. all suspended): skip materializing the JSON
+        if b'"data":null' in body or b'"diff":null' in body:
+            return {}
+        data = orjson.loads(body)
         result: dict[str, dict[str, Any]] = {}
 
-        diff = data.get("data", {}).get("diff", [])
+        diff = (data.get("data") or {}).get("diff") or []
         for item in diff:
             try:
                 code = item.get("f12", "")[-6:]  # Get last 6 digits
@@ -262,7 +434,7 @@ class MarketDataService:
 
         return result
 
-    def get_stock_quotes(self, stock_codes: list[str]) -> dict[str, dict[str, Any]]:
+    async def get_stock_quotes(self, stock_codes: list[str]) -> dict[str, dict[str, Any]]:
         """Get real-time quotes for a list of stock codes.
 
         Tries East Money first (same source as index), falls back to Sina then Tencent.
@@ -272,15 +444,15 @@ class MarketDataService:
         if not stock_codes:
             return {}
         try:
-            return self._get_stock_quotes_via_eastmoney(stock_codes)
+            return await self._get_stock_quotes_via_eastmoney(stock_codes)
         except Exception as e:
             logger.warning(f"East Money stock quotes failed ({e}), trying Sina")
             try:
-                return self._get_stock_quotes_via_sina(stock_codes)
+                return await self._get_stock_quotes_via_sina(stock_codes)
             except Exception as e2:
                 logger.warning(f"Sina Finance stock quotes failed ({e2}), trying Tencent")
                 try:
-                    return self._get_stock_quotes_via_tencent(stock_codes)
+                    return await self._get_stock_quotes_via_tencent(stock_codes)
                 except Exception as e3:
                     logger.error(f"All stock quote sources failed: {e3}", exc_info=True)
                     return {}
@@ -296,20 +468,20 @@ class MarketDataService:
           4季度 / 年报 → 12-31
         Returns None if the label cannot be parsed.
         """
-        import re
-        m = re.search(r"(\d{4})年(\d)季度", label)
+        m = _QUARTER_RE.search(label)
         if m:
             year, q = m.group(1), int(m.group(2))
             quarter_ends = {1: "03-31", 2: "06-30", 3: "09-30", 4: "12-31"}
             return f"{year}-{quarter_ends.get(q, '12-31')}"
-        m = re.search(r"(\d{4})年中报", label)
+        m = _INTERIM_REPORT_RE.search(label)
         if m:
             return f"{m.group(1)}-06-30"
-        m = re.search(r"(\d{4})年年报", label)
+        m = _ANNUAL_REPORT_RE.search(label)
         if m:
             return f"{m.group(1)}-12-31"
         return None
 
+    @_ttl_cached(FUND_HOLDINGS_CACHE_TTL, should_cache=lambda r: bool(r[0]))
     def get_fund_holdings(
         self, fund_code: str, year: str
     ) -> tuple[list[dict[str, Any]], str | None]:
@@ -325,26 +497,28 @@ class MarketDataService:
                 return [], None
 
             # Filter to the most recent quarter only (last unique value in 季度 column)
-            quarters = df["季度"].unique().tolist()
-            latest_quarter = quarters[-1]
-            df = df[df["季度"] == latest_quarter]
+            latest_quarter = df["季度"].unique()[-1]
+            # Mask the column arrays directly rather than building a filtered
+            # DataFrame copy; iterrows() would also box every row in a Series.
+            mask = df["季度"].to_numpy() == latest_quarter
 
             report_date = self._quarter_label_to_date(latest_quarter)
 
-            holdings = []
-            for _, row in df.iterrows():
-                holdings.append(
-                    {
-                        "stock_code": row["股票代码"],
-                        "stock_name": row["股票名称"],
-                        "holding_ratio": float(row["占净值比例"]) / 100.0,
-                    }
+            ratios = df["占净值比例"].to_numpy(dtype="float64")[mask] / 100.0
+            holdings = [
+                {"stock_code": code, "stock_name": name, "holding_ratio": ratio}
+                for code, name, ratio in zip(
+                    df["股票代码"].to_numpy()[mask].tolist(),
+                    df["股票名称"].to_numpy()[mask].tolist(),
+                    ratios.tolist(),
                 )
+            ]
             return holdings, report_date
         except Exception as e:
             logger.error(f"Failed to fetch fund holdings for {fund_code}: {e}")
             return [], None
 
+    @_ttl_cached(FUND_NAV_CACHE_TTL, should_cache=lambda r: r is not None)
     def get_fund_nav(self, fund_code: str) -> dict[str, Any] | None:
         """Get the latest NAV for a fund.
 
@@ -355,53 +529,80 @@ class MarketDataService:
             if df.empty:
                 return None
 
-            latest = df.iloc[-1]
+            # Read the last cell of each column; df.iloc[-1] would box the
+            # whole mixed-dtype row into an object Series first.
+            nav = float(df["单位净值"].iat[-1])
+            acc_nav = float(df["累计净值"].iat[-1]) if "累计净值" in df.columns else nav
             return {
-                "nav": float(latest["单位净值"]),
-                "nav_date": str(latest["净值日期"]),
-                "acc_nav": float(latest.get("累计净值", latest.get("单位净值", 0))),
+                "nav": nav,
+                "nav_date": str(df["净值日期"].iat[-1]),
+                "acc_nav": acc_nav,
             }
         except Exception as e:
             logger.error(f"Failed to fetch NAV for {fund_code}: {e}")
             return None
 
-    def get_fund_nav_history(self, fund_code: str) -> dict[str, float]:
-        """Get full NAV history for a fund. Returns {date_str: nav}. Cached 1 hour."""
-        cached = nav_history_cache.get(f"nav_history:{fund_code}")
+    def get_fund_nav_history(
+        self, fund_code: str, latest_nav_date: str | None = None
+    ) -> dict[str, float]:
+        """Get full NAV history for a fund. Returns {date_str: nav}. Cached 1 hour.
+
+        The cache is backed by a per-fund snapshot on disk, so a restart
+        doesn't repay the multi-second akshare call for every fund.  Callers
+        that know the fund's latest published NAV date (the nightly refresh
+        stores it on the Fund row) pass it as latest_nav_date: an expired
+        snapshot that already ends on that date is revalidated instead of
+        downloading the whole history again.
+        """
+        cache_key = f"nav_history:{fund_code}"
+        cached = nav_history_cache.get(cache_key)
         if cached is not None:
             return cached
+        snapshot = _load_nav_history_snapshot(fund_code)
+        if snapshot is not None:
+            nav_dict, age = snapshot
+            if age < NAV_HISTORY_CACHE_TTL:
+                nav_history_cache.set(
+                    cache_key, nav_dict, ttl=int(NAV_HISTORY_CACHE_TTL - age) + 1
+                )
+                return nav_dict
+            if latest_nav_date and nav_dict and max(nav_dict) == latest_nav_date:
+                nav_history_cache.set(cache_key, nav_dict)
+                _touch_nav_history_snapshot(fund_code)
+                return nav_dict
         try:
             df = ak.fund_open_fund_info_em(symbol=fund_code, indicator="单位净值走势")
-            nav_dict: dict[str, float] = {}
-            for _, row in df.iterrows():
-                date_str = str(row["净值日期"])[:10]  # "YYYY-MM-DD"
-                nav_dict[date_str] = float(row["单位净值"])
-            nav_history_cache.set(f"nav_history:{fund_code}", nav_dict)
+            dates = df["净值日期"].astype(str).str[:10]  # "YYYY-MM-DD"
+            navs = df["单位净值"].to_numpy(dtype="float64")
+            nav_dict = dict(zip(dates.tolist(), navs.tolist()))
+            nav_history_cache.set(cache_key, nav_dict)
+            _save_nav_history_snapshot(fund_code, nav_dict)
             return nav_dict
         except Exception as e:
             logger.error(f"Failed to fetch NAV history for {fund_code}: {e}")
             return {}
 
     # ── Async wrappers for use in FastAPI async handlers ──────────────────────
-    # The synchronous methods above use requests/akshare (blocking I/O).
+    # The synchronous methods above use akshare (blocking I/O).
     # Calling them directly from async handlers blocks the event loop.
     # These wrappers delegate to a thread pool via asyncio.to_thread().
 
-    async def is_market_trading_today_async(self) -> bool:
-        return await asyncio.to_thread(self.is_market_trading_today)
-
-    async def get_stock_quotes_async(
-        self, stock_codes: list[str]
-    ) -> dict[str, dict[str, Any]]:
-        return await asyncio.to_thread(self.get_stock_quotes, stock_codes)
-
     async def get_fund_nav_async(
-        self, fund_code: str
+        self, fund_code: str, fresh: bool = False
     ) -> dict[str, Any] | None:
-        return await asyncio.to_thread(self.get_fund_nav, fund_code)
+        return await asyncio.to_thread(self.get_fund_nav, fund_code, fresh=fresh)
+
+    async def get_fund_nav_history_async(
+        self, fund_code: str, latest_nav_date: str | None = None
+    ) -> dict[str, float]:
+        return await asyncio.to_thread(
+            self.get_fund_nav_history, fund_code, latest_nav_date=latest_nav_date
+        )
 
-    async def get_fund_nav_history_async(self, fund_code: str) -> dict[str, float]:
-        return await asyncio.to_thread(self.get_fund_nav_history, fund_code)
+    async def get_fund_holdings_async(
+        self, fund_code: str, year: str
+    ) -> tuple[list[dict[str, Any]], str | None]:
+        return await asyncio.to_thread(self.get_fund_holdings, fund_code, year)
 
 
 # Global instance
@@ -1,10 +1,23 @@
 """Portfolio management service."""
 
-from sqlalchemy import delete, select
+from sqlalchemy import Row, delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.portfolio import Portfolio, PortfolioFund
 
+# List reads return plain rows: callers only read attributes, so skip building
+# identity-mapped ORM instances for them
+_PORTFOLIO_COLUMNS = (Portfolio.id, Portfolio.name, Portfolio.created_at)
+_PORTFOLIO_FUND_COLUMNS = (
+    PortfolioFund.id,
+    PortfolioFund.portfolio_id,
+    PortfolioFund.fund_code,
+    PortfolioFund.shares,
+    PortfolioFund.cost_nav,
+    PortfolioFund.added_at,
+    PortfolioFund.purchase_date,
+)
+
 
 class PortfolioService:
     """Manages user portfolios and their fund holdings."""
@@ -20,9 +33,10 @@ class PortfolioService:
     ) -> Portfolio | None:
         return await session.get(Portfolio, portfolio_id)
 
-    async def list_portfolios(self, session: AsyncSession) -> list[Portfolio]:
-        result = await session.execute(select(Portfolio))
-        return list(result.scalars().all())
+    async def list_portfolios(self, session: AsyncSession) -> list[Row]:
+        """Return all portfolios as read-only rows (attribute access like the model)."""
+        result = await session.execute(select(*_PORTFOLIO_COLUMNS))
+        return list(result.all())
 
     async def delete_portfolio(self, session: AsyncSession, portfolio_id: int) -> None:
         await session.execute(
@@ -63,11 +77,12 @@ class PortfolioService:
 
     async def get_portfolio_funds(
         self, session: AsyncSession, portfolio_id: int
-    ) -> list[PortfolioFund]:
+    ) -> list[Row]:
+        """Return a portfolio's funds as read-only rows (attribute access like the model)."""
         result = await session.execute(
-            select(PortfolioFund).where(PortfolioFund.portfolio_id == portfolio_id)
+            select(*_PORTFOLIO_FUND_COLUMNS).where(PortfolioFund.portfolio_id == portfolio_id)
         )
-        return list(result.scalars().all())
+        return list(result.all())
 
     async def update_fund(
         self,
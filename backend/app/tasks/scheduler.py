@@ -7,14 +7,21 @@ from datetime import datetime, timedelta, timezone
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
-from sqlalchemy import delete as sa_delete
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from app.config import MARKET_DATA_INTERVAL
-from app.models.database import async_session_factory
-from app.models.fund import FundEstimateSnapshot
+from app.models.database import async_session_factory, iso_now
+from app.models.fund import Fund, FundEstimateSnapshot
 from app.models.portfolio import PortfolioSnapshot
-from app.services.cache import stock_cache
-from app.services.estimator import fund_estimator
+from app.services.cache import estimate_cache, stock_cache
+from app.services.estimator import (
+    HoldingInput,
+    estimate_cache_key,
+    fund_estimator,
+    quote_change_pcts,
+)
 from app.services.fund_info import fund_info_service
 from app.services.market_data import market_data_service
 from app.services.portfolio import portfolio_service
@@ -26,6 +33,9 @@ _CST = timezone(timedelta(hours=8))
 
 scheduler = AsyncIOScheduler()
 
+# Max akshare lookups in flight at once during the per-fund NAV and holdings refreshes
+_AKSHARE_CONCURRENCY = 8
+
 # Retry configuration for stock quote fetches
 _STOCK_FETCH_MAX_RETRIES = 3
 _STOCK_FETCH_BASE_DELAY = 1.0  # seconds; doubled on each retry
@@ -41,7 +51,7 @@ async def _fetch_quotes_with_retry(stock_codes: list[str]) -> dict:
     if not stock_codes:
         return {}
     for attempt in range(_STOCK_FETCH_MAX_RETRIES):
-        quotes = market_data_service.get_stock_quotes(stock_codes)
+        quotes = await market_data_service.get_stock_quotes(stock_codes)
         if quotes:
             if attempt > 0:
                 logger.info(
@@ -70,9 +80,9 @@ def is_trading_hours() -> bool:
     # Skip weekends
     if now.weekday() >= 5:
         return False
-    current_time = now.strftime("%H:%M")
-    # Morning: 09:30-11:30, Afternoon: 13:00-15:00
-    return ("09:25" <= current_time <= "11:35") or ("12:55" <= current_time <= "15:05")
+    # Minutes since midnight; sessions 09:30-11:30 and 13:00-15:00 plus 5 min margin
+    t = now.hour * 60 + now.minute
+    return (9 * 60 + 25 <= t <= 11 * 60 + 35) or (12 * 60 + 55 <= t <= 15 * 60 + 5)
 
 
 async def update_stock_quotes():
@@ -81,79 +91,117 @@ async def update_stock_quotes():
         return
 
     try:
+        # Read the funds and holdings, then release the connection before the
+        # quote fetch (up to three 10s attempts plus backoff)
         async with async_session_factory() as session:
             funds = await fund_info_service.get_all_funds(session)
-            all_stock_codes = set()
-            fund_holdings_map = {}  # fund_code -> holdings list
-
-            for fund in funds:
-                holdings = await fund_info_service.get_holdings(session, fund.fund_code)
-                fund_holdings_map[fund.fund_code] = holdings
-                for h in holdings:
-                    all_stock_codes.add(h.stock_code)
-
-            if not all_stock_codes:
-                return
-
-            quotes = await _fetch_quotes_with_retry(list(all_stock_codes))
-            for code, quote in quotes.items():
-                # Ensure cache key always uses 6-digit zero-padded pure numeric code
-                normalized = str(code).zfill(6)
-                stock_cache.set(f"stock:{normalized}", quote)
-
-            logger.info(f"Updated {len(quotes)} stock quotes")
-
-            # Save estimate snapshots
-            # Always use CST timezone so times align with East Money index times
-            now = datetime.now(_CST)
-            snapshot_date = now.strftime("%Y-%m-%d")
-            snapshot_time = now.strftime("%H:%M")
-
-            for fund in funds:
-                if not fund.last_nav:
-                    continue
-                holdings = fund_holdings_map.get(fund.fund_code, [])
-                if not holdings:
-                    continue
-
-                holdings_data = [
-                    {
-                        "stock_code": str(h.stock_code).zfill(6),
-                        "stock_name": h.stock_name,
-                        "holding_ratio": h.holding_ratio,
-                    }
-                    for h in holdings
-                ]
-                estimate = fund_estimator.calculate_estimate(
-                    holdings_data, quotes, fund.last_nav
-                )
+            # One query for every fund's holdings instead of one per fund
+            fund_holdings_map = await fund_info_service.get_holdings_by_fund_codes(
+                session, [fund.fund_code for fund in funds]
+            )
+            all_stock_codes = {
+                h.stock_code for holdings in fund_holdings_map.values() for h in holdings
+            }
+
+        if not all_stock_codes:
+            return
+
+        quotes = await _fetch_quotes_with_retry(list(all_stock_codes))
+        for code, quote in quotes.items():
+            # Ensure cache key always uses 6-digit zero-padded pure numeric code
+            normalized = str(code).zfill(6)
+            stock_cache.set(f"stock:{normalized}", quote)
+
+        logger.info(f"Updated {len(quotes)} stock quotes")
+
+        # Save estimate snapshots
+        # Always use CST timezone so times align with East Money index times
+        now = datetime.now(_CST)
+        snapshot_date = now.strftime("%Y-%m-%d")
+        snapshot_time = now.strftime("%H:%M")
+        snapshot_rows: list[dict] = []
+        # Flatten the tick's quotes once; every fund's estimate reads from it
+        change_pcts = quote_change_pcts(quotes)
+
+        for fund in funds:
+            if not fund.last_nav:
+                continue
+            holdings = fund_holdings_map.get(fund.fund_code, [])
+            if not holdings:
+                continue
+
+            holdings_data = [
+                HoldingInput(str(h.stock_code).zfill(6), h.stock_name, h.holding_ratio)
+                for h in holdings
+            ]
+            estimate = fund_estimator.estimate_summary(
+                holdings_data, change_pcts, fund.last_nav
+            )
 
-                # Skip snapshot when no quotes matched holdings (coverage=0):
-                # saving est_change_pct=0 would overwrite the last valid snapshot
-                # with misleading zero data.
-                if estimate["coverage"] <= 0:
-                    logger.warning(
-                        f"Skipping snapshot for {fund.fund_code}: "
-                        f"coverage={estimate['coverage']}, quotes={len(quotes)}"
-                    )
-                    continue
-
-                snapshot = FundEstimateSnapshot(
-                    fund_code=fund.fund_code,
-                    est_nav=estimate["est_nav"],
-                    est_change_pct=estimate["est_change_pct"],
-                    snapshot_time=snapshot_time,
-                    snapshot_date=snapshot_date,
+            # Skip snapshot when no quotes matched holdings (coverage=0):
+            # saving est_change_pct=0 would overwrite the last valid snapshot
+            # with misleading zero data.
+            if estimate["coverage"] <= 0:
+                logger.warning(
+                    f"Skipping snapshot for {fund.fund_code}: "
+                    f"coverage={estimate['coverage']}, quotes={len(quotes)}"
                 )
-                session.add(snapshot)
+                continue
+
+            # Pre-warm the shared estimate cache so portfolio detail
+            # requests during this tick skip recomputing the fund.
+            estimate_cache.set(
+                estimate_cache_key(fund.fund_code, fund.last_nav),
+                {
+                    "est_nav": estimate["est_nav"],
+                    "est_change_pct": estimate["est_change_pct"],
+                    "coverage": estimate["coverage"],
+                    "holdings_date": holdings[0].report_date,
+                },
+            )
 
-            await session.commit()
-            logger.info(f"Saved estimate snapshots for {len(funds)} funds")
+            snapshot_rows.append({
+                "fund_code": fund.fund_code,
+                "est_nav": estimate["est_nav"],
+                "est_change_pct": estimate["est_change_pct"],
+                "snapshot_time": snapshot_time,
+                "snapshot_date": snapshot_date,
+            })
+
+        # One executemany INSERT in a short session instead of an ORM flush per snapshot
+        if snapshot_rows:
+            async with async_session_factory() as session:
+                await session.execute(insert(FundEstimateSnapshot), snapshot_rows)
+                await session.commit()
+        logger.info(f"Saved estimate snapshots for {len(funds)} funds")
 
     except Exception as e:
         logger.error(f"Failed to update stock quotes: {e}")
 
 
+def _portfolio_snapshot_upsert(session):
+    """INSERT that replaces a portfolio's existing snapshot for the same day.
+
+    One statement per run (executemany) against the unique
+    (portfolio_id, snapshot_date) index, instead of a DELETE plus INSERT per
+    portfolio.
+    """
+    if session.bind.dialect.name == "mysql":
+        stmt = mysql_insert(PortfolioSnapshot)
+        return stmt.on_duplicate_key_update(
+            total_value_cents=stmt.inserted.total_value_cents,
+            total_cost_cents=stmt.inserted.total_cost_cents,
+        )
+    stmt = sqlite_insert(PortfolioSnapshot)
+    return stmt.on_conflict_do_update(
+        index_elements=["portfolio_id", "snapshot_date"],
+        set_={
+            "total_value_cents": stmt.excluded.total_value_cents,
+            "total_cost_cents": stmt.excluded.total_cost_cents,
+        },
+    )
+
+
 async def save_portfolio_snapshots():
     """At market close (15:05 weekdays), record daily portfolio value snapshots."""
     try:
@@ -161,56 +209,59 @@ async def save_portfolio_snapshots():
             portfolios = await portfolio_service.list_portfolios(session)
             today = datetime.now().strftime("%Y-%m-%d")
 
+            pf_lists = {
+                portfolio.id: await portfolio_service.get_portfolio_funds(session, portfolio.id)
+                for portfolio in portfolios
+            }
+            # Fund rows and holdings for every portfolio in two queries, not two per fund
+            fund_codes = list({pf.fund_code for pfs in pf_lists.values() for pf in pfs})
+            funds_map = await fund_info_service.get_funds_by_codes(session, fund_codes)
+            holdings_map = await fund_info_service.get_holdings_by_fund_codes(session, fund_codes)
+            # Cached quote per distinct held stock, looked up once for all portfolios
+            change_pcts: dict[str, float] = {}
+            for code in {
+                str(h.stock_code).zfill(6) for hs in holdings_map.values() for h in hs
+            }:
+                quote = stock_cache.get(f"stock:{code}")
+                if quote is not None:
+                    change_pcts[code] = quote["change_pct"]
+
+            snapshot_rows: list[dict] = []
             for portfolio in portfolios:
-                pf_list = await portfolio_service.get_portfolio_funds(session, portfolio.id)
                 total_cost = 0.0
                 total_value = 0.0
 
-                for pf in pf_list:
-                    fund = await fund_info_service.get_fund(session, pf.fund_code)
+                for pf in pf_lists[portfolio.id]:
+                    fund = funds_map.get(pf.fund_code)
                     if not fund or not fund.last_nav:
                         continue
 
                     est_nav = fund.last_nav
-                    holdings = await fund_info_service.get_holdings(session, pf.fund_code)
+                    holdings = holdings_map.get(pf.fund_code, [])
                     if holdings:
-                        stock_codes = [str(h.stock_code).zfill(6) for h in holdings]
-                        quotes = {
-                            k: stock_cache.get(f"stock:{k}")
-                            for k in stock_codes
-                            if stock_cache.get(f"stock:{k}") is not None
-                        }
-                        if quotes:
-                            holdings_data = [
-                                {
-                                    "stock_code": str(h.stock_code).zfill(6),
-                                    "stock_name": h.stock_name,
-                                    "holding_ratio": h.holding_ratio,
-                                }
-                                for h in holdings
-                            ]
-                            estimate = fund_estimator.calculate_estimate(
-                                holdings_data, quotes, fund.last_nav
-                            )
+                        holdings_data = [
+                            HoldingInput(str(h.stock_code).zfill(6), h.stock_name, h.holding_ratio)
+                            for h in holdings
+                        ]
+                        estimate = fund_estimator.estimate_summary(
+                            holdings_data, change_pcts, fund.last_nav
+                        )
+                        if estimate["coverage"] > 0:
                             est_nav = estimate["est_nav"]
 
                     total_cost += pf.shares * pf.cost_nav
                     total_value += pf.shares * est_nav
 
-                # Upsert: replace existing snapshot for today
-                await session.execute(
-                    sa_delete(PortfolioSnapshot).where(
-                        PortfolioSnapshot.portfolio_id == portfolio.id,
-                        PortfolioSnapshot.snapshot_date == today,
-                    )
-                )
-                session.add(PortfolioSnapshot(
-                    portfolio_id=portfolio.id,
-                    snapshot_date=today,
-                    total_value=round(total_value, 2),
-                    total_cost=round(total_cost, 2),
-                ))
+                snapshot_rows.append({
+                    "portfolio_id": portfolio.id,
+                    "snapshot_date": today,
+                    # The Cents column type rounds to the cent on bind
+                    "total_value": total_value,
+                    "total_cost": total_cost,
+                })
 
+            if snapshot_rows:
+                await session.execute(_portfolio_snapshot_upsert(session), snapshot_rows)
             await session.commit()
             logger.info(f"Saved portfolio snapshots for {len(portfolios)} portfolios")
     except Exception as e:
@@ -224,37 +275,54 @@ async def refresh_all_fund_holdings():
     so this is safe to run frequently without unnecessary DB writes.
     """
     try:
+        # Read what we need, then release the connection before the (slow) fetches
         async with async_session_factory() as session:
-            funds = await fund_info_service.get_all_funds(session)
-            updated = 0
-            year = datetime.now(_CST).strftime("%Y")
-
-            for fund in funds:
-                # Check what report_date we currently have stored
-                current_holdings = await fund_info_service.get_holdings(session, fund.fund_code)
-                current_report_date = current_holdings[0].report_date if current_holdings else None
-
-                # Fetch latest holdings from akshare
-                new_holdings, new_report_date = market_data_service.get_fund_holdings(
-                    fund.fund_code, year
-                )
-                if not new_holdings:
-                    new_holdings, new_report_date = market_data_service.get_fund_holdings(
-                        fund.fund_code, str(int(year) - 1)
+            fund_codes = [fund.fund_code for fund in await fund_info_service.get_all_funds(session)]
+            # Stored holdings for every fund in one query, to compare report dates
+            holdings_map = await fund_info_service.get_holdings_by_fund_codes(
+                session, fund_codes
+            )
+        current_report_dates = {
+            code: holdings[0].report_date for code, holdings in holdings_map.items() if holdings
+        }
+        year = datetime.now(_CST).strftime("%Y")
+
+        # Fetch latest holdings from akshare in worker threads, bounded like
+        # the NAV refresh, instead of blocking the event loop fund by fund.
+        sem = asyncio.Semaphore(_AKSHARE_CONCURRENCY)
+
+        async def fetch_holdings(fund_code: str):
+            async with sem:
+                result = await market_data_service.get_fund_holdings_async(fund_code, year)
+                if not result[0]:
+                    result = await market_data_service.get_fund_holdings_async(
+                        fund_code, str(int(year) - 1)
                     )
-
-                # Only write if we got a newer (or first-time) report
-                if new_holdings and new_report_date and new_report_date != current_report_date:
+                return result
+
+        results = await asyncio.gather(*(fetch_holdings(code) for code in fund_codes))
+
+        # Only write if we got a newer (or first-time) report
+        changed = [
+            (code, new_holdings, new_report_date)
+            for code, (new_holdings, new_report_date) in zip(fund_codes, results)
+            if new_holdings and new_report_date
+            and new_report_date != current_report_dates.get(code)
+        ]
+        if changed:
+            # One short session and one commit for the whole run
+            async with async_session_factory() as session:
+                for code, new_holdings, new_report_date in changed:
                     await fund_info_service.update_holdings(
-                        session, fund.fund_code, new_holdings[:10], new_report_date
+                        session, code, new_holdings[:10], new_report_date, commit=False,
                     )
-                    updated += 1
-                    logger.info(
-                        f"Updated holdings for {fund.fund_code}: "
-                        f"{current_report_date} → {new_report_date}"
-                    )
-
-            logger.info(f"Holdings refresh: updated {updated}/{len(funds)} funds")
+                await session.commit()
+            for code, _, new_report_date in changed:
+                logger.info(
+                    f"Updated holdings for {code}: "
+                    f"{current_report_dates.get(code)} → {new_report_date}"
+                )
+        logger.info(f"Holdings refresh: updated {len(changed)}/{len(fund_codes)} funds")
     except Exception as e:
         logger.error(f"Failed to refresh fund holdings: {e}")
 
@@ -299,18 +367,40 @@ async def probe_akshare_health():
 async def refresh_all_fund_navs():
     """After market close (20:30 weekdays), fetch official NAV for all tracked funds."""
     try:
+        # Read the funds, then release the connection before the (slow) fetches
         async with async_session_factory() as session:
             funds = await fund_info_service.get_all_funds(session)
-            updated = 0
-            for fund in funds:
-                nav_data = market_data_service.get_fund_nav(fund.fund_code)
-                if nav_data and nav_data["nav_date"] != fund.nav_date:
-                    fund.last_nav = nav_data["nav"]
-                    fund.nav_date = nav_data["nav_date"]
-                    fund.updated_at = datetime.now().isoformat()
-                    updated += 1
-            await session.commit()
-            logger.info(f"Refreshed official NAV for {updated}/{len(funds)} funds")
+        # The akshare calls block, so run them in worker threads concurrently
+        # (bounded) and write the results in one short session afterwards.
+        sem = asyncio.Semaphore(_AKSHARE_CONCURRENCY)
+
+        async def fetch_nav(fund_code: str):
+            async with sem:
+                return await market_data_service.get_fund_nav_async(fund_code, fresh=True)
+
+        nav_results = await asyncio.gather(*(fetch_nav(f.fund_code) for f in funds))
+        updates = [
+            {"code": fund.fund_code, "nav": nav_data["nav"], "date": nav_data["nav_date"]}
+            for fund, nav_data in zip(funds, nav_results)
+            if nav_data and nav_data["nav_date"] != fund.nav_date
+        ]
+        if updates:
+            async with async_session_factory() as session:
+                # One executemany; updated_at is stamped by the database per row
+                await session.execute(
+                    update(Fund.__table__)
+                    .where(Fund.fund_code == bindparam("code"))
+                    .values(
+                        last_nav=bindparam("nav"),
+                        nav_date=bindparam("date"),
+                        updated_at=iso_now(),
+                    ),
+                    updates,
+                )
+                await session.commit()
+            for row in updates:
+                fund_info_service.invalidate_fund(row["code"])
+        logger.info(f"Refreshed official NAV for {len(updates)}/{len(funds)} funds")
     except Exception as e:
         logger.error(f"Failed to refresh fund NAVs: {e}")
 
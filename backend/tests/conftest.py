@@ -4,41 +4,217 @@ Provides a safety-net fixture that ensures every async test uses an isolated
 in-memory SQLite database, preventing accidental hits to the real database
 file in CI environments where no SQLite file or tables exist.
 
-Tests that need specific seed data should define their own db fixtures, which
-will override app.dependency_overrides[get_db] after this autouse fixture runs.
-In auto asyncio_mode (see pyproject.toml), this async autouse fixture applies
-only to async tests; sync tests (test_cache, test_market_data, etc.) are
-unaffected because they don't make HTTP requests and don't use get_db.
+The database and its schema are created once per run on one connection held
+in an outer transaction.  Module seed data (module_db) and each test's writes
+(db_factory) live in nested SAVEPOINTs that are rolled back afterwards, so
+sessions can commit freely without leaking into other tests.
+
+Tests that need specific seed data should define module-scoped fixtures on
+module_db (seeded_db is the common one-fund seed); the app's
+get_db/get_write_db already resolve to db_factory sessions, which see those
+rows.  In auto asyncio_mode (see pyproject.toml), this async autouse fixture
+applies only to async tests; sync tests (test_cache, test_market_data, etc.)
+are unaffected because they don't make HTTP requests and don't use get_db.
 """
 
+import os
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+
 import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
 
 from app.main import app
-from app.models.database import Base, get_db
+from app.models.database import Base, _disable_pysqlite_autobegin, get_db, get_write_db
+from app.models.fund import Fund, FundHolding
+from app.services.cache import estimate_cache, fund_cache, fund_name_cache
+from app.services.market_data import market_data_service
+
+
+def pytest_collection_modifyitems(items):
+    """Run every async test on the session loop the shared engine lives on."""
+    session_loop = pytest.mark.asyncio(loop_scope="session")
+    for item in items:
+        if pytest_asyncio.is_async_test(item):
+            item.add_marker(session_loop, append=False)
+
+
+# Named shared-cache in-memory database, one per pytest-xdist worker ("gw0",
+# "gw1", ...; "main" without xdist) so parallel workers never share a store.
+_TEST_DB_URL = (
+    f"sqlite+aiosqlite:///file:testdb_{os.environ.get('PYTEST_XDIST_WORKER', 'main')}"
+    "?mode=memory&cache=shared&uri=true"
+)
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def engine():
+    """One in-memory database, schema created once for the whole run."""
+    # StaticPool keeps the single connection, and with it the database, alive
+    engine = create_async_engine(_TEST_DB_URL, poolclass=StaticPool)
+    # pysqlite's implicit transactions break SAVEPOINT; let SQLAlchemy emit BEGIN
+    event.listen(engine.sync_engine, "connect", _disable_pysqlite_autobegin)
+    event.listen(engine.sync_engine, "begin", lambda conn: conn.exec_driver_sql("BEGIN"))
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def db_conn(engine):
+    """The suite's one connection, held in an outer transaction never committed."""
+    async with engine.connect() as conn:
+        await conn.begin()
+        yield conn
+        await conn.rollback()
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def session_factory(db_conn):
+    """The run's one session factory, bound to db_conn.
+
+    Sessions join the open transaction and turn their commits into savepoint
+    releases, so whatever SAVEPOINT is open around them scopes their writes.
+    """
+    return async_sessionmaker(
+        bind=db_conn,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        join_transaction_mode="create_savepoint",
+    )
+
+
+@asynccontextmanager
+async def _savepoint(conn):
+    """Open a SAVEPOINT on conn; everything committed inside is undone on exit."""
+    savepoint = await conn.begin_nested()
+    try:
+        yield
+    finally:
+        await savepoint.rollback()
+
+
+@pytest_asyncio.fixture(scope="module", loop_scope="session")
+async def module_db(db_conn, session_factory):
+    """Session factory for seed rows shared by every test in a module."""
+    async with _savepoint(db_conn):
+        yield session_factory
+
+
+@pytest.fixture
+async def db_factory(db_conn, session_factory):
+    """Session factory for one test; its writes are rolled back after the test."""
+    async with _savepoint(db_conn):
+        yield session_factory
+
+
+@pytest.fixture
+async def db_session(db_factory):
+    """One session for a service/model test; its writes are rolled back after."""
+    async with db_factory() as session:
+        yield session
+
+
+@pytest_asyncio.fixture(scope="module", loop_scope="session")
+async def seeded_db(module_db):
+    """Fund 000001 (华夏成长, NAV 1.5) holding 8.9% 贵州茅台, seeded per module."""
+    async with module_db() as session:
+        session.add(Fund(
+            fund_code="000001",
+            fund_name="华夏成长",
+            fund_type="混合型",
+            last_nav=1.5,
+            nav_date="2026-02-14",
+        ))
+        session.add(FundHolding(
+            fund_code="000001",
+            stock_code="600519",
+            stock_name="贵州茅台",
+            holding_ratio=0.089,
+            report_date="2025-12-31",
+        ))
+        await session.commit()
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def client():
+    """One ASGI test client for the run; dependency overrides apply per request.
+
+    ASGITransport never sends lifespan events, so the app's startup (init_db,
+    the scheduler) does not run under tests.
+    """
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+        yield c
+
+
+@pytest.fixture(autouse=True)
+def _reset_dependency_overrides():
+    """Restore the dependency overrides in place after each test.
+
+    The app and its ASGI client outlive the test, so a test's overrides must
+    not; any installed before it starts are put back.  The dict is restored
+    rather than replaced, since FastAPI reads app.dependency_overrides by
+    reference.  Set up before (and so torn down after) every other per-test
+    fixture.
+    """
+    saved = dict(app.dependency_overrides)
+    yield
+    app.dependency_overrides.clear()
+    app.dependency_overrides.update(saved)
 
 
 @pytest.fixture(autouse=True)
-async def _safe_db():
+async def _safe_db(_reset_dependency_overrides, db_factory):
     """Safety-net: give every async test an isolated in-memory database.
 
     Tests with their own db fixtures will override this via
     app.dependency_overrides[get_db] after this fixture sets the default.
-    Only our own override is removed on teardown; test-specific fixtures
-    that called app.dependency_overrides.clear() have already handled cleanup.
     """
-    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-
     async def _override():
-        async with factory() as s:
+        async with db_factory() as s:
             yield s
 
     app.dependency_overrides[get_db] = _override
+    app.dependency_overrides[get_write_db] = _override
+
+
+@pytest.fixture(autouse=True)
+def _clear_estimate_cache():
+    """Per-fund estimates are shared process-wide; never leak them between tests."""
+    estimate_cache.clear()
     yield
-    # Only remove our override if no test fixture has already cleared it
-    if app.dependency_overrides.get(get_db) is _override:
-        del app.dependency_overrides[get_db]
-    await engine.dispose()
+    estimate_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def _clear_fund_cache():
+    """Tests reuse fund codes across separate databases; start each one cold."""
+    fund_cache.clear()
+    market_data_service._lookup_cache.clear()
+    yield
+    fund_cache.clear()
+    market_data_service._lookup_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def _isolate_fund_name_table(tmp_path):
+    """Each test patches its own fund table; don't reuse a previous test's index.
+
+    The on-disk snapshot is redirected to tmp_path so tests never touch data/.
+    """
+    fund_name_cache.clear()
+    with patch("app.services.fund_names.FUND_NAME_SNAPSHOT_PATH", tmp_path / "fund_names.npz"):
+        yield
+    fund_name_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def _isolate_nav_history_snapshots(tmp_path):
+    """NAV history snapshots go to tmp_path, never data/ or a previous test."""
+    with patch("app.services.market_data.NAV_HISTORY_SNAPSHOT_DIR", tmp_path / "nav_history"):
+        yield
@@ -10,36 +10,36 @@ Covers:
 """
 
 from datetime import date, datetime, timedelta, timezone
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import numpy as np
+import orjson
 import pandas as pd
 import pytest
-from httpx import ASGITransport, AsyncClient
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
-from app.main import app
-from app.models.database import Base, get_db
 from app.models.fund import Fund
+from app.services.cache import index_cache, nav_history_cache
+from app.services.fund_info import fund_info_service
 
 _FUND_CODE = "000001"
 _CST = timezone(timedelta(hours=8))
 
 
-@pytest.fixture
-async def db_with_fund():
-    """DB seeded with one fund (no snapshots)."""
-    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+@pytest.fixture(autouse=True)
+def _clear_chart_caches():
+    """Chart endpoints share module-level caches; isolate each test."""
+    index_cache.clear()
+    nav_history_cache.clear()
+    yield
+    index_cache.clear()
+    nav_history_cache.clear()
 
-    async def override():
-        async with factory() as s:
-            yield s
 
-    app.dependency_overrides[get_db] = override
+@pytest.fixture
+async def db_with_fund(db_factory):
+    """DB seeded with one fund (no snapshots)."""
 
-    async with factory() as s:
+    async with db_factory() as s:
         s.add(Fund(
             fund_code=_FUND_CODE,
             fund_name="华夏成长",
@@ -49,25 +49,19 @@ async def db_with_fund():
         ))
         await s.commit()
 
-    yield
-
-    app.dependency_overrides.clear()
-    await engine.dispose()
-
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Index history — GET /api/fund/index/history
 # ─────────────────────────────────────────────────────────────────────────────
 
-async def test_index_history_returns_dates_and_values():
+async def test_index_history_returns_dates_and_values(client):
     """Index history endpoint returns dates, values, and name from akshare."""
     mock_df = pd.DataFrame({
         "date": ["2026-01-01", "2026-01-02", "2026-01-03"],
         "close": [3000.0, 3050.0, 3100.0],
     })
     with patch("app.api.chart.ak.stock_zh_index_daily", return_value=mock_df):
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get("/api/fund/index/history?period=30d")
+        resp = await client.get("/api/fund/index/history?period=30d")
 
     assert resp.status_code == 200
     data = resp.json()
@@ -77,11 +71,10 @@ async def test_index_history_returns_dates_and_values():
     assert len(data["dates"]) == len(data["values"])
 
 
-async def test_index_history_returns_empty_on_akshare_exception():
+async def test_index_history_returns_empty_on_akshare_exception(client):
     """Index history returns empty lists when akshare raises an exception."""
     with patch("app.api.chart.ak.stock_zh_index_daily", side_effect=Exception("timeout")):
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get("/api/fund/index/history")
+        resp = await client.get("/api/fund/index/history")
 
     assert resp.status_code == 200
     data = resp.json()
@@ -90,12 +83,11 @@ async def test_index_history_returns_empty_on_akshare_exception():
     assert data["name"] == "上证指数"
 
 
-async def test_index_history_returns_empty_on_empty_dataframe():
+async def test_index_history_returns_empty_on_empty_dataframe(client):
     """Index history returns empty lists when akshare returns no rows."""
     mock_df = pd.DataFrame({"date": [], "close": []})
     with patch("app.api.chart.ak.stock_zh_index_daily", return_value=mock_df):
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get("/api/fund/index/history")
+        resp = await client.get("/api/fund/index/history")
 
     assert resp.status_code == 200
     data = resp.json()
@@ -103,14 +95,13 @@ async def test_index_history_returns_empty_on_empty_dataframe():
     assert data["values"] == []
 
 
-async def test_index_history_invalid_period_returns_422():
+async def test_index_history_invalid_period_returns_422(client):
     """Index history returns 422 Unprocessable Entity for invalid period."""
-    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-        resp = await c.get("/api/fund/index/history?period=invalid")
+    resp = await client.get("/api/fund/index/history?period=invalid")
     assert resp.status_code == 422
 
 
-async def test_index_history_7d_filters_to_last_seven_days():
+async def test_index_history_7d_filters_to_last_seven_days(client):
     """Index history with period=7d returns only dates within the past 7 days."""
     today = date.today()
     all_dates = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(60, -1, -1)]
@@ -118,8 +109,7 @@ async def test_index_history_7d_filters_to_last_seven_days():
     mock_df = pd.DataFrame({"date": all_dates, "close": closes})
 
     with patch("app.api.chart.ak.stock_zh_index_daily", return_value=mock_df):
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get("/api/fund/index/history?period=7d")
+        resp = await client.get("/api/fund/index/history?period=7d")
 
     assert resp.status_code == 200
     data = resp.json()
@@ -129,7 +119,7 @@ async def test_index_history_7d_filters_to_last_seven_days():
     assert len(data["dates"]) < len(all_dates)
 
 
-async def test_index_history_1y_returns_more_data_than_7d():
+async def test_index_history_1y_returns_more_data_than_7d(client):
     """Index history with period=1y returns more entries than period=7d."""
     today = date.today()
     all_dates = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(400, -1, -1)]
@@ -137,36 +127,101 @@ async def test_index_history_1y_returns_more_data_than_7d():
     mock_df = pd.DataFrame({"date": all_dates, "close": closes})
 
     with patch("app.api.chart.ak.stock_zh_index_daily", return_value=mock_df):
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp_7d = await c.get("/api/fund/index/history?period=7d")
-            resp_1y = await c.get("/api/fund/index/history?period=1y")
+        resp_7d = await client.get("/api/fund/index/history?period=7d")
+        resp_1y = await client.get("/api/fund/index/history?period=1y")
 
     assert len(resp_1y.json()["dates"]) > len(resp_7d.json()["dates"])
 
 
+async def test_index_history_accepts_date_objects(client):
+    """akshare yields datetime.date values; they are serialized as YYYY-MM-DD strings."""
+    today = date.today()
+    mock_df = pd.DataFrame({
+        "date": [today - timedelta(days=1), today],
+        "close": [3000, 3050],
+    })
+    with patch("app.api.chart.ak.stock_zh_index_daily", return_value=mock_df):
+        resp = await client.get("/api/fund/index/history?period=7d")
+
+    data = resp.json()
+    assert data["dates"] == [
+        (today - timedelta(days=1)).strftime("%Y-%m-%d"),
+        today.strftime("%Y-%m-%d"),
+    ]
+    assert data["values"] == [3000.0, 3050.0]
+
+
+async def test_index_history_cache_hit_skips_akshare_call(client):
+    """A second request within the TTL is served from cache, across periods."""
+    today = date.today()
+    all_dates = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(60, -1, -1)]
+    mock_df = pd.DataFrame({"date": all_dates, "close": [3000.0] * len(all_dates)})
+
+    with patch("app.api.chart.ak.stock_zh_index_daily", return_value=mock_df) as mock_ak:
+        resp_30d = await client.get("/api/fund/index/history?period=30d")
+        resp_7d = await client.get("/api/fund/index/history?period=7d")
+
+    assert mock_ak.call_count == 1
+    assert len(resp_7d.json()["dates"]) < len(resp_30d.json()["dates"])
+
+
+async def test_index_history_serves_stale_series_on_akshare_exception(client):
+    """When a refresh fails, the last good series is returned instead of empty lists."""
+    today_str = date.today().strftime("%Y-%m-%d")
+    series = (np.array([today_str]), np.array([3100.0]))
+    index_cache.set("index_history", (series, 0.0))  # already expired
+
+    with patch("app.api.chart.ak.stock_zh_index_daily", side_effect=Exception("timeout")):
+        resp = await client.get("/api/fund/index/history")
+
+    data = resp.json()
+    assert data["dates"] == [today_str]
+    assert data["values"] == [3100.0]
+
+
+async def test_index_history_serves_stale_series_on_empty_dataframe(client):
+    """An empty upstream reply is a failed refresh, not an empty chart."""
+    today_str = date.today().strftime("%Y-%m-%d")
+    series = (np.array([today_str]), np.array([3100.0]))
+    index_cache.set("index_history", (series, 0.0))  # already expired
+
+    with patch("app.api.chart.ak.stock_zh_index_daily", return_value=pd.DataFrame()):
+        resp = await client.get("/api/fund/index/history")
+
+    data = resp.json()
+    assert data["dates"] == [today_str]
+    assert data["values"] == [3100.0]
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Index intraday — GET /api/fund/index/intraday
 # ─────────────────────────────────────────────────────────────────────────────
 
+
+def _patch_http_get(**kwargs):
+    """Patch the shared AsyncClient so its get() is an AsyncMock built from kwargs."""
+    client = MagicMock()
+    client.get = AsyncMock(**kwargs)
+    return patch("app.api.chart.get_http_client", return_value=client)
+
+
 def _eastmoney_response(today_str: str, entries: list[tuple]) -> MagicMock:
     """Build a mock East Money trends2 response."""
     trends = [f"{today_str} {t},0,{p},0,0,0,0,0" for t, p in entries]
     mock = MagicMock()
-    mock.json.return_value = {"data": {"trends": trends}}
+    mock.content = orjson.dumps({"data": {"trends": trends}})
     return mock
 
 
-async def test_index_intraday_returns_times_and_values():
+async def test_index_intraday_returns_times_and_values(client):
     """Index intraday returns parsed times, values, pre_close, and name."""
     fake_now = datetime(2026, 1, 5, 10, 0, tzinfo=_CST)  # Monday
     today_str = "2026-01-05"
     mock_resp = _eastmoney_response(today_str, [("09:30", 3000.0), ("09:31", 3010.0)])
 
     with patch("app.api.chart.datetime") as mock_dt, \
-         patch("app.api.chart._requests.get", return_value=mock_resp):
+         _patch_http_get(return_value=mock_resp):
         mock_dt.now.return_value = fake_now
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get("/api/fund/index/intraday")
+        resp = await client.get("/api/fund/index/intraday")
 
     assert resp.status_code == 200
     data = resp.json()
@@ -176,11 +231,53 @@ async def test_index_intraday_returns_times_and_values():
     assert data["name"] == "上证指数"
 
 
-async def test_index_intraday_returns_empty_on_request_exception():
+async def test_index_intraday_cache_hit_skips_http_call(client):
+    """A second request within the TTL is served from cache."""
+    fake_now = datetime(2026, 1, 5, 10, 0, tzinfo=_CST)
+    mock_resp = _eastmoney_response("2026-01-05", [("09:30", 3000.0)])
+
+    with patch("app.api.chart.datetime") as mock_dt, \
+         _patch_http_get(return_value=mock_resp) as mock_client:
+        mock_dt.now.return_value = fake_now
+        first = await client.get("/api/fund/index/intraday")
+        second = await client.get("/api/fund/index/intraday")
+
+    assert mock_client.return_value.get.await_count == 1
+    assert first.json() == second.json()
+
+
+async def test_index_intraday_serves_stale_payload_on_request_exception(client):
+    """When a refresh fails, today's last good payload is returned."""
+    fake_now = datetime(2026, 1, 5, 10, 0, tzinfo=_CST)
+    stale = {"times": ["09:30"], "values": [3000.0], "pre_close": 2990.0, "name": "上证指数"}
+    index_cache.set("index_intraday:2026-01-05", (stale, 0.0))  # already expired
+
+    with patch("app.api.chart.datetime") as mock_dt, \
+         _patch_http_get(side_effect=ConnectionError("network error")):
+        mock_dt.now.return_value = fake_now
+        resp = await client.get("/api/fund/index/intraday")
+
+    assert resp.json() == stale
+
+
+async def test_index_intraday_serves_stale_payload_on_empty_trends(client):
+    """An empty trends list is a failed refresh: today's last good payload is kept."""
+    fake_now = datetime(2026, 1, 5, 10, 0, tzinfo=_CST)
+    stale = {"times": ["09:30"], "values": [3000.0], "pre_close": 2990.0, "name": "上证指数"}
+    index_cache.set("index_intraday:2026-01-05", (stale, 0.0))  # already expired
+
+    with patch("app.api.chart.datetime") as mock_dt, \
+         _patch_http_get(return_value=_eastmoney_response("2026-01-05", [])):
+        mock_dt.now.return_value = fake_now
+        resp = await client.get("/api/fund/index/intraday")
+
+    assert resp.json() == stale
+
+
+async def test_index_intraday_returns_empty_on_request_exception(client):
     """Index intraday returns empty lists when HTTP request raises an exception."""
-    with patch("app.api.chart._requests.get", side_effect=ConnectionError("network error")):
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get("/api/fund/index/intraday")
+    with _patch_http_get(side_effect=ConnectionError("network error")):
+        resp = await client.get("/api/fund/index/intraday")
 
     assert resp.status_code == 200
     data = resp.json()
@@ -190,11 +287,11 @@ async def test_index_intraday_returns_empty_on_request_exception():
     assert data["name"] == "上证指数"
 
 
-async def test_index_intraday_filters_to_todays_entries_only():
+async def test_index_intraday_filters_to_todays_entries_only(client):
     """Index intraday skips entries whose timestamp is not for today."""
     fake_now = datetime(2026, 1, 5, 10, 0, tzinfo=_CST)
     mock_resp = MagicMock()
-    mock_resp.json.return_value = {
+    mock_resp.content = orjson.dumps({
         "data": {
             "trends": [
                 "2026-01-04 14:55,0,2990.0,0,0,0,0,0",   # yesterday — must be skipped
@@ -202,13 +299,12 @@ async def test_index_intraday_filters_to_todays_entries_only():
                 "2026-01-05 09:31,0,3010.0,0,0,0,0,0",   # today
             ]
         }
-    }
+    })
 
     with patch("app.api.chart.datetime") as mock_dt, \
-         patch("app.api.chart._requests.get", return_value=mock_resp):
+         _patch_http_get(return_value=mock_resp):
         mock_dt.now.return_value = fake_now
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get("/api/fund/index/intraday")
+        resp = await client.get("/api/fund/index/intraday")
 
     assert resp.status_code == 200
     data = resp.json()
@@ -216,14 +312,13 @@ async def test_index_intraday_filters_to_todays_entries_only():
     assert len(data["values"]) == 2
 
 
-async def test_index_intraday_empty_when_trends_list_is_empty():
+async def test_index_intraday_empty_when_trends_list_is_empty(client):
     """Index intraday returns empty response when trends list is empty."""
     mock_resp = MagicMock()
-    mock_resp.json.return_value = {"data": {"trends": []}}
+    mock_resp.content = orjson.dumps({"data": {"trends": []}})
 
-    with patch("app.api.chart._requests.get", return_value=mock_resp):
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get("/api/fund/index/intraday")
+    with _patch_http_get(return_value=mock_resp):
+        resp = await client.get("/api/fund/index/intraday")
 
     assert resp.status_code == 200
     data = resp.json()
@@ -232,24 +327,23 @@ async def test_index_intraday_empty_when_trends_list_is_empty():
     assert data["pre_close"] == 0
 
 
-async def test_index_intraday_skips_malformed_entries():
+async def test_index_intraday_skips_malformed_entries(client):
     """Index intraday skips entries with fewer than 3 comma-separated fields."""
     fake_now = datetime(2026, 1, 5, 10, 0, tzinfo=_CST)
     mock_resp = MagicMock()
-    mock_resp.json.return_value = {
+    mock_resp.content = orjson.dumps({
         "data": {
             "trends": [
                 "2026-01-05 09:30",                       # too few fields — skipped
                 "2026-01-05 09:31,0,3010.0,0,0,0,0,0",  # valid
             ]
         }
-    }
+    })
 
     with patch("app.api.chart.datetime") as mock_dt, \
-         patch("app.api.chart._requests.get", return_value=mock_resp):
+         _patch_http_get(return_value=mock_resp):
         mock_dt.now.return_value = fake_now
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get("/api/fund/index/intraday")
+        resp = await client.get("/api/fund/index/intraday")
 
     assert resp.status_code == 200
     data = resp.json()
@@ -261,7 +355,7 @@ async def test_index_intraday_skips_malformed_entries():
 # Fund NAV history — GET /api/fund/{code}/nav-history
 # ─────────────────────────────────────────────────────────────────────────────
 
-async def test_nav_history_returns_dates_and_navs(db_with_fund):
+async def test_nav_history_returns_dates_and_navs(db_with_fund, client):
     """Fund NAV history returns dates and navs from akshare."""
     today = date.today()
     recent_dates = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(2, -1, -1)]
@@ -270,8 +364,7 @@ async def test_nav_history_returns_dates_and_navs(db_with_fund):
         "单位净值": [2.50, 2.53, 2.54],
     })
     with patch("app.api.chart.ak.fund_open_fund_info_em", return_value=mock_df):
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get(f"/api/fund/{_FUND_CODE}/nav-history")
+        resp = await client.get(f"/api/fund/{_FUND_CODE}/nav-history")
 
     assert resp.status_code == 200
     data = resp.json()
@@ -281,18 +374,35 @@ async def test_nav_history_returns_dates_and_navs(db_with_fund):
     assert len(data["dates"]) > 0
 
 
-async def test_nav_history_fund_not_found_returns_404():
+async def test_nav_history_refetched_after_nav_update(db_with_fund, db_factory, client):
+    """A cached series is not served once the fund's stored NAV date moves on."""
+    today = date.today()
+    old_df = pd.DataFrame({"净值日期": [(today - timedelta(days=1)).isoformat()], "单位净值": [2.50]})
+    new_df = pd.DataFrame({
+        "净值日期": [(today - timedelta(days=1)).isoformat(), today.isoformat()],
+        "单位净值": [2.50, 2.60],
+    })
+    with patch("app.api.chart.ak.fund_open_fund_info_em", return_value=old_df):
+        first = (await client.get(f"/api/fund/{_FUND_CODE}/nav-history")).json()
+    async with db_factory() as s:
+        await fund_info_service.update_nav(s, _FUND_CODE, 2.60, today.isoformat())
+    with patch("app.api.chart.ak.fund_open_fund_info_em", return_value=new_df):
+        second = (await client.get(f"/api/fund/{_FUND_CODE}/nav-history")).json()
+
+    assert first["navs"] == [2.50]
+    assert second["navs"] == [2.50, 2.60]
+
+
+async def test_nav_history_fund_not_found_returns_404(client):
     """Fund NAV history returns 404 when the fund code is not in the database."""
-    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-        resp = await c.get(f"/api/fund/{_FUND_CODE}/nav-history")
+    resp = await client.get(f"/api/fund/{_FUND_CODE}/nav-history")
     assert resp.status_code == 404
 
 
-async def test_nav_history_returns_empty_on_akshare_exception(db_with_fund):
+async def test_nav_history_returns_empty_on_akshare_exception(db_with_fund, client):
     """Fund NAV history returns empty lists when akshare raises an exception."""
     with patch("app.api.chart.ak.fund_open_fund_info_em", side_effect=Exception("API error")):
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get(f"/api/fund/{_FUND_CODE}/nav-history")
+        resp = await client.get(f"/api/fund/{_FUND_CODE}/nav-history")
 
     assert resp.status_code == 200
     data = resp.json()
@@ -300,12 +410,11 @@ async def test_nav_history_returns_empty_on_akshare_exception(db_with_fund):
     assert data["navs"] == []
 
 
-async def test_nav_history_returns_empty_on_empty_dataframe(db_with_fund):
+async def test_nav_history_returns_empty_on_empty_dataframe(db_with_fund, client):
     """Fund NAV history returns empty lists when akshare returns no rows."""
     mock_df = pd.DataFrame({"净值日期": [], "单位净值": []})
     with patch("app.api.chart.ak.fund_open_fund_info_em", return_value=mock_df):
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get(f"/api/fund/{_FUND_CODE}/nav-history")
+        resp = await client.get(f"/api/fund/{_FUND_CODE}/nav-history")
 
     assert resp.status_code == 200
     data = resp.json()
@@ -313,14 +422,13 @@ async def test_nav_history_returns_empty_on_empty_dataframe(db_with_fund):
     assert data["navs"] == []
 
 
-async def test_nav_history_invalid_period_returns_422(db_with_fund):
+async def test_nav_history_invalid_period_returns_422(db_with_fund, client):
     """Fund NAV history returns 422 for invalid period query parameter."""
-    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-        resp = await c.get(f"/api/fund/{_FUND_CODE}/nav-history?period=bad")
+    resp = await client.get(f"/api/fund/{_FUND_CODE}/nav-history?period=bad")
     assert resp.status_code == 422
 
 
-async def test_nav_history_7d_returns_subset_of_full_data(db_with_fund):
+async def test_nav_history_7d_returns_subset_of_full_data(db_with_fund, client):
     """Fund NAV history with period=7d returns fewer entries than period=1y."""
     today = date.today()
     all_dates = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(400, -1, -1)]
@@ -328,9 +436,8 @@ async def test_nav_history_7d_returns_subset_of_full_data(db_with_fund):
     mock_df = pd.DataFrame({"净值日期": all_dates, "单位净值": navs})
 
     with patch("app.api.chart.ak.fund_open_fund_info_em", return_value=mock_df):
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp_7d = await c.get(f"/api/fund/{_FUND_CODE}/nav-history?period=7d")
-            resp_1y = await c.get(f"/api/fund/{_FUND_CODE}/nav-history?period=1y")
+        resp_7d = await client.get(f"/api/fund/{_FUND_CODE}/nav-history?period=7d")
+        resp_1y = await client.get(f"/api/fund/{_FUND_CODE}/nav-history?period=1y")
 
     assert resp_7d.status_code == 200
     assert resp_1y.status_code == 200
@@ -342,7 +449,7 @@ async def test_nav_history_7d_returns_subset_of_full_data(db_with_fund):
     assert all(d >= cutoff_7d for d in data_7d["dates"])
 
 
-async def test_nav_history_navs_are_floats(db_with_fund):
+async def test_nav_history_navs_are_floats(db_with_fund, client):
     """Fund NAV history navs are all valid floats, not strings."""
     today = date.today()
     recent_dates = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(1, -1, -1)]
@@ -351,21 +458,63 @@ async def test_nav_history_navs_are_floats(db_with_fund):
         "单位净值": [2.5376, 2.5500],
     })
     with patch("app.api.chart.ak.fund_open_fund_info_em", return_value=mock_df):
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get(f"/api/fund/{_FUND_CODE}/nav-history")
+        resp = await client.get(f"/api/fund/{_FUND_CODE}/nav-history")
 
     data = resp.json()
     for nav in data["navs"]:
         assert isinstance(nav, float)
 
 
+async def test_nav_history_cache_hit_skips_akshare_call(db_with_fund, client):
+    """The parsed series is cached per fund, so later periods reuse it."""
+    today = date.today()
+    all_dates = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(60, -1, -1)]
+    mock_df = pd.DataFrame({"净值日期": all_dates, "单位净值": [2.0] * len(all_dates)})
+
+    with patch("app.api.chart.ak.fund_open_fund_info_em", return_value=mock_df) as mock_ak:
+        resp_30d = await client.get(f"/api/fund/{_FUND_CODE}/nav-history?period=30d")
+        resp_7d = await client.get(f"/api/fund/{_FUND_CODE}/nav-history?period=7d")
+
+    assert mock_ak.call_count == 1
+    assert len(resp_7d.json()["dates"]) < len(resp_30d.json()["dates"])
+
+
+async def test_nav_history_cutoff_is_inclusive_for_date_objects(db_with_fund, client):
+    """The cutoff day itself is kept, and datetime.date values come back as strings."""
+    with patch("app.api.chart.datetime") as mock_dt:
+        mock_dt.now.return_value = datetime(2026, 1, 31, 10, 0, tzinfo=_CST)
+        mock_df = pd.DataFrame({
+            "净值日期": [date(2026, 1, 23), date(2026, 1, 24), date(2026, 1, 30)],
+            "单位净值": [2.50, 2.51, 2.52],
+        })
+        with patch("app.api.chart.ak.fund_open_fund_info_em", return_value=mock_df):
+            resp = await client.get(f"/api/fund/{_FUND_CODE}/nav-history?period=7d")
+
+    data = resp.json()
+    assert data["dates"] == ["2026-01-24", "2026-01-30"]
+    assert data["navs"] == [2.51, 2.52]
+
+
+async def test_nav_history_ytd_starts_on_january_first(db_with_fund, client):
+    """period=ytd keeps every NAV from Jan 1 of the current CST year."""
+    with patch("app.api.chart.datetime") as mock_dt:
+        mock_dt.now.return_value = datetime(2026, 3, 1, 10, 0, tzinfo=_CST)
+        mock_df = pd.DataFrame({
+            "净值日期": ["2025-12-31", "2026-01-01", "2026-02-27"],
+            "单位净值": [2.50, 2.51, 2.52],
+        })
+        with patch("app.api.chart.ak.fund_open_fund_info_em", return_value=mock_df):
+            resp = await client.get(f"/api/fund/{_FUND_CODE}/nav-history?period=ytd")
+
+    assert resp.json()["dates"] == ["2026-01-01", "2026-02-27"]
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Fund intraday — 404 case (fund not found)
 # Happy-path intraday tests live in test_api_chart_intraday.py
 # ─────────────────────────────────────────────────────────────────────────────
 
-async def test_fund_intraday_fund_not_found_returns_404():
+
+async def test_fund_intraday_fund_not_found_returns_404(client):
     """Fund intraday endpoint returns 404 when fund is not in the database."""
-    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-        resp = await c.get(f"/api/fund/{_FUND_CODE}/intraday")
+    resp = await client.get(f"/api/fund/{_FUND_CODE}/intraday")
     assert resp.status_code == 404
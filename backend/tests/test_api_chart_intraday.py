@@ -4,11 +4,8 @@ from unittest.mock import patch
 
 import pytest
 import pytest_asyncio
-from httpx import ASGITransport, AsyncClient
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import insert
 
-from app.main import app
-from app.models.database import Base, get_db
 from app.models.fund import Fund, FundEstimateSnapshot
 
 _FUND_CODE = "000001"
@@ -16,7 +13,7 @@ _DATE = "2026-02-24"
 
 
 @pytest_asyncio.fixture
-async def db_with_snapshots():
+async def db_with_snapshots(db_factory):
     """DB seeded with a fund and snapshots that simulate a mid-session last_nav change.
 
     Scenario:
@@ -34,20 +31,10 @@ async def db_with_snapshots():
       navs     = [2.6016*0.99, 2.6016*0.988, 2.6016*0.99]
                = [2.5756,      2.5704,        2.5756]     <- no jump
     """
-    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-
-    async def override():
-        async with factory() as s:
-            yield s
-
-    app.dependency_overrides[get_db] = override
 
     original_base = 2.6016  # baseline when early snapshots were taken
 
-    async with factory() as s:
+    async with db_factory() as s:
         # Fund stores post-refresh last_nav
         s.add(Fund(
             fund_code=_FUND_CODE,
@@ -56,40 +43,38 @@ async def db_with_snapshots():
             last_nav=2.5376,   # post-refresh value
             nav_date=_DATE,
         ))
-        # Early snapshots (before manual refresh) — use original_base
-        s.add(FundEstimateSnapshot(
-            fund_code=_FUND_CODE,
-            est_nav=round(original_base * (1 + (-1.0) / 100), 4),  # 2.5756
-            est_change_pct=-1.0,
-            snapshot_time="09:30",
-            snapshot_date=_DATE,
-        ))
-        s.add(FundEstimateSnapshot(
-            fund_code=_FUND_CODE,
-            est_nav=round(original_base * (1 + (-1.2) / 100), 4),  # 2.5704
-            est_change_pct=-1.2,
-            snapshot_time="09:31",
-            snapshot_date=_DATE,
-        ))
-        # Late snapshot (after manual refresh) — uses new base 2.5376
         new_base = 2.5376
-        s.add(FundEstimateSnapshot(
-            fund_code=_FUND_CODE,
-            est_nav=round(new_base * (1 + (-1.0) / 100), 4),  # 2.5122
-            est_change_pct=-1.0,
-            snapshot_time="14:30",
-            snapshot_date=_DATE,
-        ))
+        # One executemany INSERT for all snapshots
+        await s.execute(insert(FundEstimateSnapshot), [
+            # Early snapshots (before manual refresh) — use original_base
+            {
+                "fund_code": _FUND_CODE,
+                "est_nav": round(original_base * (1 + (-1.0) / 100), 4),  # 2.5756
+                "est_change_pct": -1.0,
+                "snapshot_time": "09:30",
+                "snapshot_date": _DATE,
+            },
+            {
+                "fund_code": _FUND_CODE,
+                "est_nav": round(original_base * (1 + (-1.2) / 100), 4),  # 2.5704
+                "est_change_pct": -1.2,
+                "snapshot_time": "09:31",
+                "snapshot_date": _DATE,
+            },
+            # Late snapshot (after manual refresh) — uses new base 2.5376
+            {
+                "fund_code": _FUND_CODE,
+                "est_nav": round(new_base * (1 + (-1.0) / 100), 4),  # 2.5122
+                "est_change_pct": -1.0,
+                "snapshot_time": "14:30",
+                "snapshot_date": _DATE,
+            },
+        ])
         await s.commit()
 
-    yield
-
-    app.dependency_overrides.clear()
-    await engine.dispose()
-
 
 @pytest.mark.asyncio
-async def test_intraday_navs_are_re_anchored_to_consistent_baseline(db_with_snapshots):
+async def test_intraday_navs_are_re_anchored_to_consistent_baseline(db_with_snapshots, client):
     """Intraday navs must all be computed from the first snapshot's base_nav.
 
     Even if fund.last_nav changed mid-session, the chart should be smooth:
@@ -101,8 +86,7 @@ async def test_intraday_navs_are_re_anchored_to_consistent_baseline(db_with_snap
 
     with patch("app.api.chart.datetime") as mock_dt:
         mock_dt.now.return_value = fake_now
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get(f"/api/fund/{_FUND_CODE}/intraday")
+        resp = await client.get(f"/api/fund/{_FUND_CODE}/intraday")
 
     assert resp.status_code == 200
     data = resp.json()
@@ -132,7 +116,7 @@ async def test_intraday_navs_are_re_anchored_to_consistent_baseline(db_with_snap
 
 
 @pytest.mark.asyncio
-async def test_intraday_empty_snapshots(db_with_snapshots):
+async def test_intraday_empty_snapshots(db_with_snapshots, client):
     """Intraday endpoint returns empty lists when no snapshots exist for a date."""
     from datetime import datetime, timedelta, timezone
     _CST = timezone(timedelta(hours=8))
@@ -141,8 +125,7 @@ async def test_intraday_empty_snapshots(db_with_snapshots):
 
     with patch("app.api.chart.datetime") as mock_dt:
         mock_dt.now.return_value = fake_now
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get(f"/api/fund/{_FUND_CODE}/intraday")
+        resp = await client.get(f"/api/fund/{_FUND_CODE}/intraday")
 
     assert resp.status_code == 200
     data = resp.json()
@@ -151,7 +134,7 @@ async def test_intraday_empty_snapshots(db_with_snapshots):
 
 
 @pytest.mark.asyncio
-async def test_intraday_single_snapshot_no_jump(db_with_snapshots):
+async def test_intraday_single_snapshot_no_jump(db_with_snapshots, client):
     """With a single snapshot, base_nav is recovered correctly and navs has one entry."""
     from datetime import datetime, timedelta, timezone
     _CST = timezone(timedelta(hours=8))
@@ -159,8 +142,7 @@ async def test_intraday_single_snapshot_no_jump(db_with_snapshots):
 
     with patch("app.api.chart.datetime") as mock_dt:
         mock_dt.now.return_value = fake_now
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get(f"/api/fund/{_FUND_CODE}/intraday")
+        resp = await client.get(f"/api/fund/{_FUND_CODE}/intraday")
 
     assert resp.status_code == 200
     data = resp.json()
@@ -175,7 +157,7 @@ _DATE2 = "2026-02-25"
 
 
 @pytest_asyncio.fixture
-async def db_with_spike():
+async def db_with_spike(db_factory):
     """DB seeded with a fund and snapshots that simulate a single-point V-spike.
 
     Scenario (mirrors the real Feb 25 bug):
@@ -187,19 +169,9 @@ async def db_with_spike():
     Without spike suppression: navs[09:33] = 2.5223  (visible dip)
     With    spike suppression: navs[09:33] ≈ 2.5376  (interpolated back to flat)
     """
-    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-
-    async def override():
-        async with factory() as s:
-            yield s
-
-    app.dependency_overrides[get_db] = override
     base = 2.5376
 
-    async with factory() as s:
+    async with db_factory() as s:
         s.add(Fund(
             fund_code=_FUND_CODE,
             fund_name="华夏成长",
@@ -207,24 +179,21 @@ async def db_with_spike():
             last_nav=base,
             nav_date=_DATE2,
         ))
-        for time_str, change in [("09:32", 0.0), ("09:33", -0.6018), ("09:34", 0.0)]:
-            s.add(FundEstimateSnapshot(
-                fund_code=_FUND_CODE,
-                est_nav=round(base * (1 + change / 100), 4),
-                est_change_pct=change,
-                snapshot_time=time_str,
-                snapshot_date=_DATE2,
-            ))
+        await s.execute(insert(FundEstimateSnapshot), [
+            {
+                "fund_code": _FUND_CODE,
+                "est_nav": round(base * (1 + change / 100), 4),
+                "est_change_pct": change,
+                "snapshot_time": time_str,
+                "snapshot_date": _DATE2,
+            }
+            for time_str, change in [("09:32", 0.0), ("09:33", -0.6018), ("09:34", 0.0)]
+        ])
         await s.commit()
 
-    yield
-
-    app.dependency_overrides.clear()
-    await engine.dispose()
-
 
 @pytest.mark.asyncio
-async def test_isolated_spike_is_suppressed(db_with_spike):
+async def test_isolated_spike_is_suppressed(db_with_spike, client):
     """A single-point V-spike must be smoothed to the interpolated value.
 
     The middle point (09:33) deviates >= 0.3 % from both neighbours while those
@@ -236,8 +205,7 @@ async def test_isolated_spike_is_suppressed(db_with_spike):
 
     with patch("app.api.chart.datetime") as mock_dt:
         mock_dt.now.return_value = fake_now
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get(f"/api/fund/{_FUND_CODE}/intraday")
+        resp = await client.get(f"/api/fund/{_FUND_CODE}/intraday")
 
     assert resp.status_code == 200
     data = resp.json()
@@ -253,7 +221,7 @@ async def test_isolated_spike_is_suppressed(db_with_spike):
 
 
 @pytest.mark.asyncio
-async def test_legitimate_trend_not_suppressed(db_with_spike):
+async def test_legitimate_trend_not_suppressed(db_factory, client):
     """A genuine downtrend must NOT be flattened by the spike suppressor.
 
     Three consecutive declining points all differ from each other, so the
@@ -262,21 +230,11 @@ async def test_legitimate_trend_not_suppressed(db_with_spike):
     from datetime import datetime, timedelta, timezone
     _CST = timezone(timedelta(hours=8))
 
-    # Seed a separate DB with a genuine trend (three declining points)
-    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-
-    async def override():
-        async with factory() as s:
-            yield s
-
-    app.dependency_overrides[get_db] = override
+    # Seed a genuine trend (three declining points)
     base = 2.5376
     trend_date = "2026-02-26"
 
-    async with factory() as s:
+    async with db_factory() as s:
         s.add(Fund(
             fund_code=_FUND_CODE,
             fund_name="华夏成长",
@@ -285,22 +243,23 @@ async def test_legitimate_trend_not_suppressed(db_with_spike):
             nav_date=trend_date,
         ))
         # Continuously declining: -0.3%, -0.6%, -0.9% — legitimate trend
-        for time_str, change in [("09:30", -0.3), ("09:31", -0.6), ("09:32", -0.9)]:
-            s.add(FundEstimateSnapshot(
-                fund_code=_FUND_CODE,
-                est_nav=round(base * (1 + change / 100), 4),
-                est_change_pct=change,
-                snapshot_time=time_str,
-                snapshot_date=trend_date,
-            ))
+        await s.execute(insert(FundEstimateSnapshot), [
+            {
+                "fund_code": _FUND_CODE,
+                "est_nav": round(base * (1 + change / 100), 4),
+                "est_change_pct": change,
+                "snapshot_time": time_str,
+                "snapshot_date": trend_date,
+            }
+            for time_str, change in [("09:30", -0.3), ("09:31", -0.6), ("09:32", -0.9)]
+        ])
         await s.commit()
 
     fake_now = datetime(2026, 2, 26, 15, 0, tzinfo=timezone(timedelta(hours=8)))
 
     with patch("app.api.chart.datetime") as mock_dt:
         mock_dt.now.return_value = fake_now
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get(f"/api/fund/{_FUND_CODE}/intraday")
+        resp = await client.get(f"/api/fund/{_FUND_CODE}/intraday")
 
     assert resp.status_code == 200
     data = resp.json()
@@ -311,6 +270,3 @@ async def test_legitimate_trend_not_suppressed(db_with_spike):
     assert abs(navs[1] - expected_mid) < 0.0001, (
         f"Legitimate trend incorrectly flattened: navs[1]={navs[1]}, expected {expected_mid}"
     )
-
-    app.dependency_overrides.clear()
-    await engine.dispose()
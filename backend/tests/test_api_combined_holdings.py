@@ -2,30 +2,16 @@
 
 import pytest
 import pytest_asyncio
-from httpx import ASGITransport, AsyncClient
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
-from app.main import app
-from app.models.database import Base, get_db
 from app.models.fund import Fund, FundHolding
 from app.models.portfolio import Portfolio, PortfolioFund
 
 
 @pytest_asyncio.fixture
-async def db_two_funds():
+async def db_two_funds(db_factory):
     """Two funds both holding 茅台, one also holding 五粮液."""
-    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
-    async def override():
-        async with factory() as s:
-            yield s
-
-    app.dependency_overrides[get_db] = override
-
-    async with factory() as s:
+    async with db_factory() as s:
         # Fund A: 7% 茅台, 2% 五粮液
         s.add(Fund(fund_code="000001", fund_name="基金A", fund_type="股票型",
                    last_nav=2.0, nav_date="2026-02-17"))
@@ -46,31 +32,24 @@ async def db_two_funds():
         s.add(PortfolioFund(portfolio_id=1, fund_code="000002", shares=2000.0, cost_nav=1.4))
         await s.commit()
 
-    yield
-
-    app.dependency_overrides.clear()
-    await engine.dispose()
-
 
 @pytest.mark.asyncio
-async def test_combined_holdings_endpoint_exists(db_two_funds):
-    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-        resp = await c.get("/api/portfolio/1/combined-holdings")
+async def test_combined_holdings_endpoint_exists(db_two_funds, client):
+    resp = await client.get("/api/portfolio/1/combined-holdings")
     assert resp.status_code == 200
 
 
 @pytest.mark.asyncio
-async def test_combined_holdings_merges_same_stock(db_two_funds):
+async def test_combined_holdings_merges_same_stock(db_two_funds, client):
     """茅台 should appear once with combined weight from both funds."""
-    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-        resp = await c.get("/api/portfolio/1/combined-holdings")
+    resp = await client.get("/api/portfolio/1/combined-holdings")
     holdings = resp.json()["holdings"]
     codes = [h["stock_code"] for h in holdings]
     assert codes.count("600519") == 1  # merged into one entry
 
 
 @pytest.mark.asyncio
-async def test_combined_holdings_weight_calculation(db_two_funds):
+async def test_combined_holdings_weight_calculation(db_two_funds, client):
     """
     Portfolio total value = 1000*2.0 + 2000*1.5 = 5000
     Fund A weight = 2000/5000 = 0.4
@@ -78,34 +57,30 @@ async def test_combined_holdings_weight_calculation(db_two_funds):
     茅台 combined = 0.07*0.4 + 0.06*0.6 = 0.028 + 0.036 = 0.064
     五粮液 combined = 0.02*0.4 = 0.008
     """
-    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-        resp = await c.get("/api/portfolio/1/combined-holdings")
+    resp = await client.get("/api/portfolio/1/combined-holdings")
     holdings = {h["stock_code"]: h for h in resp.json()["holdings"]}
     assert abs(holdings["600519"]["combined_weight"] - 0.064) < 0.001
     assert abs(holdings["000858"]["combined_weight"] - 0.008) < 0.001
 
 
 @pytest.mark.asyncio
-async def test_combined_holdings_sorted_by_weight(db_two_funds):
+async def test_combined_holdings_sorted_by_weight(db_two_funds, client):
     """Holdings should be sorted by combined_weight descending."""
-    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-        resp = await c.get("/api/portfolio/1/combined-holdings")
+    resp = await client.get("/api/portfolio/1/combined-holdings")
     weights = [h["combined_weight"] for h in resp.json()["holdings"]]
     assert weights == sorted(weights, reverse=True)
 
 
 @pytest.mark.asyncio
-async def test_combined_holdings_not_found(db_two_funds):
-    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-        resp = await c.get("/api/portfolio/999/combined-holdings")
+async def test_combined_holdings_not_found(db_two_funds, client):
+    resp = await client.get("/api/portfolio/999/combined-holdings")
     assert resp.status_code == 404
 
 
 @pytest.mark.asyncio
-async def test_combined_holdings_by_fund_details(db_two_funds):
+async def test_combined_holdings_by_fund_details(db_two_funds, client):
     """茅台 should have contributions from both funds in by_fund."""
-    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-        resp = await c.get("/api/portfolio/1/combined-holdings")
+    resp = await client.get("/api/portfolio/1/combined-holdings")
     holdings = {h["stock_code"]: h for h in resp.json()["holdings"]}
     moutai = holdings["600519"]
     fund_codes = [f["fund_code"] for f in moutai["by_fund"]]
@@ -3,88 +3,42 @@
 from unittest.mock import patch
 
 import pytest
-import pytest_asyncio
-from httpx import ASGITransport, AsyncClient
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-
-from app.main import app
-from app.models.database import Base, get_db
-from app.models.fund import Fund, FundHolding
-
-
-@pytest_asyncio.fixture
-async def db_session():
-    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    session_factory = async_sessionmaker(
-        engine, class_=AsyncSession, expire_on_commit=False
-    )
-
-    async def override_get_db():
-        async with session_factory() as session:
-            yield session
-
-    app.dependency_overrides[get_db] = override_get_db
-
-    async with session_factory() as session:
-        # Seed data
-        fund = Fund(
-            fund_code="000001",
-            fund_name="华夏成长",
-            fund_type="混合型",
-            last_nav=1.5,
-            nav_date="2026-02-14",
-        )
-        session.add(fund)
-        holding = FundHolding(
-            fund_code="000001",
-            stock_code="600519",
-            stock_name="贵州茅台",
-            holding_ratio=0.089,
-            report_date="2025-12-31",
-        )
-        session.add(holding)
-        await session.commit()
-
-    yield
-
-    app.dependency_overrides.clear()
-    await engine.dispose()
+
+from app.api.fund import get_estimate
+
+
+async def _estimate(db_factory):
+    """Call the estimate handler directly; these tests check figures, not HTTP."""
+    async with db_factory() as session:
+        return await get_estimate("000001", db=session)
 
 
 @pytest.mark.asyncio
-async def test_get_fund(db_session):
-    transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        resp = await client.get("/api/fund/000001")
-        assert resp.status_code == 200
-        data = resp.json()
-        assert data["fund_code"] == "000001"
-        assert data["fund_name"] == "华夏成长"
+async def test_get_fund(seeded_db, client):
+    resp = await client.get("/api/fund/000001")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["fund_code"] == "000001"
+    assert data["fund_name"] == "华夏成长"
 
 
 @pytest.mark.asyncio
-async def test_get_fund_not_found(db_session):
-    transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        resp = await client.get("/api/fund/999999")
-        assert resp.status_code == 404
+async def test_get_fund_not_found(seeded_db, client):
+    resp = await client.get("/api/fund/999999")
+    assert resp.status_code == 404
 
 
 @pytest.mark.asyncio
-async def test_get_holdings(db_session):
-    transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        resp = await client.get("/api/fund/000001/holdings")
-        assert resp.status_code == 200
-        data = resp.json()
-        assert len(data) == 1
-        assert data[0]["stock_code"] == "600519"
+async def test_get_holdings(seeded_db, client):
+    resp = await client.get("/api/fund/000001/holdings")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert len(data) == 1
+    assert data[0]["stock_code"] == "600519"
 
 
 @pytest.mark.asyncio
-async def test_get_estimate(db_session):
+async def test_get_estimate(seeded_db, db_factory):
     mock_quotes = {
         "600519": {"price": 1800.0, "change_pct": 2.0, "name": "贵州茅台"},
     }
@@ -95,38 +49,30 @@ async def test_get_estimate(db_session):
         "app.api.fund.market_data_service.is_market_trading_today",
         return_value=True,
     ):
-        transport = ASGITransport(app=app)
-        async with AsyncClient(transport=transport, base_url="http://test") as client:
-            resp = await client.get("/api/fund/000001/estimate")
-            assert resp.status_code == 200
-            data = resp.json()
-            assert data["fund_code"] == "000001"
-            assert data["est_change_pct"] > 0
-            assert "details" in data
-            assert not data["degraded"]
+        est = await _estimate(db_factory)
+    assert est.fund_code == "000001"
+    assert est.est_change_pct > 0
+    assert est.details
+    assert not est.degraded
 
 
 @pytest.mark.asyncio
-async def test_get_estimate_non_trading_day(db_session):
+async def test_get_estimate_non_trading_day(seeded_db, db_factory):
     """On non-trading days estimate returns last_nav with zero change and degraded=True."""
     with patch(
         "app.api.fund.market_data_service.is_market_trading_today",
         return_value=False,
     ):
-        transport = ASGITransport(app=app)
-        async with AsyncClient(transport=transport, base_url="http://test") as client:
-            resp = await client.get("/api/fund/000001/estimate")
-            assert resp.status_code == 200
-            data = resp.json()
-            assert data["fund_code"] == "000001"
-            assert data["est_change_pct"] == 0.0
-            assert data["est_nav"] == 1.5  # equals last_nav seeded in fixture
-            assert data["details"] == []
-            assert data["degraded"]
+        est = await _estimate(db_factory)
+    assert est.fund_code == "000001"
+    assert est.est_change_pct == 0.0
+    assert est.est_nav == 1.5  # equals last_nav seeded in fixture
+    assert est.details == []
+    assert est.degraded
 
 
 @pytest.mark.asyncio
-async def test_get_estimate_degraded_quotes_unavailable(db_session):
+async def test_get_estimate_degraded_quotes_unavailable(seeded_db, db_factory):
     """On a trading day when quotes fetch returns empty dict, return 200 with degraded=True."""
     with patch(
         "app.api.fund.market_data_service.get_stock_quotes",
@@ -135,12 +81,8 @@ async def test_get_estimate_degraded_quotes_unavailable(db_session):
         "app.api.fund.market_data_service.is_market_trading_today",
         return_value=True,
     ):
-        transport = ASGITransport(app=app)
-        async with AsyncClient(transport=transport, base_url="http://test") as client:
-            resp = await client.get("/api/fund/000001/estimate")
-            assert resp.status_code == 200
-            data = resp.json()
-            assert data["fund_code"] == "000001"
-            assert data["degraded"]
-            assert data["est_change_pct"] == 0.0
-            assert data["est_nav"] == 1.5  # equals last_nav seeded in fixture
+        est = await _estimate(db_factory)
+    assert est.fund_code == "000001"
+    assert est.degraded
+    assert est.est_change_pct == 0.0
+    assert est.est_nav == 1.5  # equals last_nav seeded in fixture
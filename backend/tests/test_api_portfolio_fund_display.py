@@ -1,32 +1,49 @@
 """Tests for portfolio fund detail display (names, per-fund P&L)."""
 
+import asyncio
 from unittest.mock import patch
 
+import orjson
 import pytest
 import pytest_asyncio
-from httpx import ASGITransport, AsyncClient
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import delete, insert
 
-from app.main import app
-from app.models.database import Base, get_db
+from app.api.portfolio_routes import get_portfolio_detail
 from app.models.fund import Fund, FundHolding
 from app.models.portfolio import Portfolio, PortfolioFund
+from app.services.cache import estimate_cache, stock_cache
+from app.services.estimator import estimate_cache_key
 
+# 贵州茅台 up 2%: the quote most tests here estimate from
+MOCK_QUOTES = {"600519": {"price": 1900.0, "change_pct": 2.0, "name": "贵州茅台"}}
+
+
+def _async_return(value):
+    """A plain coroutine stub for a service method; no mock bookkeeping."""
+    async def _stub(*args, **kwargs):
+        return value
+    return _stub
 
-@pytest_asyncio.fixture
-async def db_with_data():
-    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
-    async def override():
-        async with factory() as s:
-            yield s
+@pytest.fixture(scope="module", autouse=True)
+def _mock_quotes():
+    """Serve MOCK_QUOTES for the module; tests needing other quotes override it."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr("app.api.portfolio_routes.market_data_service.get_stock_quotes", _async_return(MOCK_QUOTES))
+        yield
 
-    app.dependency_overrides[get_db] = override
 
-    async with factory() as s:
+async def _portfolio_detail(db_factory) -> dict:
+    """Call the detail handler directly; these tests check figures, not HTTP."""
+    async with db_factory() as session:
+        resp = await get_portfolio_detail(1, db=session)
+    return orjson.loads(resp.body)
+
+
+@pytest_asyncio.fixture(scope="module")
+async def db_with_data(module_db):
+    """Seeded once per module; each test's own writes are rolled back."""
+    async with module_db() as s:
         s.add(Fund(fund_code="000001", fund_name="华夏成长", fund_type="混合型",
                    last_nav=2.0, nav_date="2026-02-17"))
         s.add(FundHolding(fund_code="000001", stock_code="600519",
@@ -35,61 +52,147 @@ async def db_with_data():
         s.add(PortfolioFund(portfolio_id=1, fund_code="000001", shares=1000.0, cost_nav=1.8))
         await s.commit()
 
-    yield
-
-    app.dependency_overrides.clear()
-    await engine.dispose()
-
 
 @pytest.mark.asyncio
-async def test_portfolio_fund_has_name(db_with_data):
-    mock_quotes = {"600519": {"price": 1900.0, "change_pct": 2.0, "name": "贵州茅台"}}
-    with patch("app.api.portfolio_routes.market_data_service.get_stock_quotes",
-               return_value=mock_quotes):
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get("/api/portfolio/1")
-    assert resp.status_code == 200
-    fund = resp.json()["funds"][0]
+async def test_portfolio_fund_has_name(db_with_data, db_factory):
+    detail = await _portfolio_detail(db_factory)
+    fund = detail["funds"][0]
     assert fund["fund_name"] == "华夏成长"
 
 
 @pytest.mark.asyncio
-async def test_portfolio_fund_has_est_change_pct(db_with_data):
-    mock_quotes = {"600519": {"price": 1900.0, "change_pct": 2.0, "name": "贵州茅台"}}
-    with patch("app.api.portfolio_routes.market_data_service.get_stock_quotes",
-               return_value=mock_quotes), \
-         patch("app.api.portfolio_routes.market_data_service.is_market_trading_today",
-               return_value=True):
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get("/api/portfolio/1")
-    fund = resp.json()["funds"][0]
+async def test_portfolio_fund_has_est_change_pct(db_with_data, db_factory, monkeypatch):
+    monkeypatch.setattr("app.api.portfolio_routes.market_data_service.is_market_trading_today", _async_return(True))
+    detail = await _portfolio_detail(db_factory)
+    fund = detail["funds"][0]
     # est_change_pct = 0.1 * 2.0 = 0.2
     assert abs(fund["est_change_pct"] - 0.2) < 0.001
     assert fund["coverage"] == pytest.approx(0.1, abs=0.001)
 
 
 @pytest.mark.asyncio
-async def test_portfolio_fund_profit_pct(db_with_data):
+async def test_portfolio_fund_profit_pct(db_with_data, db_factory, monkeypatch):
     """profit_pct = (est_nav - cost_nav) / cost_nav * 100"""
     mock_quotes = {"600519": {"price": 1900.0, "change_pct": 0.0, "name": "贵州茅台"}}
-    with patch("app.api.portfolio_routes.market_data_service.get_stock_quotes",
-               return_value=mock_quotes):
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get("/api/portfolio/1")
-    fund = resp.json()["funds"][0]
+    monkeypatch.setattr("app.api.portfolio_routes.market_data_service.get_stock_quotes", _async_return(mock_quotes))
+    detail = await _portfolio_detail(db_factory)
+    fund = detail["funds"][0]
     # est_nav = last_nav = 2.0 (change_pct=0, so estimate = last_nav * (1+0/100) = 2.0)
     expected_profit_pct = (2.0 - 1.8) / 1.8 * 100
     assert abs(fund["profit_pct"] - expected_profit_pct) < 0.01
 
 
 @pytest.mark.asyncio
-async def test_portfolio_fund_holdings_date(db_with_data):
-    mock_quotes = {}
+async def test_portfolio_fund_holdings_date(db_with_data, client, monkeypatch):
+    monkeypatch.setattr("app.api.portfolio_routes.market_data_service.get_stock_quotes", _async_return({}))
+    monkeypatch.setattr("app.api.portfolio_routes.market_data_service.is_market_trading_today", _async_return(True))
+    resp = await client.get("/api/portfolio/1")
+    fund = resp.json()["funds"][0]
+    assert fund["holdings_date"] == "2025-12-31"
+
+
+@pytest.mark.asyncio
+async def test_portfolio_detail_skips_holdings_query_off_market(db_with_data, client):
+    """Off-market the estimate is last_nav, so holdings are never loaded."""
+    with patch("app.api.portfolio_routes.market_data_service.is_market_trading_today",
+               return_value=False), \
+         patch("app.api.portfolio_routes.fund_info_service.get_holdings_by_fund_codes") as mock_h:
+        resp = await client.get("/api/portfolio/1")
+    mock_h.assert_not_called()
+    fund = resp.json()["funds"][0]
+    assert fund["est_nav"] == 2.0
+    assert fund["holdings_date"] is None
+
+
+@pytest.mark.asyncio
+async def test_portfolio_detail_releases_session_during_trading_day_check(
+    db_with_data, db_factory
+):
+    """A slow trading-day lookup doesn't keep the request's transaction open."""
+    in_transaction = []
+
+    async with db_factory() as session:
+        async def _slow_check():
+            await asyncio.sleep(0.05)
+            in_transaction.append(session.in_transaction())
+            return False
+
+        with patch("app.api.portfolio_routes.market_data_service.is_market_trading_today",
+                   side_effect=_slow_check):
+            await get_portfolio_detail(1, db=session)
+
+    assert in_transaction == [False]
+
+
+@pytest_asyncio.fixture
+async def db_with_sibling_funds(db_factory):
+    """Two funds in one portfolio that both hold 600519."""
+    async with db_factory() as s:
+        # Replace the module's db_with_data rows for this test only
+        for model in (PortfolioFund, Portfolio, FundHolding, Fund):
+            await s.execute(delete(model))
+        funds = (("000001", "000858"), ("110011", "601318"))
+        # One executemany INSERT per table instead of an add() per row
+        await s.execute(insert(Fund), [
+            {"fund_code": code, "fund_name": f"基金{code}", "fund_type": "混合型",
+             "last_nav": 2.0, "nav_date": "2026-02-17"}
+            for code, _ in funds
+        ])
+        await s.execute(insert(FundHolding), [
+            {"fund_code": code, "stock_code": stock, "stock_name": name,
+             "holding_ratio": ratio, "report_date": "2025-12-31"}
+            for code, other in funds
+            for stock, name, ratio in (("600519", "贵州茅台", 0.1), (other, "其他", 0.05))
+        ])
+        await s.execute(insert(PortfolioFund), [
+            {"portfolio_id": 1, "fund_code": code, "shares": 100.0, "cost_nav": 1.8}
+            for code, _ in funds
+        ])
+        s.add(Portfolio(id=1, name="测试组合"))
+        await s.commit()
+
+
+@pytest.mark.asyncio
+async def test_portfolio_detail_fetches_uncached_quotes_once(db_with_sibling_funds, client):
+    """Overlapping holdings across funds are fetched in one deduplicated call."""
+    stock_cache.clear()
     with patch("app.api.portfolio_routes.market_data_service.get_stock_quotes",
-               return_value=mock_quotes), \
+               return_value=MOCK_QUOTES) as mock_get, \
          patch("app.api.portfolio_routes.market_data_service.is_market_trading_today",
                return_value=True):
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get("/api/portfolio/1")
+        resp = await client.get("/api/portfolio/1")
+
+    mock_get.assert_called_once_with(["000858", "600519", "601318"])
+    for fund in resp.json()["funds"]:
+        assert abs(fund["est_change_pct"] - 0.2) < 0.001
+
+
+@pytest.mark.asyncio
+async def test_portfolio_detail_reads_cached_estimate(db_with_data, client):
+    """A warm per-fund estimate skips holdings, quotes and the estimator."""
+    estimate_cache.set(estimate_cache_key("000001", 2.0), {
+        "est_nav": 2.02, "est_change_pct": 1.0, "coverage": 0.1,
+        "holdings_date": "2025-12-31",
+    })
+    with patch("app.api.portfolio_routes.market_data_service.is_market_trading_today",
+               return_value=True), \
+         patch("app.api.portfolio_routes.fund_info_service.get_holdings_by_fund_codes") as mock_h, \
+         patch("app.api.portfolio_routes.market_data_service.get_stock_quotes") as mock_q:
+        resp = await client.get("/api/portfolio/1")
+    mock_h.assert_not_called()
+    mock_q.assert_not_called()
     fund = resp.json()["funds"][0]
+    assert fund["est_nav"] == 2.02
+    assert fund["est_change_pct"] == 1.0
     assert fund["holdings_date"] == "2025-12-31"
+
+
+@pytest.mark.asyncio
+async def test_portfolio_detail_populates_estimate_cache(db_with_data, client, monkeypatch):
+    """A computed estimate with coverage is shared with later requests."""
+    stock_cache.clear()
+    monkeypatch.setattr("app.api.portfolio_routes.market_data_service.is_market_trading_today", _async_return(True))
+    await client.get("/api/portfolio/1")
+    cached = estimate_cache.get(estimate_cache_key("000001", 2.0))
+    assert cached is not None
+    assert abs(cached["est_change_pct"] - 0.2) < 0.001
@@ -1,31 +1,20 @@
 """Tests for portfolio history endpoint (on-the-fly NAV computation)."""
 
+from datetime import date, timedelta
+from types import MappingProxyType
 from unittest.mock import patch
 
 import pytest
 import pytest_asyncio
-from httpx import ASGITransport, AsyncClient
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
-from app.main import app
-from app.models.database import Base, get_db
+from app.api.portfolio_routes import get_portfolio_history
 from app.models.portfolio import Portfolio, PortfolioFund
 
 
-@pytest_asyncio.fixture
-async def db_with_portfolio():
-    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-
-    async def override():
-        async with factory() as s:
-            yield s
-
-    app.dependency_overrides[get_db] = override
-
-    async with factory() as s:
+@pytest_asyncio.fixture(scope="module")
+async def db_with_portfolio(module_db):
+    """Seeded once per module; each test's own writes are rolled back."""
+    async with module_db() as s:
         s.add(Portfolio(id=1, name="测试组合"))
         # Fund 110011: 1000 shares @ cost 1.0 → cost contribution = 1000
         s.add(PortfolioFund(portfolio_id=1, fund_code="110011", shares=1000.0, cost_nav=1.0))
@@ -33,90 +22,118 @@ async def db_with_portfolio():
         s.add(PortfolioFund(portfolio_id=1, fund_code="000001", shares=500.0, cost_nav=2.0))
         await s.commit()
 
-    yield
-
-    app.dependency_overrides.clear()
-    await engine.dispose()
-
 
-# Mock NAV history data — dates within a typical 30-day window
-MOCK_NAV_110011 = {
-    "2026-02-10": 1.10,
-    "2026-02-11": 1.15,
-    "2026-02-12": 1.12,
-    "2026-02-13": 1.18,
-    "2026-02-17": 1.20,
-}
-MOCK_NAV_000001 = {
-    "2026-02-10": 2.05,
-    "2026-02-11": 2.10,
-    "2026-02-12": 2.08,
-    "2026-02-13": 2.15,
-    "2026-02-17": 2.20,
-}
+# Mock NAV history data — trading dates within the last 30 days, oldest first,
+# relative to today so the window never ages past them.  Read-only views: the
+# route only reads them, and nothing can mutate them between tests.
+MOCK_DATES = tuple(
+    (date.today() - timedelta(days=days_ago)).strftime("%Y-%m-%d")
+    for days_ago in (7, 6, 5, 4, 0)
+)
+MOCK_NAV_110011 = MappingProxyType(dict(zip(MOCK_DATES, (1.10, 1.15, 1.12, 1.18, 1.20))))
+MOCK_NAV_000001 = MappingProxyType(dict(zip(MOCK_DATES, (2.05, 2.10, 2.08, 2.15, 2.20))))
+NAV_MAP = MappingProxyType({"110011": MOCK_NAV_110011, "000001": MOCK_NAV_000001})
 
 
-def _mock_nav_history(fund_code: str) -> dict[str, float]:
-    if fund_code == "110011":
-        return MOCK_NAV_110011
-    return MOCK_NAV_000001
+@pytest.fixture(scope="module")
+def mock_nav_history():
+    """Serve the mock NAV tables for the whole module's default-history tests."""
+    with patch(
+        "app.api.portfolio_routes.market_data_service.get_fund_nav_history",
+        side_effect=lambda code, latest_nav_date=None: NAV_MAP[code],
+    ) as mock:
+        yield mock
 
 
 @pytest.mark.asyncio
-async def test_get_portfolio_history(db_with_portfolio):
-    with patch(
-        "app.api.portfolio_routes.market_data_service.get_fund_nav_history",
-        side_effect=_mock_nav_history,
-    ):
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get("/api/portfolio/1/history?period=30d")
+@pytest.mark.parametrize("period,expected_len", [("30d", 5)])
+async def test_get_portfolio_history(
+    db_with_portfolio, mock_nav_history, client, period, expected_len
+):
+    resp = await client.get(f"/api/portfolio/1/history?period={period}")
 
     assert resp.status_code == 200
     data = resp.json()
-    assert "dates" in data
-    assert "values" in data
-    assert "costs" in data
-    assert "profit_pcts" in data
-    # 5 distinct trading dates across both mock funds
-    assert len(data["dates"]) == 5
+    assert {"dates", "values", "costs", "profit_pcts"} <= data.keys()
+    # 5 distinct trading dates across both mock funds, oldest first
+    assert len(data["dates"]) == expected_len
+    assert data["dates"] == sorted(data["dates"])
+
+    # Portfolio value is summed from each fund's NAV on the date:
+    # value = 1000 * 1.10 + 500 * 2.05 = 1100 + 1025 = 2125.0
+    # cost  = 1000 * 1.0  + 500 * 2.0  = 1000 + 1000 = 2000.0
+    # profit_pct = (2125 - 2000) / 2000 * 100 = 6.25%
+    idx = data["dates"].index(MOCK_DATES[0])
+    assert data["values"][idx] == 2125.0
+    assert data["costs"][idx] == 2000.0
+    assert abs(data["profit_pcts"][idx] - 6.25) < 0.001
 
 
 @pytest.mark.asyncio
-async def test_portfolio_history_sorted_asc(db_with_portfolio):
+async def test_portfolio_history_not_found(db_with_portfolio, client):
+    resp = await client.get("/api/portfolio/999/history")
+    assert resp.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_portfolio_history_fund_without_nav_uses_cost(db_with_portfolio, client):
+    """A fund with no NAV history contributes shares * cost_nav on every date."""
+    recent = (date.today() - timedelta(days=2)).strftime("%Y-%m-%d")
+
+    def _navs(fund_code: str, latest_nav_date: str | None = None) -> dict[str, float]:
+        return {recent: 1.10} if fund_code == "110011" else {}
+
     with patch(
         "app.api.portfolio_routes.market_data_service.get_fund_nav_history",
-        side_effect=_mock_nav_history,
+        side_effect=_navs,
     ):
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get("/api/portfolio/1/history?period=30d")
+        resp = await client.get("/api/portfolio/1/history?period=30d")
 
-    dates = resp.json()["dates"]
-    assert dates == sorted(dates)
+    data = resp.json()
+    assert data["dates"] == [recent]
+    # 1000 * 1.10 + 500 * 2.0 (cost_nav fallback) = 2100.0
+    assert data["values"] == [2100.0]
 
 
 @pytest.mark.asyncio
-async def test_portfolio_history_value_computation(db_with_portfolio):
-    """Portfolio value is correctly summed from fund NAV on each date."""
+async def test_portfolio_history_carries_forward_missing_dates(db_with_portfolio, client):
+    """On a date one fund has no NAV for, its previous NAV is carried forward."""
+    d1 = (date.today() - timedelta(days=3)).strftime("%Y-%m-%d")
+    d2 = (date.today() - timedelta(days=2)).strftime("%Y-%m-%d")
+
+    def _navs(fund_code: str, latest_nav_date: str | None = None) -> dict[str, float]:
+        if fund_code == "110011":
+            return {d1: 1.10, d2: 1.20}
+        return {d1: 2.05}
+
     with patch(
         "app.api.portfolio_routes.market_data_service.get_fund_nav_history",
-        side_effect=_mock_nav_history,
+        side_effect=_navs,
     ):
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get("/api/portfolio/1/history?period=30d")
+        resp = await client.get("/api/portfolio/1/history?period=30d")
 
     data = resp.json()
-    idx = data["dates"].index("2026-02-10")
-
-    # value = 1000 * 1.10 + 500 * 2.05 = 1100 + 1025 = 2125.0
-    # cost  = 1000 * 1.0  + 500 * 2.0  = 1000 + 1000 = 2000.0
-    # profit_pct = (2125 - 2000) / 2000 * 100 = 6.25%
-    assert data["values"][idx] == 2125.0
-    assert data["costs"][idx] == 2000.0
-    assert abs(data["profit_pcts"][idx] - 6.25) < 0.001
+    assert data["dates"] == [d1, d2]
+    # d2: 1000 * 1.20 + 500 * 2.05 (carried from d1) = 2225.0
+    assert data["values"] == [2125.0, 2225.0]
+    assert data["costs"] == [2000.0, 2000.0]
+    assert data["profit_pcts"] == [6.25, 11.25]
 
 
 @pytest.mark.asyncio
-async def test_portfolio_history_not_found(db_with_portfolio):
-    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-        resp = await c.get("/api/portfolio/999/history")
-    assert resp.status_code == 404
+async def test_portfolio_history_releases_session_before_fetching(db_with_portfolio, db_factory):
+    """The NAV history fetches run with no transaction (pooled connection) held."""
+    in_transaction = []
+
+    async with db_factory() as session:
+        def _navs(fund_code: str, latest_nav_date: str | None = None) -> dict[str, float]:
+            in_transaction.append(session.in_transaction())
+            return {}
+
+        with patch(
+            "app.api.portfolio_routes.market_data_service.get_fund_nav_history",
+            side_effect=_navs,
+        ):
+            await get_portfolio_history(1, period="30d", db=session)
+
+    assert in_transaction == [False, False]
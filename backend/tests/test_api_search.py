@@ -1,46 +1,76 @@
 """Tests for fund search endpoint."""
 
+import os
 from unittest.mock import patch
 
 import pandas as pd
 import pytest
 import pytest_asyncio
-from httpx import ASGITransport, AsyncClient
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
+import app.services.fund_names as fund_names
 from app.main import app
-from app.models.database import Base, get_db
+from app.models.database import get_db, get_write_db
+from app.services.cache import fund_name_cache
 
 
 @pytest_asyncio.fixture
-async def empty_db():
-    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-
+async def empty_db(db_factory):
     async def override():
-        async with factory() as s:
+        async with db_factory() as s:
             yield s
 
     app.dependency_overrides[get_db] = override
+    app.dependency_overrides[get_write_db] = override
     yield
     app.dependency_overrides.clear()
-    await engine.dispose()
 
 
+# Fund tables are built once at import; tests pick one via the fund_table fixture
 MOCK_FUND_TABLE = pd.DataFrame({
     "基金代码": ["000001", "000002", "110022", "270002"],
     "基金简称": ["华夏成长混合", "华夏优势增长", "易方达消费行业", "广发稳健增长"],
     "基金类型": ["混合型", "股票型", "股票型", "混合型"],
 })
+BIG_FUND_TABLE = pd.DataFrame({
+    "基金代码": [f"{i:06d}" for i in range(100)],
+    "基金简称": [f"测试基金{i}" for i in range(100)],
+    "基金类型": ["混合型"] * 100,
+})
+ETF_FUND_TABLE = pd.DataFrame({
+    "基金代码": ["510300", "159919", "000051"],
+    "基金简称": ["华泰柏瑞沪深300ETF", "嘉实沪深300etf", "华夏沪深300ETF联接A"],
+    "基金类型": ["指数型", "指数型", "指数型"],
+})
+DIGIT_NAME_FUND_TABLE = pd.DataFrame({
+    "基金代码": ["000051", "300001"],
+    "基金简称": ["华夏沪深300ETF联接A", "测试基金"],
+    "基金类型": ["指数型", "混合型"],
+})
+
+# MOCK_FUND_TABLE plus one fund listed since, for the refresh test
+NEWER_FUND_TABLE = pd.concat([MOCK_FUND_TABLE, pd.DataFrame({
+    "基金代码": ["999999"], "基金简称": ["新基金"], "基金类型": ["股票型"],
+})])
+
+
+@pytest.fixture(scope="module")
+def _fund_name_em():
+    """One patcher for the module instead of entering and exiting one per test."""
+    with patch("app.services.fund_names.ak.fund_name_em") as mock_em:
+        yield mock_em
+
+
+@pytest.fixture(autouse=True)
+def fund_table(request, _fund_name_em):
+    """Serve MOCK_FUND_TABLE, or the table a test parametrizes indirectly."""
+    _fund_name_em.reset_mock(return_value=True, side_effect=True)
+    _fund_name_em.return_value = getattr(request, "param", MOCK_FUND_TABLE)
+    return _fund_name_em
 
 
 @pytest.mark.asyncio
-async def test_search_by_name(empty_db):
-    with patch("app.api.search.ak.fund_name_em", return_value=MOCK_FUND_TABLE):
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get("/api/fund/search?q=华夏")
+async def test_search_by_name(empty_db, client):
+    resp = await client.get("/api/fund/search?q=华夏")
     assert resp.status_code == 200
     results = resp.json()
     codes = [r["fund_code"] for r in results]
@@ -50,10 +80,8 @@ async def test_search_by_name(empty_db):
 
 
 @pytest.mark.asyncio
-async def test_search_by_code(empty_db):
-    with patch("app.api.search.ak.fund_name_em", return_value=MOCK_FUND_TABLE):
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get("/api/fund/search?q=1100")
+async def test_search_by_code(empty_db, client):
+    resp = await client.get("/api/fund/search?q=1100")
     assert resp.status_code == 200
     results = resp.json()
     assert len(results) == 1
@@ -61,31 +89,117 @@ async def test_search_by_code(empty_db):
 
 
 @pytest.mark.asyncio
-async def test_search_returns_max_20(empty_db):
+@pytest.mark.parametrize("fund_table", [BIG_FUND_TABLE], indirect=True)
+async def test_search_returns_max_20(empty_db, client):
     """Results capped at 20 to avoid huge payloads."""
-    big_table = pd.DataFrame({
-        "基金代码": [f"{i:06d}" for i in range(100)],
-        "基金简称": [f"测试基金{i}" for i in range(100)],
-        "基金类型": ["混合型"] * 100,
-    })
-    with patch("app.api.search.ak.fund_name_em", return_value=big_table):
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get("/api/fund/search?q=测试")
+    resp = await client.get("/api/fund/search?q=测试")
     assert len(resp.json()) <= 20
 
 
 @pytest.mark.asyncio
-async def test_search_empty_query_returns_empty(empty_db):
-    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-        resp = await c.get("/api/fund/search?q=")
+@pytest.mark.parametrize("fund_table", [ETF_FUND_TABLE], indirect=True)
+async def test_search_name_is_case_insensitive_and_code_ordered(empty_db, client):
+    resp = await client.get("/api/fund/search?q=ETF")
+    assert [r["fund_code"] for r in resp.json()] == ["000051", "159919", "510300"]
+
+
+@pytest.mark.asyncio
+async def test_search_empty_query_returns_empty(empty_db, client):
+    resp = await client.get("/api/fund/search?q=")
     assert resp.status_code == 200
     assert resp.json() == []
 
 
 @pytest.mark.asyncio
-async def test_search_no_results(empty_db):
-    with patch("app.api.search.ak.fund_name_em", return_value=MOCK_FUND_TABLE):
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
-            resp = await c.get("/api/fund/search?q=不存在的基金名称XYZ")
+async def test_search_single_char_query_skips_table(empty_db, client, fund_table):
+    """One-character autocomplete keystrokes return nothing without a scan."""
+    resp = await client.get("/api/fund/search?q=华")
+    assert resp.json() == []
+    fund_table.assert_not_called()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("fund_table", [DIGIT_NAME_FUND_TABLE], indirect=True)
+async def test_search_digit_query_matches_codes_only(empty_db, client):
+    """All-digit queries are code prefixes, not name substrings."""
+    resp = await client.get("/api/fund/search?q=300")
+    assert [r["fund_code"] for r in resp.json()] == ["300001"]
+
+
+@pytest.mark.asyncio
+async def test_search_no_results(empty_db, client):
+    resp = await client.get("/api/fund/search?q=不存在的基金名称XYZ")
     assert resp.status_code == 200
     assert resp.json() == []
+
+
+@pytest.mark.asyncio
+async def test_search_persists_snapshot_and_serves_it_after_restart(
+    empty_db, client, fund_table
+):
+    await client.get("/api/fund/search?q=华夏")
+
+    fund_name_cache.clear()  # simulate a process restart
+    fund_table.side_effect = AssertionError("network")
+    resp = await client.get("/api/fund/search?q=易方达")
+    assert [r["fund_code"] for r in resp.json()] == ["110022"]
+
+
+@pytest.mark.asyncio
+async def test_stale_snapshot_is_served_then_refreshed(empty_db, client, fund_table):
+    await client.get("/api/fund/search?q=华夏")
+    snapshot = fund_names.FUND_NAME_SNAPSHOT_PATH
+    old = snapshot.stat().st_mtime - 2 * 86400
+    os.utime(snapshot, (old, old))
+
+    fund_name_cache.clear()
+    fund_table.return_value = NEWER_FUND_TABLE
+    stale = await client.get("/api/fund/search?q=新基金")
+    await fund_names._refresh_task
+    fresh = await client.get("/api/fund/search?q=新基金")
+    assert stale.json() == []
+    assert [r["fund_code"] for r in fresh.json()] == ["999999"]
+    assert snapshot.stat().st_mtime > old
+
+
+MOCK_NAV = {"nav": 1.5, "nav_date": "2026-02-14", "acc_nav": 3.0}
+MOCK_HOLDINGS = [
+    {"stock_code": "600519", "stock_name": "贵州茅台", "holding_ratio": 0.089},
+]
+
+
+@pytest.mark.asyncio
+async def test_setup_fund_falls_back_to_last_year_holdings(empty_db, client):
+    """Empty current-year holdings trigger one extra lookup for the prior year."""
+    years = []
+
+    def fake_holdings(fund_code, year):
+        years.append(year)
+        if len(years) == 1:
+            return [], None
+        return MOCK_HOLDINGS, "2025-12-31"
+
+    svc = "app.api.search.market_data_service"
+    with (
+        patch(f"{svc}.get_fund_nav", return_value=MOCK_NAV),
+        patch(f"{svc}.get_fund_holdings", side_effect=fake_holdings),
+        patch(f"{svc}.get_fund_basic_info",
+              return_value={"fund_name": "华夏成长混合", "fund_type": "混合型"}),
+    ):
+        resp = await client.post("/api/fund/setup/000001")
+    assert resp.status_code == 200
+    assert resp.json()["holdings_count"] == 1
+    assert len(years) == 2
+    assert int(years[1]) == int(years[0]) - 1
+
+
+@pytest.mark.asyncio
+async def test_setup_fund_unknown_code_returns_404(empty_db, client):
+    svc = "app.api.search.market_data_service"
+    with (
+        patch(f"{svc}.get_fund_nav", return_value=None),
+        patch(f"{svc}.get_fund_holdings", return_value=([], None)),
+        patch(f"{svc}.get_fund_basic_info", return_value=None),
+    ):
+        resp = await client.post("/api/fund/setup/999999")
+    assert resp.status_code == 404
@@ -1,10 +1,23 @@
 """Tests for in-memory cache service."""
 
-import time
+import pytest
 
 from app.services.cache import CacheService
 
 
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
 def test_set_and_get():
     cache = CacheService(default_ttl=60)
     cache.set("key1", {"price": 100.5})
@@ -17,19 +30,20 @@ def test_get_missing_key():
     assert cache.get("nonexistent") is None
 
 
-def test_ttl_expiry():
-    cache = CacheService(default_ttl=1)
+def test_ttl_expiry(clock):
+    cache = CacheService(default_ttl=1, time_fn=clock)
     cache.set("key1", "value1")
     assert cache.get("key1") == "value1"
-    time.sleep(1.1)
+    clock.now += 1.1
     assert cache.get("key1") is None
 
 
-def test_custom_ttl():
-    cache = CacheService(default_ttl=60)
+def test_custom_ttl(clock):
+    cache = CacheService(default_ttl=60, time_fn=clock)
     cache.set("key1", "value1", ttl=1)
+    clock.now += 0.9
     assert cache.get("key1") == "value1"
-    time.sleep(1.1)
+    clock.now += 0.2
     assert cache.get("key1") is None
 
 
@@ -1,9 +1,8 @@
 """Tests for fund estimator engine."""
 
-
 import pytest
 
-from app.services.estimator import FundEstimator
+from app.services.estimator import FundEstimator, HoldingInput, quote_change_pcts
 
 
 @pytest.fixture
@@ -11,68 +10,50 @@ def estimator():
     return FundEstimator()
 
 
-class TestCalculateEstimate:
-    def test_basic_estimate(self, estimator):
-        """Fund with 2 holdings, both up."""
-        holdings = [
-            {"stock_code": "600519", "stock_name": "贵州茅台", "holding_ratio": 0.089},
-            {"stock_code": "000858", "stock_name": "五粮液", "holding_ratio": 0.065},
-        ]
-        stock_quotes = {
-            "600519": {"price": 1800.0, "change_pct": 2.0, "name": "贵州茅台"},
-            "000858": {"price": 150.0, "change_pct": -1.0, "name": "五粮液"},
-        }
-        last_nav = 1.0
-
-        result = estimator.calculate_estimate(holdings, stock_quotes, last_nav)
+MAOTAI = HoldingInput("600519", "贵州茅台", 0.089)
+WULIANGYE = HoldingInput("000858", "五粮液", 0.065)
+DELISTED = HoldingInput("999999", "已退市", 0.05)
 
-        # Expected: 0.089 * 2.0% + 0.065 * (-1.0%) = 0.178% - 0.065% = 0.113%
-        expected_change_pct = 0.089 * 2.0 + 0.065 * (-1.0)
-        expected_nav = last_nav * (1 + expected_change_pct / 100)
 
-        assert abs(result["est_change_pct"] - expected_change_pct) < 0.0001
-        assert abs(result["est_nav"] - expected_nav) < 0.0001
-        assert result["coverage"] == pytest.approx(0.154, abs=0.001)
+def _quote(change_pct: float) -> dict:
+    return {"price": 1800.0, "change_pct": change_pct, "name": ""}
 
-    def test_all_holdings_flat(self, estimator):
-        """All stocks unchanged."""
-        holdings = [
-            {"stock_code": "600519", "stock_name": "贵州茅台", "holding_ratio": 0.089},
-        ]
-        stock_quotes = {
-            "600519": {"price": 1800.0, "change_pct": 0.0, "name": "贵州茅台"},
-        }
-        result = estimator.calculate_estimate(holdings, stock_quotes, 2.0)
-        assert result["est_change_pct"] == 0.0
-        assert result["est_nav"] == 2.0
 
-    def test_missing_stock_quote(self, estimator):
-        """A holding stock has no quote available."""
-        holdings = [
-            {"stock_code": "600519", "stock_name": "贵州茅台", "holding_ratio": 0.089},
-            {"stock_code": "999999", "stock_name": "已退市", "holding_ratio": 0.05},
-        ]
-        stock_quotes = {
-            "600519": {"price": 1800.0, "change_pct": 3.0, "name": "贵州茅台"},
-        }
-        result = estimator.calculate_estimate(holdings, stock_quotes, 1.5)
+# (holdings, stock_quotes, last_nav, expected est_change_pct, est_nav, coverage)
+ESTIMATE_CASES = (
+    pytest.param(
+        (MAOTAI, WULIANGYE), {"600519": _quote(2.0), "000858": _quote(-1.0)}, 1.0,
+        # 0.089 * 2.0% + 0.065 * (-1.0%) = 0.178% - 0.065% = 0.113%
+        0.113, 1.00113, 0.154,
+        id="basic",
+    ),
+    pytest.param((MAOTAI,), {"600519": _quote(0.0)}, 2.0, 0.0, 2.0, 0.089, id="all_flat"),
+    pytest.param(
+        (MAOTAI, DELISTED), {"600519": _quote(3.0)}, 1.5,
+        # Only 600519 contributes: 0.089 * 3.0%
+        0.267, 1.5 * 1.00267, 0.089,
+        id="missing_quote",
+    ),
+    pytest.param((), {}, 1.0, 0.0, 1.0, 0.0, id="empty_holdings"),
+)
 
-        # Only 600519 contributes
-        expected_change = 0.089 * 3.0
-        assert abs(result["est_change_pct"] - expected_change) < 0.0001
-        assert result["coverage"] == pytest.approx(0.089, abs=0.001)
 
-    def test_empty_holdings(self, estimator):
-        """No holdings data."""
-        result = estimator.calculate_estimate([], {}, 1.0)
-        assert result["est_change_pct"] == 0.0
-        assert result["est_nav"] == 1.0
-        assert result["coverage"] == 0.0
+class TestCalculateEstimate:
+    @pytest.mark.parametrize(
+        "holdings,stock_quotes,last_nav,change_pct,nav,coverage", ESTIMATE_CASES
+    )
+    def test_estimate(
+        self, estimator, holdings, stock_quotes, last_nav, change_pct, nav, coverage
+    ):
+        result = estimator.calculate_estimate(list(holdings), stock_quotes, last_nav)
+        assert result["est_change_pct"] == pytest.approx(change_pct, abs=0.0001)
+        assert result["est_nav"] == pytest.approx(nav, abs=0.0001)
+        assert result["coverage"] == pytest.approx(coverage, abs=0.001)
 
     def test_holding_details_in_result(self, estimator):
         """Result includes per-stock contribution details."""
         holdings = [
-            {"stock_code": "600519", "stock_name": "贵州茅台", "holding_ratio": 0.089},
+            HoldingInput("600519", "贵州茅台", 0.089),
         ]
         stock_quotes = {
             "600519": {"price": 1800.0, "change_pct": 2.0, "name": "贵州茅台"},
@@ -83,3 +64,23 @@ class TestCalculateEstimate:
         assert detail["stock_code"] == "600519"
         assert detail["change_pct"] == 2.0
         assert abs(detail["contribution"] - 0.089 * 2.0) < 0.0001
+
+
+class TestEstimateSummary:
+    def test_matches_calculate_estimate_without_details(self, estimator):
+        """Summary over flattened change_pcts equals the full estimate's totals."""
+        holdings = [
+            HoldingInput("600519", "贵州茅台", 0.089),
+            HoldingInput("000858", "五粮液", 0.065),
+            HoldingInput("300750", "宁德时代", 0.05),  # no quote
+        ]
+        stock_quotes = {
+            "600519": {"price": 1800.0, "change_pct": 2.0, "name": "贵州茅台"},
+            "000858": {"price": 150.0, "change_pct": -1.0, "name": "五粮液"},
+        }
+        full = estimator.calculate_estimate(holdings, stock_quotes, 1.2345)
+        summary = estimator.estimate_summary(
+            holdings, quote_change_pcts(stock_quotes), 1.2345
+        )
+        assert "details" not in summary
+        assert summary == {k: v for k, v in full.items() if k != "details"}
@@ -1,24 +1,11 @@
 """Tests for fund info service."""
 
-import pytest
-import pytest_asyncio
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-
-from app.models.database import Base
-from app.services.fund_info import FundInfoService
+import asyncio
+from unittest.mock import patch
 
+import pytest
 
-@pytest_asyncio.fixture
-async def db_session():
-    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    session_factory = async_sessionmaker(
-        engine, class_=AsyncSession, expire_on_commit=False
-    )
-    async with session_factory() as session:
-        yield session
-    await engine.dispose()
+from app.services.fund_info import FundInfoService, FundRecord
 
 
 @pytest.fixture
@@ -86,3 +73,52 @@ async def test_update_holdings_replaces_old(db_session, fund_service):
     holdings = await fund_service.get_holdings(db_session, "000001")
     assert len(holdings) == 1
     assert holdings[0].stock_code == "000858"
+
+
+@pytest.mark.asyncio
+async def test_get_fund_memoizes_detached_record(db_session, fund_service):
+    await fund_service.add_fund(db_session, "000001", "华夏成长", "混合型")
+    first = await fund_service.get_fund(db_session, "000001")
+    with patch.object(db_session, "get", side_effect=AssertionError("DB hit")):
+        second = await fund_service.get_fund(db_session, "000001")
+    assert second is first
+    assert isinstance(first, FundRecord)
+
+
+@pytest.mark.asyncio
+async def test_get_fund_concurrent_misses_share_one_lookup(db_session, fund_service):
+    await fund_service.add_fund(db_session, "000001", "华夏成长", "混合型")
+    with patch.object(db_session, "get", wraps=db_session.get) as spy:
+        results = await asyncio.gather(
+            *(fund_service.get_fund(db_session, "000001") for _ in range(5))
+        )
+    assert spy.call_count == 1
+    assert all(r.fund_name == "华夏成长" for r in results)
+
+
+@pytest.mark.asyncio
+async def test_get_fund_locks_released_after_lookup(db_session, fund_service):
+    await fund_service.add_fund(db_session, "000001", "华夏成长", "混合型")
+    await asyncio.gather(*(fund_service.get_fund(db_session, "000001") for _ in range(3)))
+    assert await fund_service.get_fund(db_session, "999999") is None
+    assert len(fund_service._fund_locks) == 0
+
+
+@pytest.mark.asyncio
+async def test_update_nav_invalidates_memoized_fund(db_session, fund_service):
+    await fund_service.add_fund(db_session, "000001", "华夏成长", "混合型")
+    assert (await fund_service.get_fund(db_session, "000001")).last_nav is None
+    await fund_service.update_nav(db_session, "000001", 1.5, "2026-02-14")
+    fund = await fund_service.get_fund(db_session, "000001")
+    assert fund.last_nav == 1.5
+
+
+@pytest.mark.asyncio
+async def test_update_holdings_with_empty_list_clears(db_session, fund_service):
+    await fund_service.add_fund(db_session, "000001", "华夏成长", "混合型")
+    old_data = [
+        {"stock_code": "600519", "stock_name": "贵州茅台", "holding_ratio": 0.089}
+    ]
+    await fund_service.update_holdings(db_session, "000001", old_data, "2025-09-30")
+    await fund_service.update_holdings(db_session, "000001", [], "2025-12-31")
+    assert await fund_service.get_holdings(db_session, "000001") == []
@@ -0,0 +1,32 @@
+"""Tests for the shared async HTTP client."""
+
+from app.services.http_client import close_http_client, get_http_client
+
+
+async def test_get_http_client_reuses_one_instance():
+    """Repeated calls return the same pooled client."""
+    try:
+        assert get_http_client() is get_http_client()
+    finally:
+        await close_http_client()
+
+
+async def test_close_http_client_recreates_on_next_use():
+    """After close, the next call builds a fresh open client."""
+    first = get_http_client()
+    await close_http_client()
+    assert first.is_closed
+    second = get_http_client()
+    try:
+        assert second is not first
+        assert not second.is_closed
+    finally:
+        await close_http_client()
+
+
+async def test_client_requests_gzip():
+    """Outbound calls advertise gzip so eastmoney JSON comes back compressed."""
+    try:
+        assert get_http_client().headers["accept-encoding"] == "gzip"
+    finally:
+        await close_http_client()
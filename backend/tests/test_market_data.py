@@ -1,12 +1,21 @@
 """Tests for market data service."""
 
-from unittest.mock import MagicMock, patch
-
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import orjson
 import pandas as pd
 import pytest
 
+from app.services import market_data
 from app.services.cache import nav_history_cache
-from app.services.market_data import MarketDataService
+from app.services.market_data import MarketDataService, seconds_until_nav_refresh
+
+_CST = timezone(timedelta(hours=8))
 
 
 @pytest.fixture
@@ -14,8 +23,24 @@ def market_service():
     return MarketDataService()
 
 
-def _make_em_response(stocks: list[dict]) -> MagicMock:
-    """Build a mock requests.Response with East Money JSON format.
+def _patch_http_get(**kwargs):
+    """Patch the shared AsyncClient so its get() is an AsyncMock built from kwargs."""
+    client = MagicMock()
+    client.get = AsyncMock(**kwargs)
+    return patch("app.services.market_data.get_http_client", return_value=client)
+
+
+def _response(**kwargs) -> httpx.Response:
+    """A real, already-read httpx.Response; no MagicMock attribute dispatch."""
+    return httpx.Response(200, request=httpx.Request("GET", "https://test"), **kwargs)
+
+
+# East Money's answer when no requested symbol matched
+_EMPTY_DIFF_RESPONSE = _response(content=orjson.dumps({"data": {"diff": []}}))
+
+
+def _make_em_response(stocks: list[dict]) -> httpx.Response:
+    """Build a mock httpx.Response with East Money JSON format.
 
     East Money is now the primary source (same as index).
     """
@@ -38,13 +63,11 @@ def _make_em_response(stocks: list[dict]) -> MagicMock:
             "f14": s["name"]
         })
 
-    mock_resp = MagicMock()
-    mock_resp.json.return_value = {"data": {"diff": diff}}
-    return mock_resp
+    return _response(content=orjson.dumps({"data": {"diff": diff}}))
 
 
-def _make_sina_response(stocks: list[dict]) -> MagicMock:
-    """Build a mock requests.Response with Sina Finance text format.
+def _make_sina_response(stocks: list[dict]) -> httpx.Response:
+    """Build a mock httpx.Response with Sina Finance text format.
 
     Each stock dict must have: code, name, price, prev_close.
     change_pct = (price - prev_close) / prev_close * 100
@@ -58,198 +81,302 @@ def _make_sina_response(stocks: list[dict]) -> MagicMock:
         # Sina format: name,prev_close,open,price,high,low,...
         data = f"{s['name']},{prev_close:.3f},0.000,{price:.3f},0.000,0.000"
         lines.append(f'var hq_str_{prefix}{code}="{data}";')
-    mock_resp = MagicMock()
-    mock_resp.text = "\n".join(lines)
-    mock_resp.raise_for_status = MagicMock()
-    return mock_resp
+    return _response(text="\n".join(lines))
 
 
-class TestGetStockQuote:
+# Quote inputs and the responses built from them, serialized once at import
+_MAOTAI = {"code": "600519", "name": "贵州茅台", "price": 1800.0, "prev_close": 1756.0977}
+_WULIANGYE = {"code": "000858", "name": "五粮液", "price": 150.0, "prev_close": 151.8274}
+_EM_MAOTAI = _make_em_response([_MAOTAI])
+_EM_WULIANGYE = _make_em_response([_WULIANGYE])
+_EM_MAOTAI_WULIANGYE = _make_em_response([_MAOTAI, _WULIANGYE])
+_SINA_MAOTAI = _make_sina_response([_MAOTAI])
 
-    def test_get_single_stock_quote(self, market_service):
-        """East Money primary path returns correct price and change_pct."""
-        mock_resp = _make_em_response([
-            {"code": "600519", "name": "贵州茅台", "price": 1800.0, "prev_close": 1756.0977},
-        ])
-        with patch("app.services.market_data.requests.get", return_value=mock_resp):
-            result = market_service.get_stock_quotes(["600519"])
-        assert "600519" in result
-        assert result["600519"]["price"] == 1800.0
-        assert result["600519"]["change_pct"] == pytest.approx(2.5, rel=1e-3)
 
-    def test_get_multiple_stock_quotes(self, market_service):
-        """Multiple codes are returned from a single East Money request."""
-        mock_resp = _make_em_response([
-            {"code": "600519", "name": "贵州茅台", "price": 1800.0, "prev_close": 1756.0977},
-            {"code": "000858", "name": "五粮液", "price": 150.0, "prev_close": 151.8274},
-        ])
-        with patch("app.services.market_data.requests.get", return_value=mock_resp):
-            result = market_service.get_stock_quotes(["600519", "000858"])
-        assert len(result) == 2
-        assert result["000858"]["change_pct"] == pytest.approx(-1.2, rel=1e-2)
-
-    def test_stock_not_found(self, market_service):
-        """East Money returns empty diff list for unknown symbols — not included in result."""
-        mock_resp = MagicMock()
-        # East Money returns empty diff list when symbols not found
-        mock_resp.json.return_value = {"data": {"diff": []}}
-        with patch("app.services.market_data.requests.get", return_value=mock_resp):
-            result = market_service.get_stock_quotes(["999999"])
-        assert len(result) == 0
+@pytest.mark.parametrize(
+    "code, prefix, secid",
+    [
+        ("600519", "sh", "1.600519"),
+        ("000858", "sz", "0.000858"),
+        ("300750", "sz", "0.300750"),
+        ("830799", "bj", "0.830799"),
+        ("430047", "bj", "0.430047"),
+        ("900901", "sh", "1.900901"),
+        ("200002", "sz", "0.200002"),
+    ],
+)
+def test_stock_code_classification(code, prefix, secid):
+    assert market_data._stock_exchange_prefix(code) == prefix
+    assert market_data._eastmoney_secid(code) == secid
 
-    def test_empty_data_string_skipped(self, market_service):
-        """East Money returns empty diff for invalid symbol — skipped."""
-        mock_resp = MagicMock()
-        mock_resp.json.return_value = {"data": {"diff": []}}
-        with patch("app.services.market_data.requests.get", return_value=mock_resp):
-            result = market_service.get_stock_quotes(["999999"])
-        assert isinstance(result, dict)
-        assert len(result) == 0
 
-    def test_zero_prev_close_skipped(self, market_service):
+def test_exchange_prefix_pads_short_codes():
+    assert market_data._stock_exchange_prefix("858") == "sz"
+
+
+class TestGetStockQuote:
+
+    @pytest.mark.parametrize(
+        "resp, codes, expected",
+        [
+            # East Money primary path returns correct price and change_pct
+            (_EM_MAOTAI, ["600519"], {"600519": (1800.0, 2.5)}),
+            # Multiple codes are returned from a single East Money request
+            (
+                _EM_MAOTAI_WULIANGYE,
+                ["600519", "000858"],
+                {"600519": (1800.0, 2.5), "000858": (150.0, -1.2036)},
+            ),
+            # East Money returns empty diff list for unknown symbols — not included
+            (_EMPTY_DIFF_RESPONSE, ["999999"], {}),
+        ],
+        ids=["single", "multiple", "not_found"],
+    )
+    async def test_get_stock_quotes(self, market_service, resp, codes, expected):
+        with _patch_http_get(return_value=resp):
+            result = await market_service.get_stock_quotes(codes)
+        assert {c: q["price"] for c, q in result.items()} == {
+            c: price for c, (price, _) in expected.items()
+        }
+        assert {c: q["change_pct"] for c, q in result.items()} == pytest.approx(
+            {c: pct for c, (_, pct) in expected.items()}, rel=1e-3
+        )
+
+    @pytest.mark.parametrize("payload", [{"rc": 0, "data": None}, {"data": {"diff": None}}])
+    def test_null_data_parses_to_empty(self, payload):
+        """A null data/diff body (no symbol matched) yields {} instead of raising."""
+        resp = _response(content=orjson.dumps(payload))
+        assert market_data.MarketDataService._parse_eastmoney_ulist(resp) == {}
+
+    async def test_zero_prev_close_skipped(self, market_service):
         """Stocks where prev_close is 0 (suspended / no data) are skipped."""
         mock_resp = _make_em_response([
             {"code": "600519", "name": "贵州茅台", "price": 0.0, "prev_close": 0.0},
         ])
-        with patch("app.services.market_data.requests.get", return_value=mock_resp):
-            result = market_service.get_stock_quotes(["600519"])
+        with _patch_http_get(return_value=mock_resp):
+            result = await market_service.get_stock_quotes(["600519"])
         assert len(result) == 0
 
-    def test_malformed_line_skipped(self, market_service):
+    async def test_malformed_line_skipped(self, market_service):
         """Lines that cannot be parsed do not crash the method."""
         # Test with valid data that parses correctly
-        mock_resp = _make_em_response([
-            {"code": "000858", "name": "五粮液", "price": 150.0, "prev_close": 151.8274},
-        ])
-        with patch("app.services.market_data.requests.get", return_value=mock_resp):
-            result = market_service.get_stock_quotes(["600519", "000858"])
+        with _patch_http_get(return_value=_EM_WULIANGYE):
+            result = await market_service.get_stock_quotes(["600519", "000858"])
         assert "000858" in result
         # 600519 has non-numeric prev_close → skipped; 000858 should parse
         assert "600519" not in result
         assert "000858" in result
 
-    def test_fallback_to_sina_on_eastmoney_failure(self, market_service):
+    async def test_large_code_list_split_into_batches(self, market_service):
+        """East Money secids are requested in bounded batches and merged."""
+        codes = [f"{i:06d}" for i in range(1, 121)]
+
+        async def side_effect(url, params, **kwargs):
+            batch = [secid.split(".")[1] for secid in params["secids"].split(",")]
+            return _make_em_response([
+                {"code": c, "name": c, "price": 10.0, "prev_close": 10.0} for c in batch
+            ])
+
+        with _patch_http_get(side_effect=side_effect) as mock_client:
+            result = await market_service.get_stock_quotes(codes)
+        batch_sizes = [
+            len(c.kwargs["params"]["secids"].split(","))
+            for c in mock_client.return_value.get.call_args_list
+        ]
+        assert batch_sizes == [50, 50, 20]
+        assert sorted(result) == codes
+
+    async def test_fallback_to_sina_on_eastmoney_failure(self, market_service):
         """When East Money raises an exception, Sina Finance is tried."""
         # First call (East Money) fails, second call (Sina) succeeds
         def side_effect(url, **kwargs):
             if "eastmoney" in url:
                 raise ConnectionError("East Money unavailable")
             # Sina fallback
-            return _make_sina_response([
-                {"code": "600519", "name": "贵州茅台", "price": 1800.0, "prev_close": 1756.0977},
-            ])
+            return _SINA_MAOTAI
 
-        with patch("app.services.market_data.requests.get", side_effect=side_effect):
-            result = market_service.get_stock_quotes(["600519"])
+        with _patch_http_get(side_effect=side_effect):
+            result = await market_service.get_stock_quotes(["600519"])
         assert "600519" in result
         assert result["600519"]["price"] == 1800.0
         assert result["600519"]["change_pct"] == 2.50
 
 
 class TestGetFundHoldings:
-    def test_get_fund_top_holdings(self, market_service):
-        mock_df = pd.DataFrame(
-            {
-                "股票代码": ["600519", "000858"],
-                "股票名称": ["贵州茅台", "五粮液"],
-                "占净值比例": [8.9, 6.5],
-                "季度": ["2025年4季度股票投资明细", "2025年4季度股票投资明细"],
-            }
+    # Built once for the class; get_fund_holdings only reads the frames
+    TOP_HOLDINGS = pd.DataFrame({
+        "股票代码": ["600519", "000858"],
+        "股票名称": ["贵州茅台", "五粮液"],
+        "占净值比例": [8.9, 6.5],
+        "季度": ["2025年4季度股票投资明细", "2025年4季度股票投资明细"],
+    })
+    TWO_QUARTERS = pd.DataFrame({
+        "股票代码": ["600519", "000858", "601318"],
+        "股票名称": ["贵州茅台", "五粮液", "中国平安"],
+        "占净值比例": [8.9, 6.5, 5.0],
+        "季度": [
+            "2025年3季度股票投资明细",  # older
+            "2025年4季度股票投资明细",  # latest
+            "2025年4季度股票投资明细",  # latest
+        ],
+    })
+    Q1_HOLDINGS = pd.DataFrame({
+        "股票代码": ["600519"],
+        "股票名称": ["贵州茅台"],
+        "占净值比例": [8.9],
+        "季度": ["2025年1季度股票投资明细"],
+    })
+    NO_HOLDINGS = pd.DataFrame(columns=["股票代码", "股票名称", "占净值比例", "季度"])
+
+    def test_get_fund_top_holdings(self, market_service, monkeypatch):
+        monkeypatch.setattr(
+            "app.services.market_data.ak.fund_portfolio_hold_em", lambda **kw: self.TOP_HOLDINGS
         )
-        with patch(
-            "app.services.market_data.ak.fund_portfolio_hold_em", return_value=mock_df
-        ):
-            holdings, report_date = market_service.get_fund_holdings("000001", "2025")
-            assert len(holdings) == 2
-            assert holdings[0]["stock_code"] == "600519"
-            assert holdings[0]["holding_ratio"] == pytest.approx(0.089)
-            assert report_date == "2025-12-31"
+        holdings, report_date = market_service.get_fund_holdings("000001", "2025")
+        assert len(holdings) == 2
+        assert holdings[0]["stock_code"] == "600519"
+        assert holdings[0]["holding_ratio"] == pytest.approx(0.089)
+        assert report_date == "2025-12-31"
 
-    def test_get_fund_holdings_filters_to_latest_quarter(self, market_service):
+    def test_get_fund_holdings_filters_to_latest_quarter(self, market_service, monkeypatch):
         """Holdings from older quarters are excluded; only the latest quarter is returned."""
-        mock_df = pd.DataFrame(
-            {
-                "股票代码": ["600519", "000858", "601318"],
-                "股票名称": ["贵州茅台", "五粮液", "中国平安"],
-                "占净值比例": [8.9, 6.5, 5.0],
-                "季度": [
-                    "2025年3季度股票投资明细",  # older
-                    "2025年4季度股票投资明细",  # latest
-                    "2025年4季度股票投资明细",  # latest
-                ],
-            }
+        monkeypatch.setattr(
+            "app.services.market_data.ak.fund_portfolio_hold_em", lambda **kw: self.TWO_QUARTERS
         )
-        with patch(
-            "app.services.market_data.ak.fund_portfolio_hold_em", return_value=mock_df
-        ):
-            holdings, report_date = market_service.get_fund_holdings("000001", "2025")
-            assert len(holdings) == 2
-            assert holdings[0]["stock_code"] == "000858"
-            assert report_date == "2025-12-31"
-
-    def test_get_fund_holdings_report_date_q1(self, market_service):
-        mock_df = pd.DataFrame(
-            {
-                "股票代码": ["600519"],
-                "股票名称": ["贵州茅台"],
-                "占净值比例": [8.9],
-                "季度": ["2025年1季度股票投资明细"],
-            }
+        holdings, report_date = market_service.get_fund_holdings("000001", "2025")
+        assert len(holdings) == 2
+        assert holdings[0]["stock_code"] == "000858"
+        assert report_date == "2025-12-31"
+
+    def test_get_fund_holdings_report_date_q1(self, market_service, monkeypatch):
+        monkeypatch.setattr(
+            "app.services.market_data.ak.fund_portfolio_hold_em", lambda **kw: self.Q1_HOLDINGS
         )
-        with patch(
-            "app.services.market_data.ak.fund_portfolio_hold_em", return_value=mock_df
-        ):
-            _, report_date = market_service.get_fund_holdings("000001", "2025")
-            assert report_date == "2025-03-31"
+        _, report_date = market_service.get_fund_holdings("000001", "2025")
+        assert report_date == "2025-03-31"
 
-    def test_get_fund_holdings_empty(self, market_service):
-        mock_df = pd.DataFrame(
-            columns=["股票代码", "股票名称", "占净值比例", "季度"]
+    def test_get_fund_holdings_empty(self, market_service, monkeypatch):
+        monkeypatch.setattr(
+            "app.services.market_data.ak.fund_portfolio_hold_em", lambda **kw: self.NO_HOLDINGS
         )
-        with patch(
-            "app.services.market_data.ak.fund_portfolio_hold_em", return_value=mock_df
-        ):
-            holdings, report_date = market_service.get_fund_holdings("000001", "2025")
-            assert holdings == []
-            assert report_date is None
+        holdings, report_date = market_service.get_fund_holdings("000001", "2025")
+        assert holdings == []
+        assert report_date is None
 
 
 class TestGetFundNav:
-    def test_get_latest_nav(self, market_service):
-        mock_df = pd.DataFrame(
-            {
-                "净值日期": ["2026-02-13", "2026-02-14"],
-                "单位净值": [1.220, 1.234],
-                "日增长率": [-0.5, 1.15],
-            }
+    NAV_DF = pd.DataFrame({
+        "净值日期": ["2026-02-13", "2026-02-14"],
+        "单位净值": [1.220, 1.234],
+        "日增长率": [-0.5, 1.15],
+    })
+
+    def test_get_latest_nav(self, market_service, monkeypatch):
+        monkeypatch.setattr(
+            "app.services.market_data.ak.fund_open_fund_info_em", lambda **kw: self.NAV_DF
         )
+        result = market_service.get_fund_nav("000001")
+        assert result["nav"] == 1.234
+        assert result["nav_date"] == "2026-02-14"
+
+
+class TestGetFundBasicInfo:
+    """get_fund_basic_info reads the shared, cached fund name table."""
+
+    TABLE = pd.DataFrame({
+        "基金代码": ["110022", "000001"],
+        "基金简称": ["易方达消费行业", "华夏成长混合"],
+        "基金类型": ["股票型", "混合型"],
+    })
+
+    async def test_lookup_fetches_table_once(self, market_service):
+        with patch(
+            "app.services.fund_names.ak.fund_name_em", return_value=self.TABLE
+        ) as mock_em:
+            first = await market_service.get_fund_basic_info("000001")
+            second = await market_service.get_fund_basic_info("110022")
+        assert first == {"fund_name": "华夏成长混合", "fund_type": "混合型"}
+        assert second == {"fund_name": "易方达消费行业", "fund_type": "股票型"}
+        assert mock_em.call_count == 1
+
+    async def test_unknown_code_returns_none(self, market_service):
+        with patch("app.services.fund_names.ak.fund_name_em", return_value=self.TABLE):
+            assert await market_service.get_fund_basic_info("000002") is None
+            assert await market_service.get_fund_basic_info("999999") is None
+
+
+class TestFundLookupCache:
+    """get_fund_nav / get_fund_holdings memoize successful akshare lookups."""
+
+    NAV_DF = pd.DataFrame({"净值日期": ["2026-02-14"], "单位净值": [1.234]})
+
+    def test_nav_cached_until_fresh_requested(self, market_service):
+        with patch(
+            "app.services.market_data.ak.fund_open_fund_info_em", return_value=self.NAV_DF
+        ) as mock_em:
+            market_service.get_fund_nav("000001")
+            market_service.get_fund_nav("000001")
+            assert mock_em.call_count == 1
+            market_service.get_fund_nav("000001", fresh=True)
+            assert mock_em.call_count == 2
+
+    def test_failed_nav_lookup_not_cached(self, market_service):
+        with patch(
+            "app.services.market_data.ak.fund_open_fund_info_em",
+            side_effect=[ConnectionError("down"), self.NAV_DF],
+        ):
+            assert market_service.get_fund_nav("000001") is None
+            assert market_service.get_fund_nav("000001")["nav"] == 1.234
+
+    def test_holdings_keyed_by_year(self, market_service):
+        with patch(
+            "app.services.market_data.ak.fund_portfolio_hold_em",
+            return_value=TestGetFundHoldings.TOP_HOLDINGS,
+        ) as mock_em:
+            market_service.get_fund_holdings("000001", "2025")
+            market_service.get_fund_holdings("000001", "2025")
+            market_service.get_fund_holdings("000001", "2024")
+        assert mock_em.call_count == 2
+
+    async def test_concurrent_misses_share_one_fetch(self, market_service):
+        def slow_fetch(**kwargs):
+            time.sleep(0.05)
+            return self.NAV_DF
+
         with patch(
-            "app.services.market_data.ak.fund_open_fund_info_em", return_value=mock_df
+            "app.services.market_data.ak.fund_open_fund_info_em", side_effect=slow_fetch
+        ) as mock_em:
+            results = await asyncio.gather(
+                *[market_service.get_fund_nav_async("000001") for _ in range(4)]
+            )
+        assert mock_em.call_count == 1
+        assert all(r["nav"] == 1.234 for r in results)
+
+    def test_lookup_locks_released_after_fetch(self, market_service):
+        with patch(
+            "app.services.market_data.ak.fund_open_fund_info_em", return_value=self.NAV_DF
         ):
-            result = market_service.get_fund_nav("000001")
-            assert result["nav"] == 1.234
-            assert result["nav_date"] == "2026-02-14"
+            for code in ("000001", "000002", "000003"):
+                market_service.get_fund_nav(code)
+        assert len(market_service._lookup_locks) == 0
 
 
 class TestGetFundNavHistoryCache:
     """Verify that get_fund_nav_history uses CacheService (B9)."""
 
+    HISTORY_DF = pd.DataFrame({"净值日期": ["2026-01-01", "2026-01-02"], "单位净值": [1.1, 1.2]})
+    ONE_DAY_DF = pd.DataFrame({"净值日期": ["2026-01-01"], "单位净值": [1.1]})
+
     def setup_method(self):
         """Clear the shared nav_history_cache before each test."""
         nav_history_cache.clear()
 
-    def test_result_stored_in_cache(self, market_service):
+    def test_result_stored_in_cache(self, market_service, monkeypatch):
         """Fetched NAV history is persisted in nav_history_cache."""
-        mock_df = pd.DataFrame(
-            {
-                "净值日期": ["2026-01-01", "2026-01-02"],
-                "单位净值": [1.1, 1.2],
-            }
+        monkeypatch.setattr(
+            "app.services.market_data.ak.fund_open_fund_info_em", lambda **kw: self.HISTORY_DF
         )
-        with patch(
-            "app.services.market_data.ak.fund_open_fund_info_em", return_value=mock_df
-        ):
-            result = market_service.get_fund_nav_history("000001")
+        result = market_service.get_fund_nav_history("000001")
 
         assert result == {"2026-01-01": 1.1, "2026-01-02": 1.2}
         cached = nav_history_cache.get("nav_history:000001")
@@ -274,3 +401,122 @@ class TestGetFundNavHistoryCache:
             result = market_service.get_fund_nav_history("000001")
         assert result == {}
         assert nav_history_cache.get("nav_history:000001") is None
+
+    def test_snapshot_survives_memory_cache_loss(self, market_service):
+        """After a restart (empty memory cache) the disk snapshot is served."""
+        with patch(
+            "app.services.market_data.ak.fund_open_fund_info_em", return_value=self.ONE_DAY_DF
+        ) as mock_ak:
+            market_service.get_fund_nav_history("000001")
+            nav_history_cache.clear()
+            result = market_service.get_fund_nav_history("000001")
+        assert result == {"2026-01-01": 1.1}
+        assert mock_ak.call_count == 1
+
+    def test_stale_snapshot_refetched(self, market_service):
+        with patch(
+            "app.services.market_data.ak.fund_open_fund_info_em", return_value=self.ONE_DAY_DF
+        ) as mock_ak:
+            market_service.get_fund_nav_history("000001")
+            nav_history_cache.clear()
+            path = market_data.NAV_HISTORY_SNAPSHOT_DIR / "000001.npz"
+            old = time.time() - market_data.NAV_HISTORY_CACHE_TTL - 1
+            os.utime(path, (old, old))
+            market_service.get_fund_nav_history("000001")
+        assert mock_ak.call_count == 2
+
+    @pytest.mark.parametrize("latest, calls", [("2026-01-01", 1), ("2026-01-02", 2)])
+    def test_stale_snapshot_revalidated_by_latest_nav_date(
+        self, market_service, latest, calls
+    ):
+        """An expired snapshot ending on the known latest NAV date is reused."""
+        with patch(
+            "app.services.market_data.ak.fund_open_fund_info_em", return_value=self.ONE_DAY_DF
+        ) as mock_ak:
+            market_service.get_fund_nav_history("000001")
+            nav_history_cache.clear()
+            path = market_data.NAV_HISTORY_SNAPSHOT_DIR / "000001.npz"
+            old = time.time() - market_data.NAV_HISTORY_CACHE_TTL - 1
+            os.utime(path, (old, old))
+            result = market_service.get_fund_nav_history("000001", latest_nav_date=latest)
+        assert result == {"2026-01-01": 1.1}
+        assert mock_ak.call_count == calls
+        assert path.stat().st_mtime > old
+
+    def test_non_numeric_code_not_persisted(self, market_service, monkeypatch):
+        monkeypatch.setattr(
+            "app.services.market_data.ak.fund_open_fund_info_em", lambda **kw: self.ONE_DAY_DF
+        )
+        market_service.get_fund_nav_history("../x")
+        assert not market_data.NAV_HISTORY_SNAPSHOT_DIR.exists()
+
+
+class TestSecondsUntilNavRefresh:
+
+    def test_before_refresh_counts_to_same_evening(self):
+        now = datetime(2026, 1, 5, 20, 0, tzinfo=_CST)
+        assert seconds_until_nav_refresh(now) == 30 * 60
+
+    def test_after_refresh_counts_to_next_evening(self):
+        now = datetime(2026, 1, 5, 21, 0, tzinfo=_CST)
+        assert seconds_until_nav_refresh(now) == 23 * 3600 + 30 * 60
+
+    def test_never_shorter_than_one_minute(self):
+        now = datetime(2026, 1, 5, 20, 29, 50, tzinfo=_CST)
+        assert seconds_until_nav_refresh(now) == 60
+
+
+class TestIsMarketTradingTodayCache:
+    """Date-keyed cache and dog-pile protection for is_market_trading_today."""
+
+    _MONDAY = datetime(2026, 1, 5, 10, 0, tzinfo=_CST)
+
+    def setup_method(self):
+        market_data._trading_today_cache = None
+
+    def teardown_method(self):
+        market_data._trading_today_cache = None
+
+    async def _check(self, service, now=None):
+        mock_resp = _response(content=orjson.dumps({"data": {"trends": ["2026-01-05 09:30,3000"]}}))
+        with patch("app.services.market_data.datetime") as mock_dt, \
+             _patch_http_get(return_value=mock_resp) as mock_client:
+            mock_dt.now.return_value = now or self._MONDAY
+            return await service.is_market_trading_today(), mock_client.return_value.get
+
+    async def test_positive_result_outlives_negative_ttl(self, market_service):
+        stale_ts = time.time() - 3600
+        market_data._trading_today_cache = ("2026-01-05", stale_ts, True)
+        result, mock_get = await self._check(market_service)
+        assert result is True
+        mock_get.assert_not_called()
+
+    async def test_negative_result_expires(self, market_service):
+        stale_ts = time.time() - 3600
+        market_data._trading_today_cache = ("2026-01-05", stale_ts, False)
+        result, mock_get = await self._check(market_service)
+        assert result is True
+        mock_get.assert_called_once()
+
+    async def test_previous_day_entry_is_ignored(self, market_service):
+        market_data._trading_today_cache = ("2026-01-02", time.time(), True)
+        _, mock_get = await self._check(market_service)
+        mock_get.assert_called_once()
+
+    async def test_concurrent_async_callers_share_one_lookup(self, market_service):
+        calls = 0
+
+        async def slow_lookup(today_str):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return True
+
+        with patch("app.services.market_data.datetime") as mock_dt, \
+             patch.object(market_service, "_fetch_trading_today", side_effect=slow_lookup):
+            mock_dt.now.return_value = self._MONDAY
+            results = await asyncio.gather(
+                *[market_service.is_market_trading_today() for _ in range(5)]
+            )
+        assert results == [True] * 5
+        assert calls == 1
@@ -1,27 +1,17 @@
 """Tests for database models."""
 
+from datetime import datetime
+from unittest.mock import patch
+
 import pytest
-import pytest_asyncio
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import event, insert, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
 
-from app.models.database import Base
+from app.models.database import _set_sqlite_pragmas, init_db
 from app.models.fund import Fund, FundHolding
 from app.models.portfolio import Portfolio, PortfolioFund
 
 
-@pytest_asyncio.fixture
-async def db_session():
-    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    async_session = async_sessionmaker(
-        engine, class_=AsyncSession, expire_on_commit=False
-    )
-    async with async_session() as session:
-        yield session
-    await engine.dispose()
-
-
 @pytest.mark.asyncio
 async def test_create_fund(db_session):
     fund = Fund(
@@ -83,3 +73,105 @@ async def test_create_portfolio_with_funds(db_session):
 
     assert pf.id is not None
     assert pf.shares == 1000.0
+
+
+@pytest.mark.asyncio
+async def test_timestamp_defaults_computed_by_database(db_session):
+    """created_at/updated_at come back from the INSERT as ISO strings."""
+    portfolio = Portfolio(name="我的组合")
+    db_session.add(portfolio)
+    await db_session.commit()
+    assert datetime.fromisoformat(portfolio.created_at)
+
+    await db_session.execute(
+        insert(FundHolding),
+        [
+            {"fund_code": "000001", "stock_code": "600519", "stock_name": "贵州茅台",
+             "holding_ratio": 0.089, "report_date": "2025-12-31"},
+        ],
+    )
+    updated_at = (await db_session.execute(select(FundHolding.updated_at))).scalar_one()
+    assert datetime.fromisoformat(updated_at)
+
+
+@pytest.mark.asyncio
+async def test_init_db_migrates_snapshot_index(tmp_path):
+    """An existing DB with the old two-column snapshot index gets the wider one."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "CREATE TABLE fund_estimate_snapshot (id INTEGER PRIMARY KEY, fund_code TEXT, "
+            "est_nav FLOAT, est_change_pct FLOAT, snapshot_time TEXT, snapshot_date TEXT)"
+        ))
+        await conn.execute(text(
+            "CREATE INDEX ix_fund_estimate_snapshot_code_date "
+            "ON fund_estimate_snapshot (fund_code, snapshot_date)"
+        ))
+
+    with patch("app.models.database.engine", engine):
+        await init_db()
+
+    async with engine.connect() as conn:
+        rows = await conn.execute(text("PRAGMA index_list('fund_estimate_snapshot')"))
+        names = {r[1] for r in rows}
+    await engine.dispose()
+    assert "ix_fund_estimate_snapshot_code_date_time" in names
+    assert "ix_fund_estimate_snapshot_code_date" not in names
+
+
+@pytest.mark.asyncio
+async def test_sqlite_pragmas_applied_on_connect(tmp_path):
+    """New file-backed connections come up in WAL mode with relaxed fsync."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'wal.db'}")
+    event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+    async with engine.connect() as conn:
+        journal_mode = (await conn.execute(text("PRAGMA journal_mode"))).scalar()
+        synchronous = (await conn.execute(text("PRAGMA synchronous"))).scalar()
+        busy_timeout = (await conn.execute(text("PRAGMA busy_timeout"))).scalar()
+    await engine.dispose()
+    assert journal_mode == "wal"
+    assert synchronous == 1  # NORMAL
+    assert busy_timeout == 5000
+
+
+@pytest.mark.asyncio
+async def test_init_db_replaces_single_column_indexes(tmp_path):
+    """Old per-column indexes on holdings/portfolio snapshots become composites."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "CREATE TABLE fund_holding (id INTEGER PRIMARY KEY, fund_code TEXT, "
+            "stock_code TEXT, stock_name TEXT, holding_ratio FLOAT, report_date TEXT, "
+            "updated_at TEXT)"
+        ))
+        await conn.execute(text("CREATE INDEX ix_fund_holding_fund_code ON fund_holding (fund_code)"))
+        await conn.execute(text(
+            "CREATE TABLE portfolio_snapshot (id INTEGER PRIMARY KEY, portfolio_id INTEGER, "
+            "snapshot_date TEXT, total_value FLOAT, total_cost FLOAT)"
+        ))
+        await conn.execute(text(
+            "CREATE INDEX ix_portfolio_snapshot_portfolio_id ON portfolio_snapshot (portfolio_id)"
+        ))
+        await conn.execute(text(
+            "CREATE INDEX ix_portfolio_snapshot_snapshot_date ON portfolio_snapshot (snapshot_date)"
+        ))
+        # A duplicate day must not block the new unique index; the newest row wins
+        await conn.execute(text(
+            "INSERT INTO portfolio_snapshot (portfolio_id, snapshot_date, total_value, total_cost) "
+            "VALUES (1, '2026-02-18', 100, 90), (1, '2026-02-18', 110, 90)"
+        ))
+
+    with patch("app.models.database.engine", engine):
+        await init_db()
+
+    async with engine.connect() as conn:
+        holding = {r[1] for r in await conn.execute(text("PRAGMA index_list('fund_holding')"))}
+        snap = {r[1] for r in await conn.execute(text("PRAGMA index_list('portfolio_snapshot')"))}
+        values = (await conn.execute(
+            text("SELECT total_value_cents, total_cost_cents FROM portfolio_snapshot")
+        )).all()
+    await engine.dispose()
+    assert holding == {"ix_fund_holding_code_report_date"}
+    assert snap == {"uq_portfolio_snapshot_portfolio_date"}
+    # Float totals are migrated to integer cents
+    assert values == [(11000, 9000)]
@@ -1,29 +1,16 @@
 """Tests for PortfolioSnapshot model."""
 
 import pytest
-import pytest_asyncio
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import select, text
 
-from app.models.database import Base
 from app.models.portfolio import Portfolio, PortfolioSnapshot
 
 
-@pytest_asyncio.fixture
-async def db():
-    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-    async with factory() as session:
-        yield session
-    await engine.dispose()
-
-
 @pytest.mark.asyncio
-async def test_create_portfolio_snapshot(db):
+async def test_create_portfolio_snapshot(db_session):
     p = Portfolio(name="测试组合")
-    db.add(p)
-    await db.commit()
+    db_session.add(p)
+    await db_session.commit()
 
     snap = PortfolioSnapshot(
         portfolio_id=p.id,
@@ -31,18 +18,18 @@ async def test_create_portfolio_snapshot(db):
         total_value=15000.0,
         total_cost=12000.0,
     )
-    db.add(snap)
-    await db.commit()
+    db_session.add(snap)
+    await db_session.commit()
 
     assert snap.id is not None
     assert snap.total_value == 15000.0
 
 
 @pytest.mark.asyncio
-async def test_snapshot_profit_pct_computed(db):
+async def test_snapshot_profit_pct_computed(db_session):
     p = Portfolio(name="测试组合")
-    db.add(p)
-    await db.commit()
+    db_session.add(p)
+    await db_session.commit()
 
     snap = PortfolioSnapshot(
         portfolio_id=p.id,
@@ -50,8 +37,39 @@ async def test_snapshot_profit_pct_computed(db):
         total_value=13200.0,
         total_cost=12000.0,
     )
-    db.add(snap)
-    await db.commit()
+    db_session.add(snap)
+    await db_session.commit()
 
     # profit_pct = (13200 - 12000) / 12000 * 100 = 10.0
     assert abs(snap.profit_pct - 10.0) < 0.001
+
+
+@pytest.mark.asyncio
+async def test_snapshot_totals_stored_as_integer_cents(db_session):
+    db_session.add(PortfolioSnapshot(
+        portfolio_id=1, snapshot_date="2026-02-18", total_value=1234.5678, total_cost=0.1 + 0.2,
+    ))
+    await db_session.commit()
+
+    raw = (await db_session.execute(
+        text("SELECT total_value_cents, total_cost_cents FROM portfolio_snapshot")
+    )).one()
+    assert tuple(raw) == (123457, 30)
+    snap = (await db_session.execute(select(PortfolioSnapshot))).scalar_one()
+    assert (snap.total_value, snap.total_cost) == (1234.57, 0.3)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("total, cents", [(102.125, 10213), (0.125, 13)])
+async def test_half_cent_rounds_like_sql_round(db_session, total, cents):
+    """Binding a .xx5 total stores the same cents as the migration's SQL ROUND()."""
+    db_session.add(PortfolioSnapshot(
+        portfolio_id=1, snapshot_date="2026-02-18", total_value=total, total_cost=total,
+    ))
+    await db_session.commit()
+
+    stored, migrated = (await db_session.execute(
+        text("SELECT total_value_cents, CAST(ROUND(:total * 100) AS INTEGER) FROM portfolio_snapshot"),
+        {"total": total},
+    )).one()
+    assert stored == migrated == cents
@@ -1,17 +1,30 @@
-"""Tests for scheduler retry logic with exponential backoff and AKShare health probe."""
+"""Tests for scheduler retry logic, portfolio snapshots and AKShare health probe."""
 
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
 from unittest.mock import AsyncMock, call, patch
 
 import pandas as pd
 import pytest
+from sqlalchemy import select
 
+from app.models.fund import Fund, FundEstimateSnapshot, FundHolding
+from app.models.portfolio import Portfolio, PortfolioFund, PortfolioSnapshot
+from app.services.cache import stock_cache
 from app.tasks.scheduler import (
     _STOCK_FETCH_BASE_DELAY,
     _STOCK_FETCH_MAX_RETRIES,
     _fetch_quotes_with_retry,
+    is_trading_hours,
     probe_akshare_health,
+    refresh_all_fund_holdings,
+    refresh_all_fund_navs,
+    save_portfolio_snapshots,
+    update_stock_quotes,
 )
 
+_CST = timezone(timedelta(hours=8))
+
 STOCK_CODES = ["600519", "000858"]
 SAMPLE_QUOTES = {
     "600519": {"price": 1800.0, "change_pct": 1.5, "name": "贵州茅台"},
@@ -19,6 +32,24 @@ SAMPLE_QUOTES = {
 }
 
 
+@pytest.mark.parametrize(
+    "now, expected",
+    [
+        (datetime(2026, 1, 5, 9, 24, tzinfo=_CST), False),
+        (datetime(2026, 1, 5, 9, 25, tzinfo=_CST), True),
+        (datetime(2026, 1, 5, 11, 35, tzinfo=_CST), True),
+        (datetime(2026, 1, 5, 12, 0, tzinfo=_CST), False),
+        (datetime(2026, 1, 5, 15, 5, tzinfo=_CST), True),
+        (datetime(2026, 1, 5, 15, 6, tzinfo=_CST), False),
+        (datetime(2026, 1, 3, 10, 0, tzinfo=_CST), False),  # Saturday
+    ],
+)
+def test_is_trading_hours_boundaries(now, expected):
+    with patch("app.tasks.scheduler.datetime") as mock_dt:
+        mock_dt.now.return_value = now
+        assert is_trading_hours() is expected
+
+
 class TestFetchQuotesWithRetry:
     async def test_success_on_first_attempt_no_sleep(self):
         """When quotes are returned on the first attempt, no sleep is called."""
@@ -101,6 +132,160 @@ class TestFetchQuotesWithRetry:
         mock_get.assert_not_called()
 
 
+@pytest.fixture
+async def factory(db_factory):
+    """Two funds (one with holdings) in two portfolios."""
+    async with db_factory() as s:
+        s.add_all([
+            Fund(fund_code="000001", fund_name="基金A", fund_type="股票型", last_nav=1.0),
+            Fund(fund_code="000002", fund_name="基金B", fund_type="混合型", last_nav=2.0),
+            FundHolding(fund_code="000001", stock_code="600519", stock_name="贵州茅台",
+                        holding_ratio=1.0, report_date="2025-12-31"),
+            Portfolio(id=1, name="组合1"),
+            Portfolio(id=2, name="组合2"),
+            PortfolioFund(portfolio_id=1, fund_code="000001", shares=100.0, cost_nav=1.0),
+            PortfolioFund(portfolio_id=1, fund_code="000002", shares=10.0, cost_nav=2.0),
+            PortfolioFund(portfolio_id=2, fund_code="000001", shares=50.0, cost_nav=0.5),
+        ])
+        await s.commit()
+    yield db_factory
+    stock_cache.clear()
+
+
+def _tracking(factory):
+    """Wrap a session factory, counting how many of its sessions are open."""
+    open_sessions = [0]
+
+    @asynccontextmanager
+    async def tracked():
+        async with factory() as s:
+            open_sessions[0] += 1
+            try:
+                yield s
+            finally:
+                open_sessions[0] -= 1
+
+    return tracked, open_sessions
+
+
+class TestUpdateStockQuotes:
+    """Per-tick estimate snapshots written in one batch."""
+
+    async def test_inserts_snapshots_for_covered_funds(self, factory):
+        with patch("app.tasks.scheduler.async_session_factory", factory), \
+             patch("app.tasks.scheduler.is_trading_hours", return_value=True), \
+             patch("app.tasks.scheduler._fetch_quotes_with_retry",
+                   return_value={"600519": {"price": 1.0, "change_pct": 10.0, "name": "贵州茅台"}}):
+            await update_stock_quotes()
+
+        async with factory() as s:
+            rows = (await s.execute(select(FundEstimateSnapshot))).scalars().all()
+        # 000002 has no holdings, so only 000001 gets a snapshot
+        assert [(r.fund_code, r.est_change_pct) for r in rows] == [("000001", 10.0)]
+
+
+class TestSavePortfolioSnapshots:
+    """Daily snapshot valuation across portfolios sharing funds."""
+
+    async def test_values_each_portfolio_from_cached_quotes(self, factory):
+        stock_cache.set("stock:600519", {"price": 1.0, "change_pct": 10.0, "name": "贵州茅台"})
+        with patch("app.tasks.scheduler.async_session_factory", factory):
+            await save_portfolio_snapshots()
+
+        async with factory() as s:
+            rows = (await s.execute(
+                select(PortfolioSnapshot).order_by(PortfolioSnapshot.portfolio_id)
+            )).scalars().all()
+        # 000001 estimates +10% on its single holding; 000002 has none and stays at last_nav
+        assert [(r.total_value, r.total_cost) for r in rows] == [(130.0, 120.0), (55.0, 25.0)]
+
+    async def test_rerun_same_day_replaces_snapshot(self, factory):
+        with patch("app.tasks.scheduler.async_session_factory", factory):
+            await save_portfolio_snapshots()
+            stock_cache.set("stock:600519", {"price": 1.0, "change_pct": 10.0, "name": "贵州茅台"})
+            await save_portfolio_snapshots()
+
+        async with factory() as s:
+            rows = (await s.execute(
+                select(PortfolioSnapshot).order_by(PortfolioSnapshot.portfolio_id)
+            )).scalars().all()
+        assert [(r.portfolio_id, r.total_value) for r in rows] == [(1, 130.0), (2, 55.0)]
+
+
+class TestRefreshAllFundNavs:
+    """Nightly official-NAV refresh fetched concurrently, applied in one commit."""
+
+    async def test_applies_new_navs_and_skips_failures(self, factory):
+        navs = {"000001": {"nav": 1.1, "nav_date": "2026-01-05", "acc_nav": 1.1}}
+        with patch("app.tasks.scheduler.async_session_factory", factory), \
+             patch("app.tasks.scheduler.market_data_service.get_fund_nav",
+                   side_effect=lambda code, fresh=False: navs.get(code)) as mock_nav:
+            await refresh_all_fund_navs()
+
+        assert sorted(c.args[0] for c in mock_nav.call_args_list) == ["000001", "000002"]
+        assert all(c.kwargs == {"fresh": True} for c in mock_nav.call_args_list)
+        async with factory() as s:
+            funds = {f.fund_code: f for f in (await s.execute(select(Fund))).scalars()}
+        assert (funds["000001"].last_nav, funds["000001"].nav_date) == (1.1, "2026-01-05")
+        assert funds["000002"].last_nav == 2.0
+
+
+class TestRefreshAllFundHoldings:
+    """Quarterly holdings refresh staged on one session and committed once."""
+
+    async def test_replaces_holdings_with_newer_reports(self, factory):
+        new = {
+            "000001": ([{"stock_code": "600519", "stock_name": "贵州茅台",
+                         "holding_ratio": 0.5}], "2026-03-31"),
+            "000002": ([{"stock_code": "000858", "stock_name": "五粮液",
+                         "holding_ratio": 0.4}], "2026-03-31"),
+        }
+        with patch("app.tasks.scheduler.async_session_factory", factory), \
+             patch("app.tasks.scheduler.market_data_service.get_fund_holdings",
+                   side_effect=lambda code, year: (
+                       # 000002 has no report yet this year: falls back to last year's
+                       ([], None) if (code, year) == ("000002", "2026") else new[code]
+                   )) as mock_holdings, \
+             patch("app.tasks.scheduler.datetime") as mock_dt:
+            mock_dt.now.return_value = datetime(2026, 4, 20, tzinfo=_CST)
+            await refresh_all_fund_holdings()
+
+        async with factory() as s:
+            rows = (await s.execute(
+                select(FundHolding).order_by(FundHolding.fund_code)
+            )).scalars().all()
+        assert [(r.fund_code, r.holding_ratio, r.report_date) for r in rows] == [
+            ("000001", 0.5, "2026-03-31"),
+            ("000002", 0.4, "2026-03-31"),
+        ]
+        assert sorted(c.args for c in mock_holdings.call_args_list) == [
+            ("000001", "2026"), ("000002", "2025"), ("000002", "2026"),
+        ]
+
+
+@pytest.mark.parametrize("job, fetch_target, fetch_result", [
+    (update_stock_quotes, "_fetch_quotes_with_retry",
+     {"600519": {"price": 1.0, "change_pct": 10.0, "name": "贵州茅台"}}),
+    (refresh_all_fund_navs, "market_data_service.get_fund_nav", None),
+    (refresh_all_fund_holdings, "market_data_service.get_fund_holdings", ([], None)),
+])
+async def test_jobs_fetch_with_no_session_open(factory, job, fetch_target, fetch_result):
+    """Each job releases its read session before the slow network fetches."""
+    tracked, open_sessions = _tracking(factory)
+    seen = []
+
+    def fetch(*args, **kwargs):
+        seen.append(open_sessions[0])
+        return fetch_result
+
+    with patch("app.tasks.scheduler.async_session_factory", tracked), \
+         patch("app.tasks.scheduler.is_trading_hours", return_value=True), \
+         patch(f"app.tasks.scheduler.{fetch_target}", side_effect=fetch):
+        await job()
+
+    assert seen and set(seen) == {0}
+
+
 class TestProbeAkshareHealth:
     """Tests for the AKShare health monitoring probe."""
 